@@ -0,0 +1,104 @@
+#!/usr/bin/env python3
+"""Recall and latency benchmark for the selectable example index types.
+
+Builds every index type on the same synthetic, clustered corpus of normalized
+vectors and reports, per type and search setting: recall@k against the exact
+Flat baseline, single-query p50/p99 latency (the /score access pattern), build
+time and serialized index size:
+
+    python scripts/bench_ann.py --rows 200000 --dim 384 --queries 500
+"""
+from __future__ import annotations
+
+import argparse
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT))
+
+from server.index_store import apply_search_params, create_faiss_index  # noqa: E402
+
+
+def synthetic_corpus(rows: int, dim: int, queries: int, clusters: int = 256, seed: int = 0):
+    """Gaussian clusters on the unit sphere, closer to real embeddings than uniform noise."""
+    rng = np.random.default_rng(seed)
+    centers = rng.standard_normal((clusters, dim)).astype(np.float32)
+    labels = rng.integers(0, clusters, size=rows + queries)
+    data = centers[labels] + 0.6 * rng.standard_normal((rows + queries, dim)).astype(np.float32)
+    data /= np.linalg.norm(data, axis=1, keepdims=True)
+    return data[:rows], data[rows:]
+
+
+def _latencies(index, queries: np.ndarray, k: int):
+    timings = []
+    ids = np.empty((queries.shape[0], k), dtype=np.int64)
+    for row in range(queries.shape[0]):
+        start = time.perf_counter()
+        _, found = index.search(queries[row : row + 1], k)
+        timings.append(time.perf_counter() - start)
+        ids[row] = found[0]
+    timings_ms = np.array(timings) * 1000
+    return ids, float(np.percentile(timings_ms, 50)), float(np.percentile(timings_ms, 99))
+
+
+def _recall(found: np.ndarray, truth: np.ndarray) -> float:
+    hits = sum(len(set(a.tolist()) & set(b.tolist())) for a, b in zip(found, truth))
+    return hits / truth.size
+
+
+def main() -> None:
+    import faiss
+
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rows", type=int, default=100_000)
+    parser.add_argument("--dim", type=int, default=384)
+    parser.add_argument("--queries", type=int, default=500)
+    parser.add_argument("--k", type=int, default=5)
+    parser.add_argument("--nlist", type=int, default=1024)
+    parser.add_argument("--pq-m", type=int, default=48)
+    parser.add_argument("--hnsw-m", type=int, default=32)
+    parser.add_argument("--nprobe", type=int, nargs="+", default=[1, 8, 32, 128])
+    parser.add_argument("--ef-search", type=int, nargs="+", default=[16, 64, 256])
+    args = parser.parse_args()
+
+    corpus, queries = synthetic_corpus(args.rows, args.dim, args.queries)
+    params = {"nlist": args.nlist, "pq_m": args.pq_m, "hnsw_m": args.hnsw_m}
+    print(f"rows={args.rows} dim={args.dim} queries={args.queries} k={args.k}")
+    print("| type | setting | recall@k | p50 ms | p99 ms | build s | size MB |")
+    print("|---|---|---|---|---|---|---|")
+
+    truth = None
+    for index_type in ("flat", "ivf-flat", "ivf-pq", "hnsw"):
+        start = time.perf_counter()
+        try:
+            index = create_faiss_index(corpus, index_type, **params)
+        except ValueError as exc:
+            print(f"| {index_type} | skipped: {exc} | | | | | |")
+            continue
+        build_s = time.perf_counter() - start
+        size_mb = faiss.serialize_index(index).nbytes / 2**20
+
+        if index_type == "flat":
+            settings = [("exact", {})]
+        elif index_type == "hnsw":
+            settings = [(f"efSearch={ef}", {"ef_search": ef}) for ef in args.ef_search]
+        else:
+            settings = [(f"nprobe={n}", {"nprobe": n}) for n in args.nprobe]
+
+        for label, setting in settings:
+            apply_search_params(index, **setting)
+            found, p50, p99 = _latencies(index, queries, args.k)
+            if truth is None:
+                truth = found
+            print(
+                f"| {index_type} | {label} | {_recall(found, truth):.3f} | {p50:.3f} | {p99:.3f} "
+                f"| {build_s:.2f} | {size_mb:.1f} |"
+            )
+
+
+if __name__ == "__main__":
+    main()
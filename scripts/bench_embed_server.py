@@ -0,0 +1,101 @@
+#!/usr/bin/env python3
+"""Per-worker models versus one shared embedding server.
+
+Starts ``--workers`` processes that each encode ``--requests`` single-text
+requests, first with a private model per process (the default deployment) and
+then through a shared ``server.embed_server`` process, and reports throughput
+and resident memory of both setups:
+
+    python scripts/bench_embed_server.py --workers 4 --requests 200
+"""
+from __future__ import annotations
+
+import argparse
+import multiprocessing as mp
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT))
+
+from server import score as score_module  # noqa: E402
+from server.embed_server import RemoteEncoder  # noqa: E402
+
+SAMPLE = "火种胶囊记录了一次关于长期保存与可验证分享的讨论。"
+
+
+def _rss_mb(pid: int) -> float:
+    try:
+        for line in Path(f"/proc/{pid}/status").read_text().splitlines():
+            if line.startswith("VmRSS:"):
+                return int(line.split()[1]) / 1024.0
+    except FileNotFoundError:
+        pass
+    return 0.0
+
+
+def _worker(socket_path: str, requests: int, start, results) -> None:
+    model = RemoteEncoder(socket_path) if socket_path else score_module.load_local_model()
+    model.encode([SAMPLE], normalize_embeddings=True, convert_to_numpy=True)
+    start.wait()
+    for i in range(requests):
+        model.encode([f"{SAMPLE} #{i}"], normalize_embeddings=True, convert_to_numpy=True)
+    results.put(_rss_mb(mp.current_process().pid))
+
+
+def _run(workers: int, requests: int, socket_path: str = ""):
+    ctx = mp.get_context("spawn")
+    start = ctx.Event()
+    results = ctx.Queue()
+    procs = [ctx.Process(target=_worker, args=(socket_path, requests, start, results)) for _ in range(workers)]
+    for proc in procs:
+        proc.start()
+    time.sleep(0.5)
+    # 等所有 worker 完成模型加载/连接后同时开始
+    began = time.perf_counter()
+    start.set()
+    rss = [results.get() for _ in procs]
+    elapsed = time.perf_counter() - began
+    for proc in procs:
+        proc.join()
+    return workers * requests / elapsed, sum(rss)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--threads", type=int, default=0, help="torch threads of the embedding server")
+    args = parser.parse_args()
+
+    per_worker_qps, per_worker_rss = _run(args.workers, args.requests)
+    print(f"per-worker models: {per_worker_qps:8.1f} texts/s  workers RSS {per_worker_rss:8.1f} MB")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        socket_path = str(Path(tmp) / "embed.sock")
+        server = subprocess.Popen(
+            [sys.executable, "-m", "server.embed_server", "--socket", socket_path, "--threads", str(args.threads)],
+            cwd=ROOT,
+        )
+        try:
+            deadline = time.time() + 120
+            while not Path(socket_path).exists():
+                if server.poll() is not None or time.time() > deadline:
+                    raise SystemExit("embedding server failed to start")
+                time.sleep(0.2)
+            shared_qps, client_rss = _run(args.workers, args.requests, socket_path)
+            server_rss = _rss_mb(server.pid)
+        finally:
+            server.terminate()
+            server.wait()
+    print(
+        f"shared server:     {shared_qps:8.1f} texts/s  workers RSS {client_rss:8.1f} MB"
+        f" + server {server_rss:8.1f} MB"
+    )
+
+
+if __name__ == "__main__":
+    main()
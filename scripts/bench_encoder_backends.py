@@ -0,0 +1,108 @@
+#!/usr/bin/env python3
+"""Latency and accuracy drift of the embedding backends against fp32 torch.
+
+Encodes a fixed text set with every available ``ENCODER_BACKEND`` and reports
+single-text and batched throughput, the minimum cosine to the fp32 vectors
+and the largest uniqueness-score difference when the queries are scored
+against an fp32 index of the corpus half of the set:
+
+    python scripts/bench_encoder_backends.py --backends torch int8 onnx
+
+Exits non-zero if a backend breaks ``SCORE_TOLERANCE`` or ``MIN_COSINE``.
+"""
+from __future__ import annotations
+
+import argparse
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT))
+
+from server.encoders import MIN_COSINE, SCORE_TOLERANCE, load_encoder  # noqa: E402
+from server.index_store import NumpyFlatIndex  # noqa: E402
+from server.score import _model_path, _uniqueness_from_distances  # noqa: E402
+
+TOPICS = [
+    "火种胶囊的签名校验流程",
+    "离线环境下的模型预热",
+    "IPFS 网关探测与回退",
+    "分享卡片的二维码生成",
+    "长期保存的数据格式演进",
+    "访问条款与撤销模板",
+    "a reproducible build of the capsule archive",
+    "rate limiting with burst detection on the scoring API",
+    "key rotation for signed capsules",
+    "threat model for public share links",
+    "semantic search over archived conversations",
+    "verifying hashes after downloading from a mirror",
+]
+PHRASES = [
+    "{topic}",
+    "我们讨论了{topic}，并记录了结论。",
+    "Notes: {topic}; open questions remain about edge cases and failure handling.",
+    "如何改进{topic}？下面是三个可选方案以及各自的代价。",
+]
+TEXTS = [phrase.format(topic=topic) for topic in TOPICS for phrase in PHRASES]
+
+
+def _encode(model, texts, batch_size):
+    return np.asarray(
+        model.encode(texts, batch_size=batch_size, normalize_embeddings=True, convert_to_numpy=True),
+        dtype=np.float32,
+    )
+
+
+def _throughput(model, texts, batch_size, repeat):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        for offset in range(0, len(texts), batch_size):
+            _encode(model, texts[offset : offset + batch_size], batch_size)
+    return repeat * len(texts) / (time.perf_counter() - start)
+
+
+def _scores(index, queries, k):
+    distances, _ = index.search(queries, k)
+    return np.array([_uniqueness_from_distances(row) for row in distances])
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--backends", nargs="+", default=["torch", "int8", "onnx"])
+    parser.add_argument("--model-dir", type=Path, default=_model_path())
+    parser.add_argument("--top-k", type=int, default=5)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    corpus, queries = TEXTS[0::2], TEXTS[1::2]
+    reference = _encode(load_encoder(args.model_dir, "torch"), TEXTS, 32)
+    index = NumpyFlatIndex(reference[0::2])
+    reference_scores = _scores(index, reference[1::2], args.top_k)
+    print(f"{len(corpus)} corpus texts, {len(queries)} queries, tolerance ±{SCORE_TOLERANCE} points, cosine ≥ {MIN_COSINE}")
+
+    failed = False
+    for backend in args.backends:
+        try:
+            model = load_encoder(args.model_dir, backend)
+        except (ImportError, FileNotFoundError) as exc:
+            print(f"{backend:>6}: skipped ({exc})")
+            continue
+        vectors = _encode(model, TEXTS, 32)
+        cosine = float(np.min(np.sum(vectors * reference, axis=1)))
+        drift = int(np.max(np.abs(_scores(index, vectors[1::2], args.top_k) - reference_scores)))
+        single = _throughput(model, TEXTS, 1, args.repeat)
+        batched = _throughput(model, TEXTS, 32, args.repeat)
+        ok = drift <= SCORE_TOLERANCE and cosine >= MIN_COSINE
+        failed |= not ok
+        print(
+            f"{backend:>6}: {single:7.1f} texts/s (batch 1)  {batched:7.1f} texts/s (batch 32)"
+            f"  min cosine {cosine:.4f}  max score drift {drift}  {'ok' if ok else 'OUT OF TOLERANCE'}"
+        )
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,105 @@
+#!/usr/bin/env python3
+"""Compare RSS and first-query latency for eager vs mmap index loading.
+
+Each measurement runs in a fresh subprocess so page-cache sharing and memory
+are observed the way a uvicorn worker would see them. RSS counts mapped file
+pages too; anonymous memory is what every additional worker pays again:
+
+    python scripts/bench_index_load.py --rows 200000 --dim 384
+"""
+from __future__ import annotations
+
+import argparse
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import numpy as np
+import orjson
+
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT))
+
+
+def _memory() -> dict:
+    """RSS and anonymous (private, non file-backed) memory in bytes, Linux only."""
+    fields = {}
+    for line in Path("/proc/self/status").read_text().splitlines():
+        name, _, value = line.partition(":")
+        if name in {"VmRSS", "RssAnon"}:
+            fields[name] = int(value.split()[0]) * 1024
+    return fields
+
+
+def _child(index_path: Path, mode: str, dim: int) -> None:
+    from server.index_store import load_index
+
+    before = _memory()
+    start = time.perf_counter()
+    index = load_index(index_path, mode=mode)
+    load_s = time.perf_counter() - start
+    query = np.random.default_rng(1).standard_normal((1, dim)).astype(np.float32)
+    start = time.perf_counter()
+    index.search(query, 5)
+    first_query_s = time.perf_counter() - start
+    after = _memory()
+    print(
+        orjson.dumps(
+            {
+                "mode": mode,
+                "type": type(index).__name__,
+                "load_ms": round(load_s * 1000, 2),
+                "first_query_ms": round(first_query_s * 1000, 2),
+                "rss_delta_mb": round((after["VmRSS"] - before["VmRSS"]) / 2**20, 1),
+                # mmap 页属于共享页缓存，只有匿名内存随 worker 数线性增长
+                "anon_delta_mb": round((after["RssAnon"] - before["RssAnon"]) / 2**20, 1),
+            }
+        ).decode()
+    )
+
+
+def _build(directory: Path, rows: int, dim: int, layout: str) -> Path:
+    rng = np.random.default_rng(0)
+    vectors = rng.standard_normal((rows, dim)).astype(np.float32)
+    vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+    index_path = directory / "examples.index"
+    if layout == "numpy":
+        np.save(directory / "examples.vectors.npy", vectors)
+    else:
+        import faiss
+
+        index = faiss.IndexFlatIP(dim)
+        index.add(vectors)
+        faiss.write_index(index, str(index_path))
+    return index_path
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rows", type=int, default=200_000)
+    parser.add_argument("--dim", type=int, default=384)
+    parser.add_argument("--layout", choices=["numpy", "faiss"], default="numpy")
+    parser.add_argument("--child", nargs=2, metavar=("INDEX", "MODE"), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        _child(Path(args.child[0]), args.child[1], args.dim)
+        return
+
+    with tempfile.TemporaryDirectory() as tmp:
+        index_path = _build(Path(tmp), args.rows, args.dim, args.layout)
+        print(f"layout={args.layout} rows={args.rows} dim={args.dim}")
+        for mode in ("eager", "mmap"):
+            result = subprocess.run(
+                [sys.executable, __file__, "--dim", str(args.dim), "--child", str(index_path), mode],
+                check=True,
+                capture_output=True,
+                text=True,
+            )
+            print(result.stdout.strip())
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,78 @@
+#!/usr/bin/env python3
+"""Throughput of the built-in NumPy search backend against FAISS Flat.
+
+Searches the same normalized corpus with FAISS ``IndexFlatIP`` (if installed)
+and with ``NumpyFlatIndex`` in float32 and float16 storage, for several query
+batch sizes, and reports queries per second plus top-k agreement with FAISS:
+
+    python scripts/bench_numpy_search.py --rows 200000 --dim 384
+"""
+from __future__ import annotations
+
+import argparse
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT))
+
+from server.index_store import NumpyFlatIndex  # noqa: E402
+
+
+def _normalized(rows: int, dim: int, seed: int) -> np.ndarray:
+    data = np.random.default_rng(seed).standard_normal((rows, dim)).astype(np.float32)
+    return data / np.linalg.norm(data, axis=1, keepdims=True)
+
+
+def _throughput(index, queries: np.ndarray, batch: int, k: int):
+    ids = []
+    start = time.perf_counter()
+    for offset in range(0, queries.shape[0], batch):
+        ids.append(index.search(queries[offset : offset + batch], k)[1])
+    elapsed = time.perf_counter() - start
+    return queries.shape[0] / elapsed, np.concatenate(ids)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rows", type=int, default=200_000)
+    parser.add_argument("--dim", type=int, default=384)
+    parser.add_argument("--queries", type=int, default=256)
+    parser.add_argument("--k", type=int, default=5)
+    parser.add_argument("--batch", type=int, nargs="+", default=[1, 32])
+    parser.add_argument("--block-rows", type=int, default=65536)
+    args = parser.parse_args()
+
+    corpus = _normalized(args.rows, args.dim, seed=0)
+    queries = _normalized(args.queries, args.dim, seed=1)
+
+    backends = {}
+    try:
+        import faiss
+    except ImportError:
+        print("faiss not installed; reporting the NumPy backend only")
+    else:
+        flat = faiss.IndexFlatIP(args.dim)
+        flat.add(corpus)
+        backends["faiss-flat"] = flat
+    backends["numpy-f32"] = NumpyFlatIndex(corpus, block_rows=args.block_rows)
+    backends["numpy-f16"] = NumpyFlatIndex(corpus.astype(np.float16), block_rows=args.block_rows)
+
+    print(f"rows={args.rows} dim={args.dim} queries={args.queries} k={args.k}")
+    print("| backend | batch | queries/s | top-k agreement |")
+    print("|---|---|---|---|")
+    for batch in args.batch:
+        reference = None
+        for name, index in backends.items():
+            qps, ids = _throughput(index, queries, batch, args.k)
+            if reference is None:
+                reference = ids
+            agreement = np.mean([len(set(a) & set(b)) / args.k for a, b in zip(ids.tolist(), reference.tolist())])
+            print(f"| {name} | {batch} | {qps:,.0f} | {agreement:.3f} |")
+
+
+if __name__ == "__main__":
+    main()
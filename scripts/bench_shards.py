@@ -0,0 +1,79 @@
+#!/usr/bin/env python3
+"""Latency and throughput of the sharded index as the shard count grows.
+
+Writes one random normalized corpus as a single index and as 2, 4, ... local
+shard processes, then reports per-query p50/p95 latency (batch 1) and batched
+throughput for each layout:
+
+    python scripts/bench_shards.py --rows 200000 --dim 384 --shards 1 2 4
+
+Shard count 1 is the in-process index the scorer uses without a manifest.
+Shards only run in parallel on as many cores as there are shards.
+"""
+from __future__ import annotations
+
+import argparse
+import os
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import numpy as np
+
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT))
+
+from server import index_build  # noqa: E402
+from server.index_store import load_index  # noqa: E402
+from server.shards import start_local_shards  # noqa: E402
+
+
+def _normalized(rows: int, dim: int, seed: int) -> np.ndarray:
+    data = np.random.default_rng(seed).standard_normal((rows, dim)).astype(np.float32)
+    return data / np.linalg.norm(data, axis=1, keepdims=True)
+
+
+def _measure(index, queries: np.ndarray, k: int, batch: int):
+    latencies = []
+    for row in queries[: min(len(queries), 200)]:
+        start = time.perf_counter()
+        index.search(row[None, :], k)
+        latencies.append((time.perf_counter() - start) * 1000)
+    start = time.perf_counter()
+    for offset in range(0, len(queries), batch):
+        index.search(queries[offset : offset + batch], k)
+    qps = len(queries) / (time.perf_counter() - start)
+    return np.percentile(latencies, 50), np.percentile(latencies, 95), qps
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rows", type=int, default=200000)
+    parser.add_argument("--dim", type=int, default=384)
+    parser.add_argument("--shards", type=int, nargs="+", default=[1, 2, 4])
+    parser.add_argument("--queries", type=int, default=512)
+    parser.add_argument("--batch", type=int, default=32)
+    parser.add_argument("--k", type=int, default=5)
+    args = parser.parse_args()
+
+    vectors = _normalized(args.rows, args.dim, 0)
+    queries = _normalized(args.queries, args.dim, 1)
+    ids = [str(n) for n in range(args.rows)]
+    print(f"{args.rows} x {args.dim}, k={args.k}, {os.cpu_count()} CPUs")
+    for count in args.shards:
+        with tempfile.TemporaryDirectory() as tmp:
+            index_path = Path(tmp) / "examples.index"
+            index_build.write_index(index_path, ids, vectors, shards=count)
+            procs = start_local_shards(index_path) if count > 1 else []
+            try:
+                p50, p95, qps = _measure(load_index(index_path), queries, args.k, args.batch)
+            finally:
+                for proc in procs:
+                    proc.terminate()
+                    proc.join()
+        print(f"shards={count}: p50 {p50:7.2f} ms  p95 {p95:7.2f} ms  batch {args.batch}: {qps:8.1f} queries/s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,102 @@
+#!/usr/bin/env python3
+"""Text-layout time per sharecard: original searches vs the memoized engine.
+
+For a set of long CJK, Latin and mixed titles, times the layout of the
+title, subtitle and presence fields (font fitting, truncation and height
+measurement, as in ``render_sharecard``) three ways:
+
+* ``reference`` – the original ``_fit_font_size`` / ``_truncate_text``;
+* ``cold`` – a fresh :class:`server.sharecard.TextLayout` per card (first
+  render of a card: only intra-render memoization and the advance bound);
+* ``warm`` – one shared engine (repeat renders of the same card).
+
+Also reports whole ``render_sharecard`` time with each layout:
+
+    python scripts/bench_sharecard_layout.py --rounds 20
+
+Without ``assets/fonts/NotoSansSC-Regular.otf`` Pillow's built-in scalable
+font is used so that every font size is really measured.
+"""
+from __future__ import annotations
+
+import argparse
+import sys
+import time
+from functools import lru_cache
+from pathlib import Path
+
+from PIL import Image, ImageDraw, ImageFont
+
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT))
+
+from server import sharecard  # noqa: E402
+
+TITLES = [
+    "在无人注视的角落里，一粒火种如何跨越三个世纪的沉默，把尚未被命名的记忆交给下一位守夜人",
+    "火种 Fireseed：系统外者与他们留下的七十二份手稿、地图、录音和一封没有寄出的信",
+    "A very long English capsule title that certainly cannot fit on a single sharecard line",
+    "混合 mixed 文本：Fireseed capsule #4821 — 关于城市、河流 and the people who stayed",
+]
+SUBTITLE = "副标题：记录者、时间、地点与来源说明，" * 3
+
+
+class ReferenceLayout:
+    def __init__(self) -> None:
+        self.draw = ImageDraw.Draw(Image.new("RGB", (1, 1)))
+
+    def measure(self, text, pt):
+        return sharecard._measure(self.draw, text, sharecard.get_font(pt))
+
+    def fit_font_size(self, text, max_width, max_height, max_pt, min_pt=10):
+        return sharecard._fit_font_size(self.draw, text, max_width, max_height, max_pt, min_pt)
+
+    def truncate(self, text, pt, max_width):
+        return sharecard._truncate_text(self.draw, text, sharecard.get_font(pt), max_width)
+
+
+def _layout_card(layout, title: str, size) -> None:
+    width, height = size
+    text_area = width // 2
+    for text, box_height, max_pt, min_pt in (
+        (title, int(height * 0.35), 78, 18),
+        (SUBTITLE, int(height * 0.2), 44, 14),
+        ("Uniqueness 87 · ARI 62", int(height * 0.15), 36, 12),
+    ):
+        pt = layout.fit_font_size(text, text_area, box_height, max_pt, min_pt)
+        layout.measure(layout.truncate(text, pt, text_area), pt)
+
+
+def _time(fn, rounds: int) -> float:
+    start = time.perf_counter()
+    for _ in range(rounds):
+        fn()
+    return (time.perf_counter() - start) / rounds * 1000
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rounds", type=int, default=20)
+    args = parser.parse_args()
+
+    if not sharecard.FONT_PATH.exists():
+        sharecard.get_font = lru_cache(maxsize=None)(lambda pt: ImageFont.load_default(pt))
+        print("bundled font missing; using Pillow's built-in scalable font")
+    size = sharecard.OG_SIZE
+    shared = sharecard.TextLayout()
+    reference = ReferenceLayout()
+    print(f"{len(TITLES)} titles, {args.rounds} rounds, ms per card")
+    for name, make in (("reference", lambda: reference), ("cold", sharecard.TextLayout), ("warm", lambda: shared)):
+        layout_ms = _time(lambda: [_layout_card(make(), title, size) for title in TITLES], args.rounds) / len(TITLES)
+
+        def render() -> None:
+            for title in TITLES:
+                sharecard._LAYOUT = make()
+                sharecard.render_sharecard({"title": title, "subtitle": SUBTITLE, "uniqueness": 87, "ari": 62, "url": "https://example.com/c/1"}, size)
+
+        render_ms = _time(render, args.rounds) / len(TITLES)
+        print(f"{name:>9}: layout {layout_ms:7.2f}  render_sharecard {render_ms:7.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,77 @@
+#!/usr/bin/env python3
+"""QR-stage latency of a sharecard: qrcode's PIL factory vs the cached matrix.
+
+Times building the QR code for a capsule URL and pasting it onto a card:
+
+* ``qrcode`` – ``QRCode(...).make(fit=True)``, ``make_image``,
+  ``convert("RGB")`` and paste, as ``render_sharecard`` used to;
+* ``cold`` – :func:`server.sharecard.qr_mask` with an empty matrix cache
+  (encode once, rasterize with NumPy, paste through the mask);
+* ``warm`` – the same with the URL's matrix already cached.
+
+    python scripts/bench_sharecard_qr.py --rounds 200
+"""
+from __future__ import annotations
+
+import argparse
+import sys
+import time
+from pathlib import Path
+
+import qrcode
+from PIL import Image
+from qrcode.constants import ERROR_CORRECT_H
+
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT))
+
+from server import sharecard  # noqa: E402
+
+URLS = {
+    "short": "https://fireseed.example/c/4821",
+    "long": "https://fireseed.example/landing/capsule-2024-07-31-0042?utm_source=share&utm_medium=og&ref=" + "x" * 60,
+}
+
+
+def _qrcode_stage(card: Image.Image, url: str, box_size: int) -> None:
+    qr = qrcode.QRCode(error_correction=ERROR_CORRECT_H, border=4, box_size=box_size)
+    qr.add_data(url)
+    qr.make(fit=True)
+    card.paste(qr.make_image(fill_color="black", back_color="white").convert("RGB"), (0, 0))
+
+
+def _mask_stage(card: Image.Image, url: str, box_size: int) -> None:
+    mask = sharecard.qr_mask(url, box_size)
+    box = (0, 0, mask.width, mask.height)
+    card.paste("white", box)
+    card.paste("black", box, mask)
+
+
+def _ms(fn, rounds: int, before=None) -> float:
+    total = 0.0
+    for _ in range(rounds):
+        if before is not None:
+            before()
+        start = time.perf_counter()
+        fn()
+        total += time.perf_counter() - start
+    return total / rounds * 1000
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rounds", type=int, default=200)
+    args = parser.parse_args()
+
+    card = Image.new("RGB", sharecard.OG_SIZE, "white")
+    print(f"{args.rounds} rounds, ms per QR stage")
+    for name, url in URLS.items():
+        for box_size in (6, 4):
+            reference = _ms(lambda: _qrcode_stage(card, url, box_size), args.rounds)
+            cold = _ms(lambda: _mask_stage(card, url, box_size), args.rounds, before=sharecard.qr_matrix.cache_clear)
+            warm = _ms(lambda: _mask_stage(card, url, box_size), args.rounds)
+            print(f"{name:>5} url, box {box_size}: qrcode {reference:6.2f}  cold {cold:6.2f}  warm {warm:6.3f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,113 @@
+#!/usr/bin/env python3
+"""Memory saved versus uniqueness drift for reduced and quantized indexes.
+
+Builds the example index once per (dimension, method, storage) combination
+and scores held-out query vectors against it, comparing every uniqueness
+score with the full-width float32 ``flat`` index:
+
+    python scripts/report_reduction.py --vectors data/examples.vectors.npy
+    python scripts/report_reduction.py --rows 100000 --dims 384 256 128 64
+
+``--vectors`` takes an unreduced vectors file (build it without
+``--reduce``); its last ``--queries`` rows are held out as queries. Without
+it a synthetic anisotropic corpus (low-rank signal plus noise, like sentence
+embeddings) is used, with half of the queries being perturbed corpus rows so
+the scores cover the whole 0–100 range.
+
+Storage types map to build flags: ``float32`` = ``--index-type flat``,
+``float16`` = ``--index-type sq-fp16 --vector-dtype float16``, ``sq8`` =
+``--index-type sq8 --vector-dtype float16``. ``index MiB`` is the FAISS file
+the scorer holds in memory, ``npy MiB`` the NumPy layout (scanned without
+faiss, memory-mapped for near-duplicate lookups).
+"""
+from __future__ import annotations
+
+import argparse
+import sys
+import tempfile
+from pathlib import Path
+
+import numpy as np
+
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT))
+
+from server import index_build  # noqa: E402
+from server.index_store import load_index, vectors_path  # noqa: E402
+from server.reduction import METHODS, train_projection  # noqa: E402
+from server.score import _uniqueness_from_distances  # noqa: E402
+
+STORAGE = {"float32": ("flat", "float32"), "float16": ("sq-fp16", "float16"), "sq8": ("sq8", "float16")}
+
+
+def _normalized(data: np.ndarray) -> np.ndarray:
+    data = data.astype(np.float32)
+    return data / np.linalg.norm(data, axis=1, keepdims=True)
+
+
+def _synthetic(rows: int, queries: int, dim: int, rank: int, seed: int = 0):
+    rng = np.random.default_rng(seed)
+    # 奇异值按幂律衰减，近似句向量的各向异性分布
+    basis = rng.standard_normal((rank, dim)) * (np.arange(1, rank + 1) ** -0.5)[:, None]
+    corpus = _normalized(rng.standard_normal((rows, rank)) @ basis + 0.05 * rng.standard_normal((rows, dim)))
+    fresh = rng.standard_normal((queries - queries // 2, rank)) @ basis + 0.05 * rng.standard_normal((queries - queries // 2, dim))
+    near = corpus[rng.choice(rows, queries // 2, replace=False)] + 0.3 * rng.standard_normal((queries // 2, dim)) / np.sqrt(dim)
+    return corpus, _normalized(np.concatenate([fresh, near]))
+
+
+def _scores(index, queries: np.ndarray, k: int) -> np.ndarray:
+    distances, _ = index.search(np.ascontiguousarray(queries, dtype=np.float32), k)
+    return np.array([_uniqueness_from_distances(row) for row in distances])
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--vectors", type=Path, default=None, help="unreduced examples.vectors.npy")
+    parser.add_argument("--rows", type=int, default=50000)
+    parser.add_argument("--dim", type=int, default=384)
+    parser.add_argument("--rank", type=int, default=64, help="latent rank of the synthetic corpus")
+    parser.add_argument("--queries", type=int, default=1000)
+    parser.add_argument("--dims", type=int, nargs="+", default=[384, 256, 128, 64])
+    parser.add_argument("--methods", nargs="+", choices=METHODS, default=list(METHODS))
+    parser.add_argument("--storage", nargs="+", choices=list(STORAGE), default=list(STORAGE))
+    parser.add_argument("--k", type=int, default=5)
+    args = parser.parse_args()
+
+    if args.vectors:
+        data = np.load(args.vectors).astype(np.float32)
+        corpus, queries = data[: -args.queries], data[-args.queries :]
+        source = str(args.vectors)
+    else:
+        corpus, queries = _synthetic(args.rows, args.queries, args.dim, args.rank)
+        source = f"synthetic rank {args.rank}"
+    full = corpus.shape[1]
+    ids = [str(n) for n in range(corpus.shape[0])]
+    print(f"{source}: {corpus.shape[0]} x {full}, {len(queries)} held-out queries, k={args.k}")
+    print(f"{'dim':>5} {'method':>7} {'storage':>8} {'index MiB':>10} {'npy MiB':>8} {'saved':>6}  |Δ score| mean / p95 / max")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        index_path = Path(tmp) / "examples.index"
+        index_build.write_index(index_path, ids, corpus)
+        baseline_bytes = index_path.stat().st_size
+        baseline = _scores(load_index(index_path, mode="eager"), queries, args.k)
+
+        for dim in args.dims:
+            for method in args.methods if dim < full else ["none"]:
+                projection = train_projection(corpus, method, dim) if dim < full else None
+                reduced = projection.apply(corpus) if projection else corpus
+                reduced_queries = projection.apply(queries) if projection else queries
+                for storage in args.storage:
+                    index_type, vector_dtype = STORAGE[storage]
+                    index_build.write_index(index_path, ids, reduced, index_type, vector_dtype, projection=projection)
+                    index_bytes = index_path.stat().st_size
+                    npy_bytes = vectors_path(index_path).stat().st_size
+                    drift = np.abs(_scores(load_index(index_path, mode="eager"), reduced_queries, args.k) - baseline)
+                    print(
+                        f"{dim:>5} {method:>7} {storage:>8} {index_bytes / 2**20:>10.1f} {npy_bytes / 2**20:>8.1f} "
+                        f"{1 - index_bytes / baseline_bytes:>6.0%}  "
+                        f"{drift.mean():.2f} / {np.percentile(drift, 95):.0f} / {drift.max():.0f}"
+                    )
+
+
+if __name__ == "__main__":
+    main()
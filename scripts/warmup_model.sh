@@ -42,6 +42,11 @@ PY
 ls -la "${MODEL_DIR}"
 test -f "${MODEL_DIR}/config.json"
 
+# ===== ONNX 后端需要预先导出计算图 =====
+if [ "${ENCODER_BACKEND:-torch}" = "onnx" ]; then
+  (cd "${ROOT_DIR}" && python -m server.encoders export-onnx --model-dir "${MODEL_DIR}")
+fi
+
 # ===== 读取维度(避免硬编码 '/models') =====
 export MODEL_DIR
 DIM=$(python - <<'PY'
@@ -54,14 +59,14 @@ PY
 )
 echo "Embedding dim = ${DIM}"
 
-# ===== 生成一个占位 index(不依赖 faiss) =====
+# ===== 构建示例索引(无 capsule 时跳过，评分走 empty_index_fallback) =====
+# 旧版本写入的 JSON 占位文件无法被 faiss 读取，先清理
 python - <<PY
 from pathlib import Path
-import json
 p = Path("${INDEX_PATH}")
-p.parent.mkdir(parents=True, exist_ok=True)
-if not p.exists():
-    p.write_text(json.dumps({"dim": ${DIM}, "size": 0}))
+if p.exists() and p.read_bytes()[:1] == b"{":
+    p.unlink()
 PY
+(cd "${ROOT_DIR}" && python -m server.index_build --capsules-dir "${CAPSULES_DIR}" --output "${INDEX_PATH}")
 
 echo "Warmup done."
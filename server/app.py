@@ -1,15 +1,20 @@
 from __future__ import annotations
 
+import asyncio
+import hashlib
+import hmac
 import logging
+import math
+import os
 import time
-from io import BytesIO
-from typing import Any
+from contextlib import asynccontextmanager
+from typing import Any, List
 
 import orjson
 from fastapi import BackgroundTasks, FastAPI, HTTPException, Request
 from fastapi.responses import JSONResponse, Response
 from fastapi.staticfiles import StaticFiles
-from pydantic import BaseModel, ValidationError
+from pydantic import BaseModel, Field, ValidationError
 from slowapi.errors import RateLimitExceeded
 from starlette.middleware.base import BaseHTTPMiddleware
 
@@ -36,7 +41,17 @@ def get_templates() -> Any | None:
     return _templates
 
 from . import limiter as limiter_module
-from .score import compute_uniqueness
+from . import score as score_module
+from .score import score_batch
+from .batcher import get_coalescer
+from .embed_server import EmbedServerUnavailable
+from .executor import (
+    SCORE_RETRY_AFTER_SECONDS,
+    SHARECARD_RETRY_AFTER_SECONDS,
+    ExecutorSaturated,
+    get_scoring_executor,
+    get_sharecard_executor,
+)
 from .landing import is_safe_id, render_landing
 from .pin import pin_endpoint
 from .status import pin_status
@@ -45,10 +60,12 @@ from .appeal import handle_appeal
 from .metrics import (
     metrics_endpoint,
     score_latency_seconds,
+    score_stage_seconds,
     sharecard_errors_total,
     verification_failures_total,
 )
 from .logging import configure_logging
+from .sharecard_cache import get_sharecard_cache
 
 configure_logging()
 logger = logging.getLogger(__name__)
@@ -56,18 +73,72 @@ try:
     from .sharecard import (
         ICON_SIZE,
         OG_SIZE,
+        QUERY_FIELDS,
+        canonical_query,
         choose_format,
         compute_etag,
-        render_sharecard,
+        render_encoded,
+        render_key,
+        sharecard_query,
     )
 except ModuleNotFoundError as e:
     # 允许 CI 环境缺 Pillow 或 qrcode 时正常运行
     ICON_SIZE = OG_SIZE = (0, 0)
-    choose_format = compute_etag = render_sharecard = None
+    QUERY_FIELDS = ()
+    choose_format = compute_etag = render_encoded = render_key = None
+    canonical_query = sharecard_query = None
     import warnings
     warnings.warn(f"Sharecard dependencies not available: {e}")
 
-app = FastAPI()
+# 启动时预加载模型与索引（容器内建议开启）
+SCORE_PRELOAD = os.getenv("SCORE_PRELOAD", "0") == "1"
+# 后台定期预渲染 static/og 分享图的间隔（秒），0 表示关闭；开启时必须设置 OG_BASE_URL
+OG_PRERENDER_INTERVAL = float(os.getenv("OG_PRERENDER_INTERVAL", "0"))
+# GET /sharecard 的签名密钥；设置后查询串必须带有效的 sig
+SHARECARD_HMAC_KEY = os.getenv("SHARECARD_HMAC_KEY", "")
+
+
+def _run_warmup() -> None:
+    try:
+        timings = score_module.warmup()
+    except Exception as exc:
+        logger.exception("score.warmup failed: %s", exc)
+        return
+    logger.info(
+        "score.warmup %s",
+        {phase: round(seconds * 1000, 2) for phase, seconds in timings.items()},
+        extra={"event": "score.warmup", "latency_ms": round(sum(timings.values()) * 1000, 2)},
+    )
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    if OG_PRERENDER_INTERVAL > 0:
+        from .og_prerender import require_base_url, run_periodically  # lazy import: needs Pillow
+
+        # 缺 OG_BASE_URL 时直接启动失败，而不是把错误的地址烘进二维码
+        require_base_url()
+    score_module.start_index_reloader()
+    warmup_task = None
+    if SCORE_PRELOAD:
+        # 后台预热：/healthz 立即可用，/readyz 在预热完成后才返回 200
+        warmup_task = asyncio.get_running_loop().run_in_executor(None, _run_warmup)
+    prerender_task = None
+    if OG_PRERENDER_INTERVAL > 0:
+        prerender_task = asyncio.create_task(run_periodically(OG_PRERENDER_INTERVAL))
+    try:
+        yield
+    finally:
+        if warmup_task is not None and not warmup_task.done():
+            warmup_task.cancel()
+        if prerender_task is not None:
+            prerender_task.cancel()
+        score_module.stop_index_reloader()
+        get_scoring_executor().shutdown()
+        get_sharecard_executor().shutdown()
+
+
+app = FastAPI(lifespan=lifespan)
 
 app.mount("/static", StaticFiles(directory="static"), name="static")
 try:
@@ -137,11 +208,58 @@ def rate_limit_handler(request: Request, exc: RateLimitExceeded) -> JSONResponse
 app.add_exception_handler(RateLimitExceeded, rate_limit_handler)
 
 
+def scoring_busy_handler(request: Request, exc: ExecutorSaturated) -> JSONResponse:
+    # 在异常处理器里返回，避免 slowapi 用限流窗口覆盖 Retry-After
+    if request.url.path == "/sharecard":
+        detail, retry_after = "sharecard_busy", SHARECARD_RETRY_AFTER_SECONDS
+    else:
+        detail, retry_after = "scoring_busy", SCORE_RETRY_AFTER_SECONDS
+    response = JSONResponse({"detail": detail}, status_code=503)
+    limiter_module.inject_rate_headers(response, request)
+    response.headers["Retry-After"] = str(retry_after)
+    return response
+
+
+app.add_exception_handler(ExecutorSaturated, scoring_busy_handler)
+
+
+def embedding_unavailable_handler(request: Request, exc: EmbedServerUnavailable) -> JSONResponse:
+    logger.warning("Embedding server unavailable: %s", exc)
+    response = JSONResponse({"detail": "embedding_unavailable"}, status_code=503)
+    limiter_module.inject_rate_headers(response, request)
+    response.headers["Retry-After"] = str(SCORE_RETRY_AFTER_SECONDS)
+    return response
+
+
+app.add_exception_handler(EmbedServerUnavailable, embedding_unavailable_handler)
+
+
 @app.get("/metrics")
 async def metrics_route(request: Request):
     return await metrics_endpoint(request)
 
 
+@app.get("/healthz")
+async def healthz() -> JSONResponse:
+    return JSONResponse({"status": "ok"})
+
+
+@app.get("/readyz")
+async def readyz() -> JSONResponse:
+    warm = score_module.is_ready()
+    # 未开启预加载时模型在首个请求时才加载：此时就绪，否则按就绪探针摘流的实例永远等不到请求
+    ready = warm or not SCORE_PRELOAD
+    return JSONResponse(
+        {
+            "ready": ready,
+            "warm": warm,
+            "index_version": score_module.get_index_version(),
+            "warmup_ms": {k: round(v * 1000, 2) for k, v in score_module.WARMUP_TIMINGS.items()},
+        },
+        status_code=200 if ready else 503,
+    )
+
+
 @app.get("/ethics")
 @limiter.limit("10/minute")
 def ethics_page(request: Request):
@@ -203,9 +321,18 @@ class ScoreRequest(BaseModel):
     text: str
 
 
+def _etag_matches(request: Request, etag_header: str) -> bool:
+    """Whether ``If-None-Match`` lists ``etag_header`` (or ``*``)."""
+    if_none_match = request.headers.get("if-none-match")
+    if not if_none_match:
+        return False
+    candidates = [value.strip() for value in if_none_match.split(",") if value.strip()]
+    return "*" in candidates or etag_header in candidates
+
+
 @app.post("/score")
 @limiter.limit(limiter_module.score_limit_string)
-async def score_endpoint(request: Request) -> JSONResponse:
+async def score_endpoint(request: Request) -> Response:
     limiter_module.consume_request_context(request)
     if limiter_module.should_block_for_spike(request):
         response = JSONResponse({"detail": "Rate limit exceeded"}, status_code=429)
@@ -213,6 +340,7 @@ async def score_endpoint(request: Request) -> JSONResponse:
         response.headers["X-Fireseed-Spike"] = "true"
         return response
     raw_body = await request.body()
+    start = time.perf_counter()
     try:
         data = orjson.loads(raw_body) if raw_body else {}
     except orjson.JSONDecodeError as exc:
@@ -222,19 +350,89 @@ async def score_endpoint(request: Request) -> JSONResponse:
         payload = ScoreRequest.model_validate(data)
     except ValidationError as exc:
         raise HTTPException(status_code=422, detail=exc.errors()) from exc
+    score_stage_seconds.labels(stage="parse").observe(time.perf_counter() - start)
 
     text = (payload.text or "").strip()
     if not text:
         raise HTTPException(status_code=400, detail="text is required")
 
-    uniqueness, explanations = compute_uniqueness(text)
-    response = JSONResponse(
+    (uniqueness, explanations), index_version = await get_coalescer().score(text)
+    start = time.perf_counter()
+    content = orjson.dumps(
         {
             "uniqueness": uniqueness,
             "ari": 60,
             "explanations": explanations,
+            "index_version": index_version,
         }
     )
+    etag_header = f'"{hashlib.sha256(content).hexdigest()[:16]}"'
+    score_stage_seconds.labels(stage="serialize").observe(time.perf_counter() - start)
+    if _etag_matches(request, etag_header):
+        response = Response(status_code=304)
+    else:
+        response = Response(content=content, media_type="application/json")
+    response.headers["ETag"] = etag_header
+    # 分数随索引版本变化，客户端/CDN 每次都需重新验证
+    response.headers["Cache-Control"] = "no-cache"
+    limiter_module.inject_rate_headers(response, request)
+    if limiter_module.spike_header_active(request):
+        response.headers["X-Fireseed-Spike"] = "true"
+    return response
+
+
+class ScoreBatchRequest(BaseModel):
+    texts: List[Any]
+    top_k: int = Field(5, ge=1, le=score_module.MAX_TOP_K)
+
+
+@app.post("/score/batch")
+@limiter.limit(limiter_module.score_limit_string)
+async def score_batch_endpoint(request: Request) -> JSONResponse:
+    limiter_module.consume_request_context(request)
+    if limiter_module.should_block_for_spike(request):
+        response = JSONResponse({"detail": "Rate limit exceeded"}, status_code=429)
+        limiter_module.inject_rate_headers(response, request)
+        response.headers["X-Fireseed-Spike"] = "true"
+        return response
+    raw_body = await request.body()
+    try:
+        data = orjson.loads(raw_body) if raw_body else {}
+    except orjson.JSONDecodeError as exc:
+        raise HTTPException(status_code=400, detail="invalid json body") from exc
+
+    try:
+        payload = ScoreBatchRequest.model_validate(data)
+    except ValidationError as exc:
+        raise HTTPException(status_code=422, detail=exc.errors()) from exc
+
+    if not payload.texts:
+        raise HTTPException(status_code=400, detail="texts is required")
+    if len(payload.texts) > score_module.BATCH_MAX_ITEMS:
+        raise HTTPException(status_code=413, detail="batch_too_large")
+
+    texts = [item.strip() if isinstance(item, str) else "" for item in payload.texts]
+    valid = [i for i, text in enumerate(texts) if text]
+    # 长文本会拆块，按实际 encode/搜索的行数计入上限与执行器配额
+    units = score_module.encode_units([texts[i] for i in valid])
+    if units > score_module.BATCH_MAX_ITEMS:
+        raise HTTPException(status_code=413, detail="batch_too_large")
+    scored, index_version = await get_scoring_executor().submit(
+        score_batch,
+        [texts[i] for i in valid],
+        payload.top_k,
+        units=max(1, units),
+    )
+
+    results: List[dict] = [{"error": "text is required"} for _ in texts]
+    for i, (uniqueness, explanations) in zip(valid, scored):
+        results[i] = {
+            "uniqueness": uniqueness,
+            "ari": 60,
+            "explanations": explanations,
+        }
+
+    response = JSONResponse({"results": results, "index_version": index_version})
     limiter_module.inject_rate_headers(response, request)
     if limiter_module.spike_header_active(request):
         response.headers["X-Fireseed-Spike"] = "true"
@@ -260,26 +458,8 @@ def _parse_score(value, field_name: str) -> int | None:
     return int(round(numeric))
 
 
-@app.post("/sharecard")
-@limiter.limit(limiter_module.score_limit_string)
-async def sharecard_endpoint(request: Request) -> Response:
-    limiter_module.consume_request_context(request)
-    if limiter_module.should_block_for_spike(request):
-        response = JSONResponse({"detail": "Rate limit exceeded"}, status_code=429)
-        limiter_module.inject_rate_headers(response, request)
-        response.headers["X-Fireseed-Spike"] = "true"
-        return response
-
-    start_time = time.perf_counter()
-    raw_body = await request.body()
-    try:
-        data = orjson.loads(raw_body) if raw_body else {}
-    except orjson.JSONDecodeError as exc:
-        raise HTTPException(status_code=400, detail="invalid json body") from exc
-
-    if not isinstance(data, dict):
-        raise HTTPException(status_code=400, detail="invalid json body")
-
+def _sharecard_fields(data: dict) -> dict:
+    """Validated card fields of a ``/sharecard`` request, shared by POST and GET."""
     title = str(data.get("title", "")).strip()
     url = str(data.get("url", "")).strip()
     if not title or not url:
@@ -288,19 +468,31 @@ async def sharecard_endpoint(request: Request) -> Response:
     subtitle_value = data.get("subtitle")
     subtitle = str(subtitle_value).strip() if subtitle_value is not None else ""
 
-    uniqueness_value = _parse_score(data.get("uniqueness"), "uniqueness")
-    ari_value = _parse_score(data.get("ari"), "ari")
-
     size_raw = data.get("size") or "1200x630"
     size_key = str(size_raw).lower()
     if size_key not in SIZE_MAP:
         raise HTTPException(status_code=400, detail="invalid size")
-    size_tuple = SIZE_MAP[size_key]
 
     explicit_format = data.get("format")
-    explicit_format_str = str(explicit_format) if explicit_format is not None else None
+    # 与 choose_format 一致地规范化：PNG 与 png 必须是同一个规范 URL、同一个签名
+    format_key = str(explicit_format).strip().lower() if explicit_format is not None else ""
+    return {
+        "title": title,
+        "subtitle": subtitle,
+        "uniqueness": _parse_score(data.get("uniqueness"), "uniqueness"),
+        "ari": _parse_score(data.get("ari"), "ari"),
+        "url": url,
+        "size": size_key,
+        "format": format_key or None,
+    }
+
+
+async def _sharecard_response(request: Request, fields: dict, capsule_id: Any, start_time: float) -> Response:
+    title, subtitle, url = fields["title"], fields["subtitle"], fields["url"]
+    uniqueness_value, ari_value = fields["uniqueness"], fields["ari"]
+    size_tuple = SIZE_MAP[fields["size"]]
     try:
-        fmt, content_type = choose_format(request.headers.get("accept"), explicit_format_str)
+        fmt, content_type = choose_format(request.headers.get("accept"), fields["format"])
     except ValueError as exc:
         raise HTTPException(status_code=400, detail="invalid format") from exc
 
@@ -314,48 +506,56 @@ async def sharecard_endpoint(request: Request) -> Response:
     etag = compute_etag(etag_payload, size_tuple, fmt)
     etag_header = f'"{etag}"'
 
-    if_none_match = request.headers.get("if-none-match")
-    if if_none_match:
-        candidates = [value.strip() for value in if_none_match.split(",") if value.strip()]
-        if "*" in candidates or etag_header in candidates:
-            response = Response(status_code=304)
-            response.headers["ETag"] = etag_header
-            response.headers["Cache-Control"] = "public, max-age=31536000, immutable"
-            limiter_module.inject_rate_headers(response, request)
-            if limiter_module.spike_header_active(request):
-                response.headers["X-Fireseed-Spike"] = "true"
-            elapsed_ms = (time.perf_counter() - start_time) * 1000
-            logger.info(
-                "sharecard.cached",
-                extra={
-                    "capsule_id": data.get("capsule_id"),
-                    "size": f"{size_tuple[0]}x{size_tuple[1]}",
-                    "format": fmt,
-                    "elapsed_ms": round(elapsed_ms, 2),
-                },
-            )
-            return response
-
-    render_payload = {
-        "title": title,
-        "url": url,
-    }
-    if subtitle:
-        render_payload["subtitle"] = subtitle
-    if uniqueness_value is not None:
-        render_payload["uniqueness"] = uniqueness_value
-    if ari_value is not None:
-        render_payload["ari"] = ari_value
-
-    image = render_sharecard(render_payload, size_tuple)
+    if _etag_matches(request, etag_header):
+        response = Response(status_code=304)
+        response.headers["ETag"] = etag_header
+        response.headers["Cache-Control"] = "public, max-age=31536000, immutable"
+        response.headers["Vary"] = "Accept"
+        limiter_module.inject_rate_headers(response, request)
+        if limiter_module.spike_header_active(request):
+            response.headers["X-Fireseed-Spike"] = "true"
+        elapsed_ms = (time.perf_counter() - start_time) * 1000
+        logger.info(
+            "sharecard.cached",
+            extra={
+                "capsule_id": capsule_id,
+                "size": f"{size_tuple[0]}x{size_tuple[1]}",
+                "format": fmt,
+                "elapsed_ms": round(elapsed_ms, 2),
+            },
+        )
+        return response
 
-    buffer = BytesIO()
-    image.save(buffer, format=fmt)
-    content = buffer.getvalue()
+    # 爬虫和社交预览几乎从不带 If-None-Match：同一张卡按 ETag 直接复用编码结果
+    cache = get_sharecard_cache()
+    cache_key = render_key(etag)
+    cached = cache.get(cache_key)
+    stage_ms = {}
+    if cached is not None:
+        cache_tier, content = cached
+    else:
+        cache_tier = "miss"
+        render_payload = {
+            "title": title,
+            "url": url,
+        }
+        if subtitle:
+            render_payload["subtitle"] = subtitle
+        if uniqueness_value is not None:
+            render_payload["uniqueness"] = uniqueness_value
+        if ari_value is not None:
+            render_payload["ari"] = ari_value
+
+        # Pillow 与 qrcode 在渲染进程池里执行；池满时 ExecutorSaturated -> 503
+        content, timings = await get_sharecard_executor().submit(render_encoded, render_payload, size_tuple, fmt)
+        stage_ms = {stage: round(seconds * 1000, 2) for stage, seconds in timings.items()}
+        cache.put(cache_key, content)
 
     response = Response(content=content, media_type=content_type)
     response.headers["ETag"] = etag_header
     response.headers["Cache-Control"] = "public, max-age=31536000, immutable"
+    # 未显式指定 format 时按 Accept 协商：共享缓存必须按 Accept 区分
+    response.headers["Vary"] = "Accept"
 
     limiter_module.inject_rate_headers(response, request)
     if limiter_module.spike_header_active(request):
@@ -363,9 +563,12 @@ async def sharecard_endpoint(request: Request) -> Response:
 
     elapsed_ms = (time.perf_counter() - start_time) * 1000
     logger.info(
-        "sharecard.render",
+        "sharecard.render %s",
+        {"cache": cache_tier, **stage_ms},
         extra={
-            "capsule_id": data.get("capsule_id"),
+            "event": "sharecard.render",
+            "latency_ms": round(elapsed_ms, 2),
+            "capsule_id": capsule_id,
             "size": f"{size_tuple[0]}x{size_tuple[1]}",
             "format": fmt,
             "elapsed_ms": round(elapsed_ms, 2),
@@ -375,6 +578,89 @@ async def sharecard_endpoint(request: Request) -> Response:
     return response
 
 
+@app.post("/sharecard")
+@limiter.limit(limiter_module.score_limit_string)
+async def sharecard_endpoint(request: Request) -> Response:
+    limiter_module.consume_request_context(request)
+    if limiter_module.should_block_for_spike(request):
+        response = JSONResponse({"detail": "Rate limit exceeded"}, status_code=429)
+        limiter_module.inject_rate_headers(response, request)
+        response.headers["X-Fireseed-Spike"] = "true"
+        return response
+
+    start_time = time.perf_counter()
+    raw_body = await request.body()
+    try:
+        data = orjson.loads(raw_body) if raw_body else {}
+    except orjson.JSONDecodeError as exc:
+        raise HTTPException(status_code=400, detail="invalid json body") from exc
+
+    if not isinstance(data, dict):
+        raise HTTPException(status_code=400, detail="invalid json body")
+
+    return await _sharecard_response(request, _sharecard_fields(data), data.get("capsule_id"), start_time)
+
+
+def _sharecard_query_data(request: Request) -> dict:
+    """Query parameters of ``GET /sharecard`` as the JSON body POST would receive."""
+    params = request.query_params
+    for name in params.keys():
+        if name != "sig" and name not in QUERY_FIELDS:
+            raise HTTPException(status_code=400, detail=f"unsupported query parameter: {name}")
+        if len(params.getlist(name)) > 1:
+            raise HTTPException(status_code=400, detail=f"duplicate query parameter: {name}")
+    data: dict = {name: params[name] for name in QUERY_FIELDS if name in params}
+    for name in ("uniqueness", "ari"):
+        if name not in data:
+            continue
+        try:
+            numeric = float(data[name])
+        except ValueError:
+            numeric = math.nan
+        if not math.isfinite(numeric):
+            raise HTTPException(status_code=400, detail=f"{name} must be a number between 0 and 100")
+        data[name] = numeric
+    return data
+
+
+@app.get("/sharecard")
+@limiter.limit(limiter_module.score_limit_string)
+async def sharecard_get_endpoint(request: Request) -> Response:
+    """CDN-cacheable variant of ``POST /sharecard``.
+
+    Every card has exactly one URL: the query built by
+    :func:`server.sharecard.sharecard_query`. Other spellings of the same
+    fields are permanently redirected to it so edge caches hold a single
+    copy per card. With ``SHARECARD_HMAC_KEY`` set the query must carry a
+    valid ``sig``, so only cards this service linked can be rendered.
+    """
+    limiter_module.consume_request_context(request)
+    if limiter_module.should_block_for_spike(request):
+        response = JSONResponse({"detail": "Rate limit exceeded"}, status_code=429)
+        limiter_module.inject_rate_headers(response, request)
+        response.headers["X-Fireseed-Spike"] = "true"
+        return response
+
+    start_time = time.perf_counter()
+    fields = _sharecard_fields(_sharecard_query_data(request))
+
+    if SHARECARD_HMAC_KEY:
+        expected = sharecard_query(fields, SHARECARD_HMAC_KEY)
+        signature = request.query_params.get("sig", "")
+        if not hmac.compare_digest(signature.encode(), expected.rsplit("&sig=", 1)[1].encode()):
+            raise HTTPException(status_code=403, detail="invalid signature")
+    else:
+        expected = canonical_query(fields)
+
+    if request.url.query != expected:
+        response = Response(status_code=301, headers={"Location": f"/sharecard?{expected}"})
+        response.headers["Cache-Control"] = "public, max-age=31536000, immutable"
+        limiter_module.inject_rate_headers(response, request)
+        return response
+
+    return await _sharecard_response(request, fields, None, start_time)
+
+
 @app.get("/landing/{capsule_id}")
 @limiter.limit(limiter_module.score_limit_string)
 async def landing_page(request: Request, capsule_id: str):
@@ -0,0 +1,146 @@
+from __future__ import annotations
+
+import asyncio
+import logging
+import os
+from functools import lru_cache
+from typing import Callable, Dict, List, Optional, Sequence, Set, Tuple
+
+from . import score as score_module
+from .executor import BoundedExecutor, get_scoring_executor
+from .metrics import (
+    score_coalesce_max_batch,
+    score_coalesce_queue_depth,
+    score_coalesce_window_seconds,
+)
+
+logger = logging.getLogger(__name__)
+
+ScoreResult = Tuple[int, List[str]]
+BatchScorer = Callable[[Sequence[str], int], score_module.ScoredBatch]
+
+WINDOW_MS = float(os.getenv("SCORE_COALESCE_WINDOW_MS", "5"))
+MAX_BATCH = int(os.getenv("SCORE_COALESCE_MAX_BATCH", "32"))
+
+
+def _default_scorer(texts: Sequence[str], top_k: int) -> score_module.ScoredBatch:
+    return score_module.score_batch(texts, top_k)
+
+
+class ScoreCoalescer:
+    """Gather concurrent /score calls into one batched encode plus search.
+
+    The first queued request opens a window of ``window_seconds``; everything
+    that arrives before it closes (up to ``max_batch``) is scored together and
+    each caller is resolved through its own future with its result and the
+    index version of the batch that scored it. Batches run on the bounded
+    scoring executor, so the event loop keeps serving other routes and
+    :meth:`score` raises ``ExecutorSaturated`` once too much work is queued.
+    """
+
+    def __init__(
+        self,
+        window_seconds: float,
+        max_batch: int,
+        scorer: Optional[BatchScorer] = None,
+        executor: Optional[BoundedExecutor] = None,
+    ) -> None:
+        self.window_seconds = max(0.0, window_seconds)
+        self.max_batch = max(1, max_batch)
+        self._scorer = scorer or _default_scorer
+        self._executor = executor
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._queue: Optional[asyncio.Queue] = None
+        self._task: Optional[asyncio.Task] = None
+        self._flushes: Set[asyncio.Task] = set()
+        score_coalesce_window_seconds.set(self.window_seconds)
+        score_coalesce_max_batch.set(self.max_batch)
+
+    @property
+    def enabled(self) -> bool:
+        return self.window_seconds > 0 and self.max_batch > 1
+
+    @property
+    def executor(self) -> BoundedExecutor:
+        if self._executor is None:
+            self._executor = get_scoring_executor()
+        return self._executor
+
+    def _ensure_worker(self) -> asyncio.Queue:
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop or self._task is None or self._task.done():
+            # 每个事件循环各自一个队列（TestClient 每次请求可能换新循环）
+            self._loop = loop
+            self._queue = asyncio.Queue()
+            self._task = loop.create_task(self._run(self._queue))
+        assert self._queue is not None
+        return self._queue
+
+    async def score(self, text: str, top_k: int = 5) -> Tuple[ScoreResult, str]:
+        executor = self.executor
+        units = max(1, score_module.encode_units([text]))
+        executor.admit(units)
+        try:
+            if not self.enabled:
+                batch = await executor.run(self._scorer, [text], top_k)
+                return batch.results[0], batch.index_version
+            queue = self._ensure_worker()
+            future: asyncio.Future = asyncio.get_running_loop().create_future()
+            queue.put_nowait((text, top_k, future))
+            score_coalesce_queue_depth.set(queue.qsize())
+            return await future
+        finally:
+            executor.release(units)
+
+    async def _collect(self, queue: asyncio.Queue) -> list:
+        loop = asyncio.get_running_loop()
+        batch = [await queue.get()]
+        deadline = loop.time() + self.window_seconds
+        while len(batch) < self.max_batch:
+            try:
+                batch.append(queue.get_nowait())
+                continue
+            except asyncio.QueueEmpty:
+                pass
+            remaining = deadline - loop.time()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(queue.get(), remaining))
+            except asyncio.TimeoutError:
+                break
+        score_coalesce_queue_depth.set(queue.qsize())
+        return batch
+
+    async def _run(self, queue: asyncio.Queue) -> None:
+        while True:
+            batch = await self._collect(queue)
+            groups: Dict[int, list] = {}
+            for item in batch:
+                groups.setdefault(item[1], []).append(item)
+            for top_k, items in groups.items():
+                # 不等待本批完成，窗口继续收集下一批
+                task = asyncio.get_running_loop().create_task(self._flush(top_k, items))
+                self._flushes.add(task)
+                task.add_done_callback(self._flushes.discard)
+
+    async def _flush(self, top_k: int, items: list) -> None:
+        live = [(text, future) for text, _, future in items if not future.done()]
+        if not live:
+            return
+        try:
+            batch = await self.executor.run(self._scorer, [text for text, _ in live], top_k)
+        except Exception as exc:
+            logger.exception("Coalesced scoring failed: %s", exc)
+            for _, future in live:
+                if not future.done():
+                    future.set_exception(exc)
+            return
+        for (_, future), result in zip(live, batch.results):
+            if not future.done():
+                future.set_result((result, batch.index_version))
+
+
+@lru_cache(maxsize=1)
+def get_coalescer() -> ScoreCoalescer:
+    return ScoreCoalescer(WINDOW_MS / 1000.0, MAX_BATCH)
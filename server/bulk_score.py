@@ -0,0 +1,226 @@
+"""Re-score a JSONL archive offline with the same code path as ``/score``.
+
+    python -m server.bulk_score archive.jsonl scores.jsonl --workers 4
+
+Every input line is a JSON object with an id and a text (``--id-field`` /
+``--text-field``). The input is streamed in chunks of ``--chunk-size`` lines;
+each chunk is scored by :func:`server.score.score_batch` in one of
+``--workers`` spawned processes, each holding its own model and a
+memory-mapped index (``--workers 0`` scores in this process). Results are
+written in input order, one JSON object per line:
+
+    {"id": ..., "uniqueness": 42, "explanations": [...], "index_version": ...}
+
+Lines that cannot be scored produce ``{"id": ..., "line": n, "error": ...}``.
+
+After every chunk the output is fsynced and ``<output>.ckpt`` records how
+many input lines and output bytes are complete. A killed job rerun with the
+same arguments truncates any half-written tail and continues from there; a
+checkpoint made with another model or index version is refused unless
+``--restart`` is given.
+"""
+from __future__ import annotations
+
+import argparse
+import logging
+import multiprocessing as mp
+import os
+import sys
+from collections import deque
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional, Sequence, Tuple
+
+import orjson
+
+from . import score as score_module
+
+logger = logging.getLogger(__name__)
+
+Task = Tuple[int, List[bytes], int, str, str]
+
+
+def checkpoint_path(output_path: Path) -> Path:
+    return output_path.with_name(output_path.name + ".ckpt")
+
+
+def _init_worker() -> None:
+    # 子进程各自加载 mmap 索引（模型在第一个分块时加载），离线任务不需要热加载线程
+    score_module.reload_index()
+
+
+def score_lines(task: Task) -> Tuple[int, bytes]:
+    """Score one chunk of raw JSONL lines; returns ``(lines consumed, output bytes)``."""
+    first_line, lines, top_k, id_field, text_field = task
+    records: List[Dict[str, Any]] = []
+    texts: List[str] = []
+    for offset, raw in enumerate(lines):
+        if not raw.strip():
+            continue
+        record: Dict[str, Any] = {"line": first_line + offset}
+        try:
+            item = orjson.loads(raw)
+        except orjson.JSONDecodeError:
+            record["error"] = "invalid json"
+            records.append(record)
+            continue
+        if not isinstance(item, dict):
+            record["error"] = "invalid json"
+            records.append(record)
+            continue
+        record["id"] = item.get(id_field)
+        text = item.get(text_field)
+        text = text.strip() if isinstance(text, str) else ""
+        if not text:
+            record["error"] = "text is required"
+        else:
+            record["text_index"] = len(texts)
+            texts.append(text)
+        records.append(record)
+
+    if texts:
+        # 模型加载失败时让任务中止，而不是把整份归档写成 fallback 分数
+        score_module.get_model()
+    if texts:
+        scored, index_version = score_module.score_batch(texts, top_k)
+    else:
+        scored, index_version = [], score_module.get_index_version()
+    out = bytearray()
+    for record in records:
+        if "error" in record:
+            row = {"id": record.get("id"), "line": record["line"], "error": record["error"]}
+        else:
+            uniqueness, explanations = scored[record["text_index"]]
+            row = {
+                "id": record["id"],
+                "uniqueness": uniqueness,
+                "explanations": explanations,
+                "index_version": index_version,
+            }
+        out += orjson.dumps(row) + b"\n"
+    return len(lines), bytes(out)
+
+
+def _read_tasks(
+    input_path: Path, skip: int, chunk_size: int, top_k: int, id_field: str, text_field: str
+) -> Iterator[Task]:
+    with open(input_path, "rb") as handle:
+        for _ in range(skip):
+            if not handle.readline():
+                return
+        line_number = skip + 1
+        chunk: List[bytes] = []
+        for raw in handle:
+            chunk.append(raw)
+            if len(chunk) >= chunk_size:
+                yield line_number, chunk, top_k, id_field, text_field
+                line_number += len(chunk)
+                chunk = []
+        if chunk:
+            yield line_number, chunk, top_k, id_field, text_field
+
+
+def _ordered_results(tasks: Iterator[Task], workers: int) -> Iterator[Tuple[int, bytes]]:
+    if workers <= 0:
+        for task in tasks:
+            yield score_lines(task)
+        return
+    # 子进程只在启动时读取这些设置；spawn 会继承环境变量
+    os.environ.setdefault("INDEX_LOAD_MODE", "mmap")
+    os.environ["INDEX_RELOAD_INTERVAL"] = "0"
+    ctx = mp.get_context("spawn")
+    with ctx.Pool(workers, initializer=_init_worker) as pool:
+        # 有界的在途任务队列：保持输出顺序，同时不把整个输入读进内存
+        pending: deque = deque()
+        for task in tasks:
+            pending.append(pool.apply_async(score_lines, (task,)))
+            if len(pending) >= workers * 2:
+                yield pending.popleft().get()
+        while pending:
+            yield pending.popleft().get()
+
+
+def _write_checkpoint(path: Path, state: Dict[str, Any]) -> None:
+    tmp = path.with_name(path.name + ".tmp")
+    tmp.write_bytes(orjson.dumps(state))
+    os.replace(tmp, path)
+
+
+def run(
+    input_path: Path,
+    output_path: Path,
+    workers: int = 1,
+    chunk_size: int = 256,
+    top_k: int = 5,
+    id_field: str = "id",
+    text_field: str = "text",
+    restart: bool = False,
+) -> Dict[str, Any]:
+    """Score ``input_path`` into ``output_path``, resuming from its checkpoint."""
+    ckpt = checkpoint_path(output_path)
+    state: Dict[str, Any] = {
+        "input": str(input_path.resolve()),
+        "model": score_module.model_identity(),
+        "index_version": score_module.index_version_on_disk(),
+        "lines": 0,
+        "output_bytes": 0,
+    }
+    if ckpt.exists() and not restart:
+        previous = orjson.loads(ckpt.read_bytes())
+        for field in ("input", "model", "index_version"):
+            if previous.get(field) != state[field]:
+                raise RuntimeError(
+                    f"checkpoint {ckpt.name} was made with {field}={previous.get(field)!r}, "
+                    f"now {state[field]!r}; rerun with --restart"
+                )
+        state.update(lines=previous["lines"], output_bytes=previous["output_bytes"])
+    resumed = state["lines"]
+
+    output_path.parent.mkdir(parents=True, exist_ok=True)
+    with open(output_path, "a+b") as out:
+        # 丢弃上次被中断时写了一半的尾部
+        out.truncate(state["output_bytes"])
+        out.seek(state["output_bytes"])
+        tasks = _read_tasks(input_path, state["lines"], chunk_size, top_k, id_field, text_field)
+        for consumed, payload in _ordered_results(tasks, workers):
+            out.write(payload)
+            out.flush()
+            os.fsync(out.fileno())
+            state["lines"] += consumed
+            state["output_bytes"] = out.tell()
+            _write_checkpoint(ckpt, state)
+            logger.info("Scored %d lines", state["lines"])
+    return {"lines": state["lines"], "resumed": resumed, "index_version": state["index_version"]}
+
+
+def main(argv: Optional[Sequence[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description="Score a JSONL archive offline.")
+    parser.add_argument("input", type=Path)
+    parser.add_argument("output", type=Path)
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="scoring processes (0 = in-process)")
+    parser.add_argument("--chunk-size", type=int, default=256)
+    parser.add_argument("--top-k", type=int, default=5)
+    parser.add_argument("--id-field", default="id")
+    parser.add_argument("--text-field", default="text")
+    parser.add_argument("--restart", action="store_true", help="ignore an existing checkpoint and start over")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO)
+    try:
+        summary = run(
+            args.input,
+            args.output,
+            args.workers,
+            args.chunk_size,
+            args.top_k,
+            args.id_field,
+            args.text_field,
+            args.restart,
+        )
+    except RuntimeError as exc:
+        print(f"bulk_score: {exc}", file=sys.stderr)
+        sys.exit(2)
+    print(orjson.dumps(summary).decode())
+
+
+if __name__ == "__main__":
+    main()
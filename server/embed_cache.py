@@ -0,0 +1,256 @@
+from __future__ import annotations
+
+import fcntl
+import hashlib
+import logging
+import os
+import unicodedata
+from collections import OrderedDict
+from contextlib import contextmanager
+from functools import lru_cache
+from pathlib import Path
+from threading import Lock
+from typing import Any, Dict, Iterator, List, Optional, Sequence
+
+import numpy as np
+import orjson
+
+from .metrics import embed_cache_hits_total, embed_cache_misses_total
+
+logger = logging.getLogger(__name__)
+
+CACHE_DIR = Path(__file__).resolve().parents[1] / "data" / "embed_cache"
+MEMORY_SIZE = int(os.getenv("EMBED_CACHE_SIZE", "4096"))
+DISK_ROWS = int(os.getenv("EMBED_CACHE_DISK_ROWS", "100000"))
+DISK_DTYPE = os.getenv("EMBED_CACHE_DISK_DTYPE", "float16")
+
+_KEY_BYTES = 16
+
+
+def normalize_text(text: str) -> str:
+    """NFKC-normalize and collapse whitespace so trivially different inputs share a key."""
+    return " ".join(unicodedata.normalize("NFKC", text).split())
+
+
+def cache_key(text: str, model_id: str) -> bytes:
+    payload = model_id.encode("utf-8") + b"\0" + normalize_text(text).encode("utf-8")
+    return hashlib.blake2b(payload, digest_size=_KEY_BYTES).digest()
+
+
+class MemoryLRU:
+    """Bounded in-process LRU keyed by bytes (vectors here, score results in ``score``)."""
+
+    def __init__(self, capacity: int) -> None:
+        self.capacity = max(0, capacity)
+        self._data: "OrderedDict[bytes, Any]" = OrderedDict()
+        self._lock = Lock()
+
+    def get(self, key: bytes) -> Optional[Any]:
+        with self._lock:
+            vector = self._data.get(key)
+            if vector is not None:
+                self._data.move_to_end(key)
+            return vector
+
+    def put(self, key: bytes, vector: Any) -> None:
+        if self.capacity == 0:
+            return
+        with self._lock:
+            self._data[key] = vector
+            self._data.move_to_end(key)
+            while len(self._data) > self.capacity:
+                self._data.popitem(last=False)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+
+
+class DiskStore:
+    """Fixed-capacity ring of vectors in memory-mapped files shared by workers.
+
+    ``keys.bin`` holds one 16-byte key per row, ``vectors.bin`` the matching
+    vectors and ``head.bin`` the number of rows ever written; row
+    ``head % capacity`` is overwritten next, so the oldest row goes first once
+    the ring is full. Writers serialize on ``lock`` and fill a row as: clear
+    its key, write the vector, write the new key, then advance the head.
+    Readers copy the vector and re-check the key afterwards, so a row being
+    rewritten by another worker is a miss, never a wrong vector.
+
+    Each process keeps a key -> row map; on a miss it first indexes the rows
+    other workers wrote since its last look at the head.
+    """
+
+    def __init__(self, directory: Path, capacity: int, dtype: str = "float16") -> None:
+        if dtype not in {"float16", "float32"}:
+            raise ValueError(f"unsupported cache dtype: {dtype}")
+        self.directory = directory
+        self.capacity = capacity
+        self.dtype = np.dtype(dtype)
+        self.dim: Optional[int] = None
+        self._keys: Optional[np.memmap] = None
+        self._vectors: Optional[np.memmap] = None
+        self._head: Optional[np.memmap] = None
+        self._rows: Dict[bytes, int] = {}
+        # 已建索引的 head 位置
+        self._synced = 0
+        # 已有目录布局不符或损坏时置位：只告警一次，之后不再读写磁盘
+        self._disabled = False
+        self._lock = Lock()
+        self._open_existing()
+
+    @property
+    def _meta_path(self) -> Path:
+        return self.directory / "meta.json"
+
+    def _open_existing(self) -> None:
+        if not self._meta_path.exists():
+            return
+        try:
+            meta = orjson.loads(self._meta_path.read_bytes())
+            if meta.get("capacity") != self.capacity or meta.get("dtype") != self.dtype.name:
+                logger.warning("Embedding cache layout changed; ignoring %s", self.directory)
+                self._disabled = True
+                return
+            self._map(int(meta["dim"]), mode="r+")
+        except Exception as exc:  # pragma: no cover - corrupted cache is skipped
+            logger.warning("Unable to open embedding cache %s: %s", self.directory, exc)
+            self._keys = self._vectors = self._head = None
+            self.dim = None
+            self._disabled = True
+            return
+        self._sync()
+
+    def _map(self, dim: int, mode: str) -> None:
+        self.dim = dim
+        self._keys = np.memmap(self.directory / "keys.bin", dtype=np.uint8, mode=mode, shape=(self.capacity, _KEY_BYTES))
+        self._vectors = np.memmap(self.directory / "vectors.bin", dtype=self.dtype, mode=mode, shape=(self.capacity, dim))
+        self._head = np.memmap(self.directory / "head.bin", dtype=np.int64, mode=mode, shape=(1,))
+
+    def _create(self, dim: int) -> None:
+        self.directory.mkdir(parents=True, exist_ok=True)
+        # 在文件锁内创建：另一个 worker 可能同时启动，不能截断它已映射的文件
+        with self._file_lock():
+            if self._meta_path.exists():
+                self._open_existing()
+                return
+            self._map(dim, mode="w+")
+            tmp = self._meta_path.with_suffix(".tmp")
+            tmp.write_bytes(orjson.dumps({"dim": dim, "capacity": self.capacity, "dtype": self.dtype.name}))
+            os.replace(tmp, self._meta_path)
+
+    @contextmanager
+    def _file_lock(self) -> Iterator[None]:
+        with open(self.directory / "lock", "a+b") as handle:
+            fcntl.flock(handle, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(handle, fcntl.LOCK_UN)
+
+    def _sync(self) -> None:
+        """Index the rows written (by any worker) since the last call."""
+        if self._disabled:
+            return
+        if self._keys is None and self._meta_path.exists():
+            self._open_existing()
+            return
+        if self._keys is None or self._head is None:
+            return
+        head = int(self._head[0])
+        if head == self._synced:
+            return
+        if head - self._synced >= self.capacity or head < self._synced or len(self._rows) > 2 * self.capacity:
+            self._rows.clear()
+            rows = range(self.capacity)
+        else:
+            rows = (position % self.capacity for position in range(self._synced, head))
+        for row in rows:
+            key = self._keys[row].tobytes()
+            if any(key):
+                self._rows[key] = row
+        self._synced = head
+
+    def _read(self, key: bytes) -> Optional[np.ndarray]:
+        row = self._rows.get(key)
+        if row is None or self._keys is None or self._vectors is None:
+            return None
+        if self._keys[row].tobytes() != key:
+            self._rows.pop(key, None)
+            return None
+        vector = np.array(self._vectors[row], dtype=np.float32)
+        # 复制后再校验一次：期间被改写的行当作未命中
+        if self._keys[row].tobytes() != key:
+            self._rows.pop(key, None)
+            return None
+        return vector
+
+    def get(self, key: bytes) -> Optional[np.ndarray]:
+        vector = self._read(key)
+        if vector is None:
+            with self._lock:
+                self._sync()
+            vector = self._read(key)
+        return vector
+
+    def put(self, key: bytes, vector: np.ndarray) -> None:
+        if self.capacity <= 0 or self._disabled or self._read(key) is not None:
+            return
+        with self._lock:
+            if self._vectors is None:
+                self._create(int(vector.shape[-1]))
+            if self._disabled or vector.shape[-1] != self.dim:
+                return
+            assert self._keys is not None and self._vectors is not None and self._head is not None
+            with self._file_lock():
+                head = int(self._head[0])
+                row = head % self.capacity
+                self._rows.pop(self._keys[row].tobytes(), None)
+                self._keys[row] = 0
+                self._vectors[row] = vector.astype(self.dtype, copy=False)
+                self._keys[row] = np.frombuffer(key, dtype=np.uint8)
+                # head 最后推进：其他 worker 同步到的行都已写完
+                self._head[0] = head + 1
+            self._rows[key] = row
+
+
+class EmbeddingCache:
+    """Memory LRU in front of an optional memory-mapped disk tier."""
+
+    def __init__(self, memory_size: int, disk: Optional[DiskStore] = None) -> None:
+        self.memory = MemoryLRU(memory_size)
+        self.disk = disk
+
+    def get_many(self, keys: Sequence[bytes]) -> List[Optional[np.ndarray]]:
+        found: List[Optional[np.ndarray]] = []
+        for key in keys:
+            vector = self.memory.get(key)
+            if vector is not None:
+                embed_cache_hits_total.labels(tier="memory").inc()
+            elif self.disk is not None:
+                vector = self.disk.get(key)
+                if vector is not None:
+                    embed_cache_hits_total.labels(tier="disk").inc()
+                    self.memory.put(key, vector)
+            if vector is None:
+                embed_cache_misses_total.inc()
+            found.append(vector)
+        return found
+
+    def put_many(self, keys: Sequence[bytes], vectors: Sequence[np.ndarray]) -> None:
+        for key, vector in zip(keys, vectors):
+            self.memory.put(key, vector)
+            if self.disk is not None:
+                try:
+                    self.disk.put(key, vector)
+                except OSError as exc:  # pragma: no cover - disk full or read-only volume
+                    logger.warning("Embedding cache write failed: %s", exc)
+
+
+@lru_cache(maxsize=None)
+def get_embedding_cache(model_id: str) -> EmbeddingCache:
+    disk = None
+    if DISK_ROWS > 0:
+        slug = hashlib.sha256(model_id.encode("utf-8")).hexdigest()[:12]
+        disk = DiskStore(CACHE_DIR / slug, DISK_ROWS, DISK_DTYPE)
+    return EmbeddingCache(MEMORY_SIZE, disk)
@@ -0,0 +1,276 @@
+"""Single embedding process shared by every web worker.
+
+    python -m server.embed_server --socket /run/fireseed/embed.sock
+
+One process owns the model; uvicorn workers started with
+``EMBED_SERVER_SOCKET`` pointing at the same path get a :class:`RemoteEncoder`
+from :func:`server.score.get_model` instead of loading their own copy. Requests
+from all workers are coalesced into shared ``encode`` batches here, so torch
+intra-op threads are no longer split between competing processes.
+
+Wire format, over a Unix stream socket, every message is a 4-byte big-endian
+length followed by the payload:
+
+* request: ``orjson`` object ``{"texts": [...]}``;
+* response: ``!II`` header ``(rows, dim)`` then ``rows * dim`` float32 values,
+  or ``rows == 0xFFFFFFFF`` followed by a UTF-8 error message.
+"""
+from __future__ import annotations
+
+import argparse
+import asyncio
+import logging
+import os
+import socket
+import struct
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import List, Optional, Sequence
+
+import numpy as np
+import orjson
+
+logger = logging.getLogger(__name__)
+
+MAX_BATCH = int(os.getenv("EMBED_SERVER_MAX_BATCH", "128"))
+WINDOW_MS = float(os.getenv("EMBED_SERVER_WINDOW_MS", "2"))
+# 单次往返的读写期限；超时即整批失败，不再逐条重试
+CLIENT_TIMEOUT = float(os.getenv("EMBED_SERVER_TIMEOUT", "10"))
+CONNECT_TIMEOUT = float(os.getenv("EMBED_SERVER_CONNECT_TIMEOUT", "1"))
+
+_LENGTH = struct.Struct("!I")
+_SHAPE = struct.Struct("!II")
+_ERROR_ROWS = 0xFFFFFFFF
+_MAX_FRAME = 64 * 1024 * 1024
+
+
+class EmbedServerError(RuntimeError):
+    """The embedding server rejected or failed a request."""
+
+
+class EmbedServerUnavailable(EmbedServerError):
+    """The embedding server could not be reached or did not answer in time.
+
+    Retrying the texts one by one would only wait again, so callers treat
+    this as a failure of the whole batch.
+    """
+
+
+def _frame(payload: bytes) -> bytes:
+    return _LENGTH.pack(len(payload)) + payload
+
+
+def encode_vectors(vectors: np.ndarray) -> bytes:
+    vectors = np.ascontiguousarray(vectors, dtype=np.float32)
+    return _SHAPE.pack(vectors.shape[0], vectors.shape[1]) + vectors.tobytes()
+
+
+def encode_error(message: str) -> bytes:
+    return _SHAPE.pack(_ERROR_ROWS, 0) + message.encode("utf-8")
+
+
+def decode_response(payload: bytes) -> np.ndarray:
+    rows, dim = _SHAPE.unpack_from(payload)
+    body = payload[_SHAPE.size :]
+    if rows == _ERROR_ROWS:
+        raise EmbedServerError(body.decode("utf-8", errors="replace"))
+    return np.frombuffer(body, dtype=np.float32).reshape(rows, dim)
+
+
+class EmbeddingServer:
+    """Accept texts from many connections and encode them in shared batches."""
+
+    def __init__(self, model, max_batch: int = MAX_BATCH, window_seconds: float = WINDOW_MS / 1000.0) -> None:
+        self.model = model
+        self.max_batch = max(1, max_batch)
+        self.window_seconds = max(0.0, window_seconds)
+        # 模型只在一个线程里运行，torch 的线程池不再被多个调用方争抢
+        self._encoder = ThreadPoolExecutor(max_workers=1, thread_name_prefix="fireseed-embed")
+        self._queue: Optional[asyncio.Queue] = None
+
+    def _encode(self, texts: Sequence[str]) -> List[Optional[np.ndarray]]:
+        from .score import _encode_batch
+
+        return _encode_batch(self.model, texts)
+
+    async def _batch_loop(self) -> None:
+        assert self._queue is not None
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = [await self._queue.get()]
+            size = len(batch[0][0])
+            deadline = loop.time() + self.window_seconds
+            while size < self.max_batch:
+                remaining = deadline - loop.time()
+                try:
+                    item = self._queue.get_nowait() if remaining <= 0 else await asyncio.wait_for(self._queue.get(), remaining)
+                except (asyncio.QueueEmpty, asyncio.TimeoutError):
+                    break
+                batch.append(item)
+                size += len(item[0])
+            texts = [text for item_texts, _ in batch for text in item_texts]
+            try:
+                vectors = await loop.run_in_executor(self._encoder, self._encode, texts)
+            except Exception as exc:  # pragma: no cover - defensive logging
+                logger.exception("embed_server encode failed: %s", exc)
+                for _, future in batch:
+                    if not future.done():
+                        future.set_exception(exc)
+                continue
+            offset = 0
+            for item_texts, future in batch:
+                part = vectors[offset : offset + len(item_texts)]
+                offset += len(item_texts)
+                if future.done():
+                    continue
+                if any(vec is None for vec in part):
+                    future.set_exception(EmbedServerError("encode failed"))
+                else:
+                    future.set_result(np.stack(part) if part else np.empty((0, 0), dtype=np.float32))
+
+    async def _handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        assert self._queue is not None
+        loop = asyncio.get_running_loop()
+        try:
+            while True:
+                try:
+                    header = await reader.readexactly(_LENGTH.size)
+                except asyncio.IncompleteReadError:
+                    break
+                (length,) = _LENGTH.unpack(header)
+                if length > _MAX_FRAME:
+                    writer.write(_frame(encode_error("request too large")))
+                    break
+                request = orjson.loads(await reader.readexactly(length))
+                texts = request.get("texts") if isinstance(request, dict) else None
+                if not isinstance(texts, list) or not all(isinstance(text, str) for text in texts):
+                    writer.write(_frame(encode_error("texts must be a list of strings")))
+                    await writer.drain()
+                    continue
+                future: asyncio.Future = loop.create_future()
+                await self._queue.put((texts, future))
+                try:
+                    payload = encode_vectors(await future)
+                except Exception as exc:
+                    payload = encode_error(str(exc) or type(exc).__name__)
+                writer.write(_frame(payload))
+                await writer.drain()
+        finally:
+            writer.close()
+
+    async def serve(self, socket_path: Path, ready: Optional[threading.Event] = None) -> None:
+        self._queue = asyncio.Queue()
+        socket_path.parent.mkdir(parents=True, exist_ok=True)
+        if socket_path.exists():
+            socket_path.unlink()
+        batcher = asyncio.create_task(self._batch_loop())
+        server = await asyncio.start_unix_server(self._handle, path=str(socket_path))
+        logger.info("embed_server listening on %s", socket_path)
+        if ready is not None:
+            ready.set()
+        try:
+            async with server:
+                await server.serve_forever()
+        finally:
+            batcher.cancel()
+            self._encoder.shutdown(wait=False)
+
+
+class RemoteEncoder:
+    """``SentenceTransformer.encode``-compatible client of :class:`EmbeddingServer`.
+
+    Each thread keeps its own connection, so scoring executor threads can
+    encode concurrently; the server merges their requests into one batch.
+    """
+
+    def __init__(
+        self,
+        socket_path: str,
+        timeout: float = CLIENT_TIMEOUT,
+        connect_timeout: float = CONNECT_TIMEOUT,
+    ) -> None:
+        self.socket_path = socket_path
+        self.timeout = timeout
+        self.connect_timeout = connect_timeout
+        self._local = threading.local()
+
+    def _connect(self) -> socket.socket:
+        conn = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        try:
+            conn.settimeout(self.connect_timeout)
+            conn.connect(self.socket_path)
+        except OSError:
+            conn.close()
+            raise
+        conn.settimeout(self.timeout)
+        return conn
+
+    def _recv_exact(self, conn: socket.socket, size: int) -> bytes:
+        chunks = []
+        while size:
+            chunk = conn.recv(min(size, 1 << 20))
+            if not chunk:
+                raise ConnectionError("embedding server closed the connection")
+            chunks.append(chunk)
+            size -= len(chunk)
+        return b"".join(chunks)
+
+    def _roundtrip(self, payload: bytes) -> bytes:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = self._local.conn = self._connect()
+        try:
+            conn.sendall(_frame(payload))
+            (length,) = _LENGTH.unpack(self._recv_exact(conn, _LENGTH.size))
+            return self._recv_exact(conn, length)
+        except OSError:
+            conn.close()
+            self._local.conn = None
+            raise
+
+    def encode(self, texts: Sequence[str], **kwargs) -> np.ndarray:
+        """Return L2-normalized float32 embeddings; extra keyword arguments are ignored.
+
+        Raises :class:`EmbedServerUnavailable` when the server times out or
+        stays unreachable after one reconnect.
+        """
+        texts = list(texts)
+        if not texts:
+            return np.empty((0, 0), dtype=np.float32)
+        payload = orjson.dumps({"texts": texts})
+        try:
+            try:
+                response = self._roundtrip(payload)
+            except (ConnectionError, BrokenPipeError):
+                # 服务端重启后重连一次
+                response = self._roundtrip(payload)
+        except TimeoutError as exc:
+            raise EmbedServerUnavailable(f"embedding server timed out after {self.timeout}s") from exc
+        except OSError as exc:
+            raise EmbedServerUnavailable(f"embedding server unreachable: {exc}") from exc
+        return decode_response(response)
+
+
+def main(argv: Optional[Sequence[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description="Serve embeddings to web workers over a Unix socket.")
+    parser.add_argument("--socket", type=Path, default=Path(os.getenv("EMBED_SERVER_SOCKET", "/tmp/fireseed-embed.sock")))
+    parser.add_argument("--max-batch", type=int, default=MAX_BATCH)
+    parser.add_argument("--window-ms", type=float, default=WINDOW_MS)
+    parser.add_argument("--threads", type=int, default=0, help="torch intra-op threads (0 keeps the default)")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO)
+    if args.threads > 0:
+        import torch
+
+        torch.set_num_threads(args.threads)
+
+    from .score import load_local_model
+
+    server = EmbeddingServer(load_local_model(), args.max_batch, args.window_ms / 1000.0)
+    asyncio.run(server.serve(args.socket))
+
+
+if __name__ == "__main__":
+    main()
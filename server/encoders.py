@@ -0,0 +1,187 @@
+"""Selectable CPU inference backends for the embedding model.
+
+``ENCODER_BACKEND`` picks how ``models/bge-small-zh-v1.5`` is run:
+
+* ``torch`` (default) – the fp32 ``SentenceTransformer``;
+* ``int8`` – the same model with ``torch.nn.Linear`` layers dynamically
+  quantized to int8;
+* ``onnx`` – an exported ONNX graph run by ``onnxruntime`` (install it
+  separately). Export once with ``python -m server.encoders export-onnx``.
+
+Every backend exposes ``encode(texts, batch_size, normalize_embeddings,
+convert_to_numpy)`` like ``SentenceTransformer``. Vectors from different
+backends are not bit-identical, so the backend is part of the model identity
+used for embedding-cache keys, and index vectors should be rebuilt with the
+backend that serves queries.
+
+Accuracy contract, checked by ``scripts/bench_encoder_backends.py`` over its
+fixed text set against fp32 torch: every uniqueness score stays within
+``SCORE_TOLERANCE`` points and every embedding keeps a cosine of at least
+``MIN_COSINE`` to its fp32 counterpart.
+"""
+from __future__ import annotations
+
+import argparse
+import logging
+import os
+from pathlib import Path
+from typing import Optional, Sequence
+
+import numpy as np
+import orjson
+
+logger = logging.getLogger(__name__)
+
+BACKENDS = ("torch", "int8", "onnx")
+BACKEND = os.getenv("ENCODER_BACKEND", "torch").strip().lower() or "torch"
+ONNX_FILE = os.getenv("ENCODER_ONNX_FILE", "onnx/model.onnx")
+ONNX_THREADS = int(os.getenv("ENCODER_ONNX_THREADS", "0"))
+MAX_SEQ_LENGTH = int(os.getenv("ENCODER_MAX_SEQ_LENGTH", "512"))
+
+# 相对 fp32 torch 的允许偏差：uniqueness 分数（0–100）与单条向量余弦相似度
+SCORE_TOLERANCE = 2
+MIN_COSINE = 0.99
+
+
+def _pooling_mode(model_dir: Path) -> str:
+    """Read the sentence-transformers pooling config; bge models use CLS."""
+    config = model_dir / "1_Pooling" / "config.json"
+    try:
+        data = orjson.loads(config.read_bytes())
+    except (FileNotFoundError, orjson.JSONDecodeError):
+        return "cls"
+    if data.get("pooling_mode_cls_token"):
+        return "cls"
+    return "mean"
+
+
+class OnnxEncoder:
+    """Run an exported transformer graph with onnxruntime and pool like the original model."""
+
+    def __init__(self, model_dir: Path, onnx_file: str = ONNX_FILE, threads: int = ONNX_THREADS) -> None:
+        import onnxruntime as ort  # lazy import
+        from transformers import AutoTokenizer  # lazy import
+
+        graph = model_dir / onnx_file
+        if not graph.exists():
+            raise FileNotFoundError(f"{graph} not found; run python -m server.encoders export-onnx")
+        options = ort.SessionOptions()
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        if threads > 0:
+            options.intra_op_num_threads = threads
+        self.session = ort.InferenceSession(str(graph), options, providers=["CPUExecutionProvider"])
+        self.tokenizer = AutoTokenizer.from_pretrained(str(model_dir))
+        self.pooling = _pooling_mode(model_dir)
+        self._inputs = {node.name for node in self.session.get_inputs()}
+
+    def _forward(self, texts: Sequence[str]) -> np.ndarray:
+        tokens = self.tokenizer(
+            list(texts),
+            padding=True,
+            truncation=True,
+            max_length=MAX_SEQ_LENGTH,
+            return_tensors="np",
+        )
+        feed = {name: tokens[name].astype(np.int64) for name in self._inputs if name in tokens}
+        hidden = self.session.run(None, feed)[0]
+        if self.pooling == "cls":
+            return hidden[:, 0]
+        mask = tokens["attention_mask"][..., None].astype(hidden.dtype)
+        return (hidden * mask).sum(axis=1) / np.clip(mask.sum(axis=1), 1e-9, None)
+
+    def encode(
+        self,
+        texts: Sequence[str],
+        batch_size: int = 32,
+        normalize_embeddings: bool = False,
+        convert_to_numpy: bool = True,
+        **kwargs,
+    ) -> np.ndarray:
+        texts = list(texts)
+        if not texts:
+            return np.empty((0, 0), dtype=np.float32)
+        parts = [self._forward(texts[i : i + batch_size]) for i in range(0, len(texts), batch_size)]
+        vectors = np.concatenate(parts).astype(np.float32, copy=False)
+        if normalize_embeddings:
+            vectors /= np.clip(np.linalg.norm(vectors, axis=1, keepdims=True), 1e-12, None)
+        return vectors
+
+
+def _quantize_int8(model):
+    import torch  # lazy import
+
+    model.eval()
+    return torch.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
+
+
+def load_encoder(model_dir: Path, backend: str = BACKEND):
+    """Load the embedding model at ``model_dir`` with the requested backend."""
+    if backend not in BACKENDS:
+        raise ValueError(f"unknown ENCODER_BACKEND {backend!r}; expected one of {', '.join(BACKENDS)}")
+    if backend == "onnx":
+        return OnnxEncoder(model_dir)
+
+    from sentence_transformers import SentenceTransformer  # lazy import
+
+    model = SentenceTransformer(str(model_dir), device="cpu")
+    if backend == "int8":
+        model = _quantize_int8(model)
+    return model
+
+
+def export_onnx(model_dir: Path, output: Optional[Path] = None, opset: int = 17) -> Path:
+    """Export the transformer body of ``model_dir`` to ONNX with dynamic batch and length axes."""
+    import torch  # lazy import
+    from transformers import AutoModel, AutoTokenizer  # lazy import
+
+    output = output or model_dir / ONNX_FILE
+    output.parent.mkdir(parents=True, exist_ok=True)
+    tokenizer = AutoTokenizer.from_pretrained(str(model_dir))
+    model = AutoModel.from_pretrained(str(model_dir)).eval()
+    sample = tokenizer(["火种"], return_tensors="pt")
+    names = [name for name in ("input_ids", "attention_mask", "token_type_ids") if name in sample]
+    dynamic = {name: {0: "batch", 1: "sequence"} for name in names}
+    dynamic["last_hidden_state"] = {0: "batch", 1: "sequence"}
+
+    class _Body(torch.nn.Module):
+        def __init__(self, inner):
+            super().__init__()
+            self.inner = inner
+
+        def forward(self, *args):
+            return self.inner(**dict(zip(names, args))).last_hidden_state
+
+    tmp = output.with_name(output.name + ".tmp")
+    with torch.no_grad():
+        torch.onnx.export(
+            _Body(model),
+            tuple(sample[name] for name in names),
+            str(tmp),
+            input_names=names,
+            output_names=["last_hidden_state"],
+            dynamic_axes=dynamic,
+            opset_version=opset,
+        )
+    os.replace(tmp, output)
+    logger.info("exported %s", output)
+    return output
+
+
+def main(argv: Optional[Sequence[str]] = None) -> None:
+    from .score import _model_path
+
+    parser = argparse.ArgumentParser(description="Embedding backend utilities.")
+    sub = parser.add_subparsers(dest="command", required=True)
+    export = sub.add_parser("export-onnx", help="export the model for ENCODER_BACKEND=onnx")
+    export.add_argument("--model-dir", type=Path, default=_model_path())
+    export.add_argument("--output", type=Path, default=None)
+    export.add_argument("--opset", type=int, default=17)
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO)
+    if args.command == "export-onnx":
+        print(export_onnx(args.model_dir, args.output, args.opset))
+
+
+if __name__ == "__main__":
+    main()
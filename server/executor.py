@@ -0,0 +1,132 @@
+from __future__ import annotations
+
+import asyncio
+import multiprocessing
+import os
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from functools import lru_cache, partial
+from threading import Lock
+from typing import Any, Callable, Optional
+
+from .metrics import score_inflight, score_rejections_total, sharecard_inflight, sharecard_rejections_total
+
+
+class ExecutorSaturated(RuntimeError):
+    """Raised when a bounded executor has no room for more work."""
+
+
+class BoundedExecutor:
+    """Thread or process pool with a hard cap on admitted work.
+
+    Callers reserve capacity with :meth:`admit` before queueing and give it
+    back with :meth:`release`; once ``max_inflight`` units are outstanding,
+    :meth:`admit` raises :class:`ExecutorSaturated` immediately instead of
+    letting work pile up behind the pool.
+    """
+
+    def __init__(
+        self,
+        kind: str,
+        workers: int,
+        max_inflight: int,
+        on_change: Optional[Callable[[int], None]] = None,
+        on_reject: Optional[Callable[[], None]] = None,
+    ) -> None:
+        if kind not in {"thread", "process"}:
+            raise ValueError(f"unsupported executor kind: {kind}")
+        self.kind = kind
+        self.workers = max(1, workers)
+        self.max_inflight = max(1, max_inflight)
+        self._inflight = 0
+        self._lock = Lock()
+        self._pool: Optional[Executor] = None
+        self._on_change = on_change
+        self._on_reject = on_reject
+
+    @property
+    def inflight(self) -> int:
+        return self._inflight
+
+    def _get_pool(self) -> Executor:
+        if self._pool is None:
+            if self.kind == "process":
+                # spawn 避免在已有线程（torch、uvicorn）的进程里 fork
+                self._pool = ProcessPoolExecutor(
+                    max_workers=self.workers,
+                    mp_context=multiprocessing.get_context("spawn"),
+                )
+            else:
+                self._pool = ThreadPoolExecutor(
+                    max_workers=self.workers,
+                    thread_name_prefix="fireseed-exec",
+                )
+        return self._pool
+
+    def admit(self, units: int = 1) -> None:
+        with self._lock:
+            if self._inflight + units > self.max_inflight:
+                if self._on_reject is not None:
+                    self._on_reject()
+                raise ExecutorSaturated("executor saturated")
+            self._inflight += units
+            current = self._inflight
+        if self._on_change is not None:
+            self._on_change(current)
+
+    def release(self, units: int = 1) -> None:
+        with self._lock:
+            self._inflight = max(0, self._inflight - units)
+            current = self._inflight
+        if self._on_change is not None:
+            self._on_change(current)
+
+    async def run(self, fn: Callable[..., Any], *args: Any) -> Any:
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._get_pool(), partial(fn, *args))
+
+    async def submit(self, fn: Callable[..., Any], *args: Any, units: int = 1) -> Any:
+        self.admit(units)
+        try:
+            return await self.run(fn, *args)
+        finally:
+            self.release(units)
+
+    def shutdown(self) -> None:
+        if self._pool is not None:
+            self._pool.shutdown(wait=False, cancel_futures=True)
+            self._pool = None
+
+
+SCORE_EXECUTOR_KIND = os.getenv("SCORE_EXECUTOR", "thread")
+SCORE_EXECUTOR_WORKERS = int(os.getenv("SCORE_EXECUTOR_WORKERS", str(min(4, os.cpu_count() or 1))))
+SCORE_MAX_INFLIGHT = int(os.getenv("SCORE_MAX_INFLIGHT", "256"))
+SCORE_RETRY_AFTER_SECONDS = int(os.getenv("SCORE_RETRY_AFTER_SECONDS", "1"))
+
+
+@lru_cache(maxsize=1)
+def get_scoring_executor() -> BoundedExecutor:
+    return BoundedExecutor(
+        SCORE_EXECUTOR_KIND,
+        SCORE_EXECUTOR_WORKERS,
+        SCORE_MAX_INFLIGHT,
+        on_change=score_inflight.set,
+        on_reject=score_rejections_total.inc,
+    )
+
+
+# sharecard 渲染是纯 CPU 的 Pillow/qrcode 工作，默认放进独立进程池，不占用事件循环与 GIL
+SHARECARD_EXECUTOR_KIND = os.getenv("SHARECARD_EXECUTOR", "process")
+SHARECARD_EXECUTOR_WORKERS = int(os.getenv("SHARECARD_EXECUTOR_WORKERS", str(min(2, os.cpu_count() or 1))))
+SHARECARD_MAX_INFLIGHT = int(os.getenv("SHARECARD_MAX_INFLIGHT", "16"))
+SHARECARD_RETRY_AFTER_SECONDS = int(os.getenv("SHARECARD_RETRY_AFTER_SECONDS", "2"))
+
+
+@lru_cache(maxsize=1)
+def get_sharecard_executor() -> BoundedExecutor:
+    return BoundedExecutor(
+        SHARECARD_EXECUTOR_KIND,
+        SHARECARD_EXECUTOR_WORKERS,
+        SHARECARD_MAX_INFLIGHT,
+        on_change=sharecard_inflight.set,
+        on_reject=sharecard_rejections_total.inc,
+    )
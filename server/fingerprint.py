@@ -0,0 +1,201 @@
+"""Lexical SimHash fingerprints for near-duplicate detection before embedding.
+
+``examples.simhash.npy`` sits next to ``examples.index`` and holds one
+``(row, fingerprint)`` pair per indexed capsule whose text was available at
+build time. A fingerprint is the 64-bit SimHash of the character 3-gram
+shingles of the normalized, lower-cased text, so it also works for Chinese
+text without word boundaries.
+
+Lookups use LSH banding: the 64 bits are split into ``max_distance + 1``
+bands, so by the pigeonhole principle any fingerprint within
+``max_distance`` bits shares at least one band exactly with the query. Only
+those candidates are compared bit by bit.
+"""
+from __future__ import annotations
+
+import logging
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+import orjson
+
+from .embed_cache import normalize_text
+from .index_store import read_version_file, shards_manifest_path, stamps_current, vectors_path
+
+logger = logging.getLogger(__name__)
+
+SHINGLE = 3
+_BITS = 64
+_BIT_SHIFTS = np.arange(_BITS, dtype=np.uint64)
+_POPCOUNT = np.array([bin(i).count("1") for i in range(256)], dtype=np.uint8)
+_PRIMES = np.array([0x9E3779B97F4A7C15, 0xC2B2AE3D27D4EB4F, 0x165667B19E3779F9], dtype=np.uint64)
+
+
+def simhash_path(index_path: Path) -> Path:
+    return index_path.with_name(index_path.stem + ".simhash.npy")
+
+
+def _mix(values: np.ndarray) -> np.ndarray:
+    # splitmix64 finalizer：让相邻码点组合的哈希位分布均匀
+    values = values ^ (values >> np.uint64(30))
+    values = values * np.uint64(0xBF58476D1CE4E5B9)
+    values = values ^ (values >> np.uint64(27))
+    values = values * np.uint64(0x94D049BB133111EB)
+    return values ^ (values >> np.uint64(31))
+
+
+def shingle_count(text: str) -> int:
+    return max(0, len(normalize_text(text)) - SHINGLE + 1)
+
+
+def simhash(text: str) -> int:
+    """64-bit SimHash of the distinct character shingles of ``text`` (0 if too short)."""
+    normalized = normalize_text(text).lower()
+    codepoints = np.frombuffer(normalized.encode("utf-32-le"), dtype="<u4").astype(np.uint64)
+    count = codepoints.size - SHINGLE + 1
+    if count <= 0:
+        return 0
+    with np.errstate(over="ignore"):
+        hashes = np.zeros(count, dtype=np.uint64)
+        for offset in range(SHINGLE):
+            hashes += codepoints[offset : offset + count] * _PRIMES[offset]
+        hashes = _mix(np.unique(hashes))
+    bits = (hashes[:, None] >> _BIT_SHIFTS) & np.uint64(1)
+    votes = bits.sum(axis=0, dtype=np.int64) * 2 > hashes.size
+    return int((votes.astype(np.uint64) << _BIT_SHIFTS).sum(dtype=np.uint64))
+
+
+def hamming(fingerprints: np.ndarray, query: int) -> np.ndarray:
+    diff = np.ascontiguousarray(fingerprints ^ np.uint64(query), dtype="<u8")
+    return _POPCOUNT[diff.view(np.uint8)].reshape(-1, 8).sum(axis=1)
+
+
+class ShardVectors:
+    """Row access across the memory-mapped vector files of a sharded index."""
+
+    def __init__(self, blocks: List[np.ndarray], offsets: List[int]) -> None:
+        self.blocks = blocks
+        self.offsets = np.asarray(offsets, dtype=np.int64)
+
+    def __getitem__(self, row: int) -> np.ndarray:
+        shard = int(np.searchsorted(self.offsets, row, side="right")) - 1
+        return self.blocks[shard][row - int(self.offsets[shard])]
+
+
+def _open_vectors(index_path: Path) -> Tuple[Any, List[Path]]:
+    """Memory-mapped row access to the index vectors and the files behind it."""
+    npy = vectors_path(index_path)
+    if npy.exists():
+        return np.load(npy, mmap_mode="r"), [npy]
+    manifest = shards_manifest_path(index_path)
+    if manifest.exists():
+        shards = orjson.loads(manifest.read_bytes())["shards"]
+        files = [vectors_path(index_path.parent / shard["path"]) for shard in shards]
+        blocks = [np.load(path, mmap_mode="r") for path in files]
+        return ShardVectors(blocks, [int(shard["offset"]) for shard in shards]), files
+    return None, []
+
+
+def _check_version(index_path: Path, version: str, files: List[Path]) -> None:
+    record = read_version_file(index_path)
+    if record is None or record[0] != version:
+        raise RuntimeError(f"index version on disk is no longer {version}")
+    names = [str(path.relative_to(index_path.parent)) for path in files]
+    stamps = record[1]
+    # 行号只在同一次构建的指纹与向量之间有意义
+    if any(name not in stamps for name in names) or not stamps_current(index_path, {name: stamps[name] for name in names}):
+        raise RuntimeError(f"fingerprints and vectors on disk are not both from version {version}")
+
+
+class SimHashIndex:
+    """Banded SimHash lookup that returns the stored vector of the closest row."""
+
+    def __init__(
+        self,
+        rows: np.ndarray,
+        fingerprints: np.ndarray,
+        vectors: Optional[np.ndarray],
+        max_distance: int = 3,
+        min_shingles: int = 16,
+    ) -> None:
+        self.rows = np.asarray(rows, dtype=np.int64)
+        self.fingerprints = np.asarray(fingerprints, dtype=np.uint64)
+        self.vectors = vectors
+        self.max_distance = max(0, max_distance)
+        self.min_shingles = min_shingles
+        bands = self.max_distance + 1
+        width = -(-_BITS // bands)
+        self._bands: List[Tuple[np.uint64, np.uint64]] = [
+            (np.uint64(start), np.uint64((1 << min(width, _BITS - start)) - 1)) for start in range(0, _BITS, width)
+        ]
+        self._tables: List[Dict[int, np.ndarray]] = []
+        for shift, mask in self._bands:
+            keys = (self.fingerprints >> shift) & mask
+            order = np.argsort(keys, kind="stable")
+            unique, starts = np.unique(keys[order], return_index=True)
+            groups = np.split(order, starts[1:]) if order.size else []
+            self._tables.append({int(key): group for key, group in zip(unique, groups)})
+
+    def __len__(self) -> int:
+        return int(self.rows.size)
+
+    @classmethod
+    def open(
+        cls, index_path: Path, max_distance: int = 3, min_shingles: int = 16, version: Optional[str] = None
+    ) -> Optional["SimHashIndex"]:
+        """Load the fingerprints and memory-map the vectors; None if either is missing.
+
+        With ``version``, both files must be the ones that build recorded in
+        the version sidecar, otherwise :class:`RuntimeError` is raised.
+        """
+        path = simhash_path(index_path)
+        if not path.exists():
+            return None
+        vectors, files = _open_vectors(index_path)
+        if vectors is None:
+            return None
+        pairs = np.load(path)
+        if version is not None:
+            _check_version(index_path, version, [path] + files)
+        return cls(pairs[:, 0], pairs[:, 1], vectors, max_distance, min_shingles)
+
+    def nearest(self, fingerprint: int) -> Optional[Tuple[int, int]]:
+        """``(row, distance)`` of the closest fingerprint within ``max_distance``."""
+        candidates = [
+            table.get(int((np.uint64(fingerprint) >> shift) & mask))
+            for (shift, mask), table in zip(self._bands, self._tables)
+        ]
+        found = [group for group in candidates if group is not None]
+        if not found:
+            return None
+        positions = np.unique(np.concatenate(found))
+        distances = hamming(self.fingerprints[positions], fingerprint)
+        best = int(np.argmin(distances))
+        if distances[best] > self.max_distance:
+            return None
+        return int(self.rows[positions[best]]), int(distances[best])
+
+    def match(self, text: str) -> Optional[np.ndarray]:
+        """Stored float32 vector of a near-duplicate of ``text``, if one is indexed."""
+        if self.vectors is None or shingle_count(text) < self.min_shingles:
+            return None
+        hit = self.nearest(simhash(text))
+        if hit is None:
+            return None
+        return np.asarray(self.vectors[hit[0]], dtype=np.float32)
+
+
+def fingerprint_pairs(rows: np.ndarray, fingerprints: np.ndarray) -> np.ndarray:
+    """The ``(row, fingerprint)`` uint64 matrix stored in ``examples.simhash.npy``."""
+    pairs = np.stack([np.asarray(rows, dtype=np.uint64), np.asarray(fingerprints, dtype=np.uint64)], axis=1)
+    return pairs.reshape(-1, 2)
+
+
+def load_fingerprint_map(index_path: Path, ids: List[str]) -> Dict[str, int]:
+    """``capsule id -> fingerprint`` of an existing index, for ``--append`` builds."""
+    path = simhash_path(index_path)
+    if not path.exists():
+        return {}
+    pairs = np.load(path)
+    return {ids[int(row)]: int(fp) for row, fp in pairs if int(row) < len(ids)}
@@ -0,0 +1,418 @@
+"""Build ``data/examples.index`` from the capsules in ``data/capsules``.
+
+    python -m server.index_build                 # full rebuild
+    python -m server.index_build --append        # embed new capsule ids only
+
+Capsules are streamed in sorted order and embedded in large batches with the
+same model and encode path as :func:`server.score.compute_uniqueness`. Every
+embedded batch is checkpointed under ``data/examples.build/`` so an
+interrupted run resumes where it stopped. Outputs are replaced atomically:
+
+* ``examples.vectors.npy`` — normalized vectors (NumPy layout), float32 or
+  float16 with ``--vector-dtype``; this is what scoring uses without faiss;
+* ``examples.index`` — FAISS inner-product index of ``--index-type`` (exact
+  ``flat``, scalar-quantized ``sq8`` / ``sq-fp16`` or approximate
+  ``ivf-flat`` / ``ivf-pq`` / ``hnsw``), when faiss is installed;
+* ``examples.projection.npz`` — with ``--reduce pca|random`` the projection
+  to ``--reduce-dim`` dimensions; both files above then hold projected
+  vectors and scoring projects queries the same way (see
+  :mod:`server.reduction`). ``--append`` keeps the existing projection;
+* with ``--shards N`` (N > 1) the two files above are replaced by N slices
+  under ``examples.shards/`` plus the ``examples.shards.json`` manifest, served
+  by ``python -m server.shards serve`` (see :mod:`server.shards`);
+* ``examples.ids.json`` — row -> capsule id map;
+* ``examples.simhash.npy`` — SimHash fingerprints of the capsule texts for
+  the near-duplicate short-circuit (see :mod:`server.fingerprint`);
+* ``examples.index.version`` — content hash plus the stamp of every file
+  above, written last. The hot reloader only reacts to this file and
+  discards a load whose files no longer match the stamps (see
+  :func:`server.index_store.stamps_current`).
+"""
+from __future__ import annotations
+
+import argparse
+import hashlib
+import logging
+import os
+import shutil
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Mapping, Optional, Sequence, Tuple
+
+import numpy as np
+import orjson
+
+from . import score as score_module
+from .fingerprint import fingerprint_pairs, load_fingerprint_map, simhash, simhash_path
+from .index_store import (
+    INDEX_TYPES,
+    create_faiss_index,
+    file_stamp,
+    index_files,
+    shards_manifest_path,
+    vectors_path,
+    version_path,
+)
+from .reduction import METHODS as REDUCE_METHODS, Projection, projection_path, train_projection
+from .shards import read_manifest, shard_index_path, shards_dir
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_CAPSULES_DIR = Path(__file__).resolve().parents[1] / "data" / "capsules"
+_TEXT_FIELDS = ("title", "description", "summary", "details")
+
+
+def ids_path(index_path: Path) -> Path:
+    return index_path.with_name(index_path.stem + ".ids.json")
+
+
+def checkpoint_dir(index_path: Path) -> Path:
+    return index_path.with_name(index_path.stem + ".build")
+
+
+def capsule_text(capsule: Mapping[str, Any]) -> str:
+    """Text that represents a capsule in the example index."""
+    parts: List[str] = []
+    sources: List[Mapping[str, Any]] = [capsule]
+    content = capsule.get("content")
+    if isinstance(content, Mapping):
+        sources.append(content)
+    for source in sources:
+        for field in _TEXT_FIELDS:
+            value = source.get(field)
+            if isinstance(value, str) and value.strip():
+                parts.append(value.strip())
+    return "\n".join(parts)
+
+
+def iter_capsules(capsules_dir: Path) -> Iterator[Tuple[str, str]]:
+    """Yield ``(capsule_id, text)`` for every readable capsule, sorted by file name."""
+    for path in sorted(capsules_dir.glob("*.json")):
+        try:
+            capsule = orjson.loads(path.read_bytes())
+        except (OSError, orjson.JSONDecodeError) as exc:
+            logger.warning("Skipping unreadable capsule %s: %s", path.name, exc)
+            continue
+        if not isinstance(capsule, Mapping):
+            continue
+        text = capsule_text(capsule)
+        if text:
+            yield path.stem, text
+
+
+def _atomic_write_bytes(path: Path, data: bytes) -> None:
+    tmp = path.with_name(path.name + ".tmp")
+    tmp.write_bytes(data)
+    os.replace(tmp, path)
+
+
+def _atomic_save_npy(path: Path, array: np.ndarray) -> None:
+    tmp = path.with_name(path.name + ".tmp")
+    with open(tmp, "wb") as handle:
+        np.save(handle, array)
+    os.replace(tmp, path)
+
+
+class Checkpoint:
+    """Embedded batches of an unfinished build, stored as numbered parts."""
+
+    def __init__(self, directory: Path, model_id: str) -> None:
+        self.directory = directory
+        self.model_id = model_id
+
+    def load(self) -> Tuple[List[str], List[np.ndarray]]:
+        meta_path = self.directory / "meta.json"
+        if not meta_path.exists():
+            return [], []
+        meta = orjson.loads(meta_path.read_bytes())
+        if meta.get("model") != self.model_id:
+            logger.warning("Checkpoint was built with another model; starting over")
+            self.clear()
+            return [], []
+        ids: List[str] = []
+        parts: List[np.ndarray] = []
+        for part in sorted(self.directory.glob("part-*.npy")):
+            id_file = part.with_suffix(".json")
+            if not id_file.exists():
+                break
+            ids.extend(orjson.loads(id_file.read_bytes()))
+            parts.append(np.load(part))
+        return ids, parts
+
+    def save(self, number: int, ids: Sequence[str], vectors: np.ndarray) -> None:
+        self.directory.mkdir(parents=True, exist_ok=True)
+        _atomic_write_bytes(self.directory / "meta.json", orjson.dumps({"model": self.model_id}))
+        part = self.directory / f"part-{number:06d}.npy"
+        _atomic_save_npy(part, vectors)
+        # id 文件最后写入，存在即代表该批完整
+        _atomic_write_bytes(part.with_suffix(".json"), orjson.dumps(list(ids)))
+
+    def clear(self) -> None:
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+
+def _existing_vectors(index_path: Path) -> Optional[np.ndarray]:
+    manifest = shards_manifest_path(index_path)
+    if manifest.exists():
+        shards = read_manifest(manifest)["shards"]
+        return np.concatenate([np.load(vectors_path(index_path.parent / shard["path"])) for shard in shards])
+    npy = vectors_path(index_path)
+    return np.load(npy) if npy.exists() else None
+
+
+def _load_existing(index_path: Path) -> Tuple[List[str], Optional[np.ndarray]]:
+    id_file = ids_path(index_path)
+    if not id_file.exists():
+        return [], None
+    vectors = _existing_vectors(index_path)
+    if vectors is None:
+        return [], None
+    ids = orjson.loads(id_file.read_bytes())
+    vectors = vectors.astype(np.float32, copy=False)
+    if len(ids) != vectors.shape[0]:
+        raise RuntimeError(f"{id_file.name} and the index vectors disagree on row count")
+    return ids, vectors
+
+
+def _embed(texts: Sequence[str]) -> np.ndarray:
+    encoded = score_module._encode_batch(score_module.get_model(), texts)
+    if any(vec is None for vec in encoded):
+        raise RuntimeError("embedding failed for part of the batch")
+    return np.stack(encoded).astype(np.float32, copy=False)
+
+
+def _content_version(ids: Sequence[str], vectors: np.ndarray) -> str:
+    digest = hashlib.blake2b(digest_size=8)
+    digest.update(orjson.dumps(list(ids)))
+    digest.update(np.ascontiguousarray(vectors).tobytes())
+    return digest.hexdigest()
+
+
+def _write_vectors(
+    path: Path, vectors: np.ndarray, index_type: str, vector_dtype: str, **index_params: int
+) -> None:
+    """Write the NumPy layout and, if faiss is installed, the FAISS index for ``path``."""
+    _atomic_save_npy(vectors_path(path), vectors.astype(vector_dtype, copy=False))
+    try:
+        import faiss  # lazy import
+    except ImportError:
+        logger.warning("faiss not installed; only the NumPy layout was written")
+    else:
+        index = create_faiss_index(vectors, index_type, **index_params)
+        tmp = path.with_name(path.name + ".tmp")
+        faiss.write_index(index, str(tmp))
+        os.replace(tmp, path)
+
+
+def _write_shards(
+    index_path: Path,
+    vectors: np.ndarray,
+    shards: int,
+    version: str,
+    index_type: str,
+    vector_dtype: str,
+    **index_params: int,
+) -> None:
+    shards_dir(index_path).mkdir(parents=True, exist_ok=True)
+    entries = []
+    offset = 0
+    for shard, block in enumerate(np.array_split(vectors, shards)):
+        path = shard_index_path(index_path, shard)
+        _write_vectors(path, np.ascontiguousarray(block), index_type, vector_dtype, **index_params)
+        entries.append({"path": str(path.relative_to(index_path.parent)), "offset": offset, "ntotal": len(block)})
+        offset += len(block)
+    manifest = {"version": version, "dim": int(vectors.shape[1]), "shards": entries}
+    _atomic_write_bytes(shards_manifest_path(index_path), orjson.dumps(manifest))
+    keep = {Path(entry["path"]).stem for entry in entries}
+    for stale in shards_dir(index_path).glob("shard-*"):
+        if stale.name.split(".")[0] not in keep and stale.suffix != ".sock":
+            stale.unlink(missing_ok=True)
+    # 分片模式下不再保留单体索引文件
+    index_path.unlink(missing_ok=True)
+    vectors_path(index_path).unlink(missing_ok=True)
+
+
+def write_index(
+    index_path: Path,
+    ids: Sequence[str],
+    vectors: np.ndarray,
+    index_type: str = "flat",
+    vector_dtype: str = "float32",
+    fingerprints: Optional[Mapping[str, int]] = None,
+    shards: int = 1,
+    projection: Optional[Projection] = None,
+    **index_params: int,
+) -> str:
+    """Atomically write every index artifact and return the new version.
+
+    ``fingerprints`` maps capsule ids to their SimHash; without it any old
+    fingerprint file is removed so it can never point at the wrong rows.
+    With ``shards > 1`` the vectors are split into contiguous shards.
+    ``projection`` is saved alongside ``vectors``, which must already be
+    projected by it. The version sidecar is written after every other file
+    and records their stamps; the other files are replaced one by one, so
+    readers must go through the sidecar rather than watch them directly.
+    """
+    index_path.parent.mkdir(parents=True, exist_ok=True)
+    vectors = np.ascontiguousarray(vectors, dtype=np.float32)
+    version = _content_version(ids, vectors)
+    if projection is None:
+        projection_path(index_path).unlink(missing_ok=True)
+    else:
+        if projection.output_dim != vectors.shape[1]:
+            raise ValueError(f"vectors have {vectors.shape[1]} dimensions, projection outputs {projection.output_dim}")
+        projection.save(projection_path(index_path))
+    if shards > 1:
+        _write_shards(index_path, vectors, shards, version, index_type, vector_dtype, **index_params)
+    else:
+        _write_vectors(index_path, vectors, index_type, vector_dtype, **index_params)
+        shards_manifest_path(index_path).unlink(missing_ok=True)
+    _atomic_write_bytes(ids_path(index_path), orjson.dumps(list(ids)))
+    if fingerprints is None:
+        simhash_path(index_path).unlink(missing_ok=True)
+    else:
+        rows = [row for row, capsule_id in enumerate(ids) if capsule_id in fingerprints]
+        pairs = fingerprint_pairs(np.array(rows), np.array([fingerprints[ids[row]] for row in rows], dtype=np.uint64))
+        _atomic_save_npy(simhash_path(index_path), pairs)
+    _write_version(index_path, version)
+    return version
+
+
+def _write_version(index_path: Path, version: str) -> None:
+    artifacts = index_files(index_path) + [ids_path(index_path), projection_path(index_path), simhash_path(index_path)]
+    manifest = shards_manifest_path(index_path)
+    if manifest.exists():
+        artifacts += [vectors_path(index_path.parent / shard["path"]) for shard in read_manifest(manifest)["shards"]]
+    stamps = {str(path.relative_to(index_path.parent)): file_stamp(path) for path in artifacts if path.exists()}
+    # 最后写入：热加载只看这个文件，并据此核对其余文件是否属于同一次构建
+    _atomic_write_bytes(version_path(index_path), orjson.dumps({"version": version, "files": stamps}))
+
+
+def build(
+    capsules_dir: Path,
+    index_path: Path,
+    batch_size: int = 256,
+    append: bool = False,
+    fresh: bool = False,
+    index_type: str = "flat",
+    vector_dtype: str = "float32",
+    shards: int = 1,
+    reduce: Optional[str] = None,
+    reduce_dim: int = 128,
+    **index_params: int,
+) -> Dict[str, Any]:
+    """Embed capsules into the example index; see the module docstring."""
+    existing_ids: List[str] = []
+    existing_vectors: Optional[np.ndarray] = None
+    if append:
+        existing_ids, existing_vectors = _load_existing(index_path)
+    projection: Optional[Projection] = None
+    if existing_vectors is not None:
+        # 已有向量已经按旧投影降维，追加时只能沿用同一个投影
+        projection = Projection.load(projection_path(index_path))
+        if reduce and (projection is None or projection.output_dim != reduce_dim):
+            logger.warning("--append keeps the existing index dimensions; ignoring --reduce")
+
+    fingerprints = load_fingerprint_map(index_path, existing_ids) if append else {}
+
+    checkpoint = Checkpoint(checkpoint_dir(index_path), score_module.model_identity())
+    if fresh:
+        checkpoint.clear()
+    done_ids, parts = checkpoint.load()
+    skip = set(existing_ids) | set(done_ids)
+    resumed = len(done_ids)
+
+    batch_ids: List[str] = []
+    batch_texts: List[str] = []
+    number = len(parts)
+
+    def flush() -> None:
+        nonlocal number
+        vectors = _embed(batch_texts)
+        checkpoint.save(number, batch_ids, vectors)
+        done_ids.extend(batch_ids)
+        parts.append(vectors)
+        number += 1
+        logger.info("Embedded %d capsules", len(done_ids))
+        batch_ids.clear()
+        batch_texts.clear()
+
+    for capsule_id, text in iter_capsules(capsules_dir):
+        if capsule_id not in fingerprints:
+            fingerprints[capsule_id] = simhash(text)
+        if capsule_id in skip:
+            continue
+        skip.add(capsule_id)
+        batch_ids.append(capsule_id)
+        batch_texts.append(text)
+        if len(batch_texts) >= batch_size:
+            flush()
+    if batch_texts:
+        flush()
+
+    if not done_ids:
+        checkpoint.clear()
+        return {"added": 0, "resumed": resumed, "total": len(existing_ids), "version": None}
+
+    # 检查点保存的是未降维的向量，投影在最后统一训练和应用
+    added = np.concatenate(parts, axis=0)
+    if existing_vectors is None and reduce:
+        projection = train_projection(added, reduce, reduce_dim)
+    if projection is not None:
+        added = projection.apply(added)
+    blocks = ([existing_vectors] if existing_vectors is not None else []) + [added]
+    ids = existing_ids + done_ids
+    version = write_index(
+        index_path,
+        ids,
+        np.concatenate(blocks, axis=0),
+        index_type,
+        vector_dtype,
+        fingerprints=fingerprints,
+        shards=shards,
+        projection=projection,
+        **index_params,
+    )
+    checkpoint.clear()
+    return {"added": len(done_ids), "resumed": resumed, "total": len(ids), "version": version}
+
+
+def main(argv: Optional[Sequence[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description="Build the example index from capsule JSON files.")
+    parser.add_argument("--capsules-dir", type=Path, default=DEFAULT_CAPSULES_DIR)
+    parser.add_argument("--output", type=Path, default=score_module._index_path())
+    parser.add_argument("--batch-size", type=int, default=256)
+    parser.add_argument("--append", action="store_true", help="only embed capsules missing from the current index")
+    parser.add_argument("--fresh", action="store_true", help="discard any checkpoint from an interrupted build")
+    parser.add_argument("--index-type", choices=INDEX_TYPES, default="flat")
+    parser.add_argument("--nlist", type=int, default=1024, help="IVF cells (capped by corpus size)")
+    parser.add_argument("--pq-m", type=int, default=48, help="PQ sub-quantizers; must divide the dimension")
+    parser.add_argument("--pq-bits", type=int, default=8)
+    parser.add_argument("--hnsw-m", type=int, default=32)
+    parser.add_argument("--vector-dtype", choices=["float32", "float16"], default="float32")
+    parser.add_argument("--shards", type=int, default=1, help="split the index across N shard processes")
+    parser.add_argument("--reduce", choices=REDUCE_METHODS, default=None, help="project vectors to --reduce-dim")
+    parser.add_argument("--reduce-dim", type=int, default=128)
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO)
+    summary = build(
+        args.capsules_dir,
+        args.output,
+        args.batch_size,
+        args.append,
+        args.fresh,
+        args.index_type,
+        args.vector_dtype,
+        args.shards,
+        args.reduce,
+        args.reduce_dim,
+        nlist=args.nlist,
+        pq_m=args.pq_m,
+        pq_bits=args.pq_bits,
+        hnsw_m=args.hnsw_m,
+    )
+    print(orjson.dumps(summary).decode())
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,253 @@
+"""Loading of the example index in eager or memory-mapped mode.
+
+Two on-disk layouts are understood, both next to ``data/examples.index``:
+
+* ``examples.index`` — a FAISS index file;
+* ``examples.vectors.npy`` — a NumPy ``(n, d)`` float32 or float16 matrix of
+  L2-normalized vectors, searched exactly by inner product. This is also the
+  backend used when ``faiss-cpu`` is not installed.
+
+The FAISS file is used whenever faiss is importable, otherwise the NumPy
+layout. In ``mmap`` mode both are mapped rather than read, so every worker
+shares one page-cache copy; FAISS index types without mmap support are read
+eagerly instead.
+
+``examples.index.version`` is written by the builder after every other file.
+It records the build version and the ``(inode, mtime, size)`` stamp of each
+artifact, so a reader can tell whether the files it loaded all belong to that
+build (see :func:`stamps_current`).
+
+When ``examples.shards.json`` exists the corpus is split across shard
+processes instead and a :class:`server.shards.ShardedIndex` client is
+returned (see :mod:`server.shards`).
+
+FAISS indexes may be exact (``flat``), exact over scalar-quantized storage
+(``sq8`` at 1 byte, ``sq-fp16`` at 2 bytes per dimension) or approximate
+(``ivf-flat``, ``ivf-pq``, ``hnsw``); ``nprobe`` and ``efSearch`` are applied after every
+load from ``INDEX_NPROBE`` / ``INDEX_EF_SEARCH`` and can be changed at runtime
+with :func:`apply_search_params`.
+"""
+from __future__ import annotations
+
+import importlib.util
+import logging
+import os
+from pathlib import Path
+from typing import Dict, List, Mapping, Optional, Sequence, Tuple
+
+import numpy as np
+import orjson
+
+logger = logging.getLogger(__name__)
+
+LOAD_MODE = os.getenv("INDEX_LOAD_MODE", "eager")
+NPROBE = int(os.getenv("INDEX_NPROBE", "16"))
+EF_SEARCH = int(os.getenv("INDEX_EF_SEARCH", "64"))
+# NumPy 后端每次参与矩阵乘的行数，限制临时内存
+NUMPY_BLOCK_ROWS = int(os.getenv("INDEX_NUMPY_BLOCK_ROWS", "65536"))
+
+INDEX_TYPES = ("flat", "sq8", "sq-fp16", "ivf-flat", "ivf-pq", "hnsw")
+# faiss 训练每个聚类中心至少需要约 39 个样本
+_MIN_POINTS_PER_CENTROID = 39
+
+
+def vectors_path(index_path: Path) -> Path:
+    return index_path.with_name(index_path.stem + ".vectors.npy")
+
+
+def shards_manifest_path(index_path: Path) -> Path:
+    return index_path.with_name(index_path.stem + ".shards.json")
+
+
+def version_path(index_path: Path) -> Path:
+    return index_path.with_name(index_path.name + ".version")
+
+
+def file_stamp(path: Path) -> List[int]:
+    stat = path.stat()
+    return [stat.st_ino, stat.st_mtime_ns, stat.st_size]
+
+
+def read_version_file(index_path: Path) -> Optional[Tuple[str, Dict[str, List[int]]]]:
+    """``(version, {relative path: stamp})`` from the sidecar, or None without one.
+
+    A plain-text sidecar (hand-written, or from an older builder) has a
+    version but no stamps.
+    """
+    try:
+        text = version_path(index_path).read_text(encoding="utf-8").strip()
+    except FileNotFoundError:
+        return None
+    if not text.startswith("{"):
+        return (text, {}) if text else None
+    record = orjson.loads(text)
+    return str(record["version"]), {name: list(stamp) for name, stamp in record.get("files", {}).items()}
+
+
+def stamps_current(index_path: Path, stamps: Mapping[str, Sequence[int]]) -> bool:
+    """Whether every file in ``stamps`` is still the one the build recorded."""
+    for name, stamp in stamps.items():
+        try:
+            if file_stamp(index_path.parent / name) != list(stamp):
+                return False
+        except FileNotFoundError:
+            return False
+    return True
+
+
+def index_files(index_path: Path) -> List[Path]:
+    """Existing files that make up the index, in load-preference order."""
+    candidates = (shards_manifest_path(index_path), index_path, vectors_path(index_path))
+    return [path for path in candidates if path.exists()]
+
+
+class NumpyFlatIndex:
+    """Exact inner-product index over a (possibly memory-mapped) matrix.
+
+    Exposes the subset of the FAISS interface the scorer uses: ``ntotal``,
+    ``d`` and ``search(queries, k) -> (distances, ids)``. The corpus is scanned
+    in blocks of ``block_rows``: each block is upcast to float32, multiplied
+    with the queries and reduced to its own top-k with ``argpartition``, so
+    float16 storage and memmaps never get materialized as one float32 copy.
+    """
+
+    def __init__(self, vectors: np.ndarray, block_rows: int = NUMPY_BLOCK_ROWS) -> None:
+        if vectors.ndim != 2:
+            raise ValueError("vectors must be a 2-D matrix")
+        if vectors.dtype not in (np.float16, np.float32):
+            raise ValueError(f"unsupported vector dtype: {vectors.dtype}")
+        self.vectors = vectors
+        self.ntotal = int(vectors.shape[0])
+        self.d = int(vectors.shape[1])
+        self.block_rows = max(1, block_rows)
+
+    @classmethod
+    def open(cls, path: Path, mmap: bool = True) -> "NumpyFlatIndex":
+        return cls(np.load(path, mmap_mode="r" if mmap else None))
+
+    def search(self, queries: np.ndarray, k: int) -> Tuple[np.ndarray, np.ndarray]:
+        queries = np.ascontiguousarray(queries, dtype=np.float32)
+        nq = queries.shape[0]
+        k = min(k, self.ntotal)
+        best_scores = np.empty((nq, 0), dtype=np.float32)
+        best_ids = np.empty((nq, 0), dtype=np.int64)
+        for start in range(0, self.ntotal, self.block_rows):
+            block = np.asarray(self.vectors[start : start + self.block_rows], dtype=np.float32)
+            scores = queries @ block.T
+            if k < scores.shape[1]:
+                local = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+            else:
+                local = np.broadcast_to(np.arange(scores.shape[1]), scores.shape)
+            best_scores = np.concatenate([best_scores, np.take_along_axis(scores, local, axis=1)], axis=1)
+            best_ids = np.concatenate([best_ids, local + start], axis=1)
+            if best_scores.shape[1] > k:
+                keep = np.argpartition(-best_scores, k - 1, axis=1)[:, :k]
+                best_scores = np.take_along_axis(best_scores, keep, axis=1)
+                best_ids = np.take_along_axis(best_ids, keep, axis=1)
+        order = np.argsort(-best_scores, axis=1, kind="stable")
+        return np.take_along_axis(best_scores, order, axis=1), np.take_along_axis(best_ids, order, axis=1)
+
+
+def _read_faiss(index_path: Path, mmap: bool):
+    import faiss  # lazy import
+
+    if not mmap:
+        return faiss.read_index(str(index_path))
+    flags = getattr(faiss, "IO_FLAG_MMAP_IFC", faiss.IO_FLAG_MMAP) | faiss.IO_FLAG_READ_ONLY
+    try:
+        return faiss.read_index(str(index_path), flags)
+    except RuntimeError as exc:
+        logger.warning("mmap load not supported for %s, reading eagerly: %s", index_path, exc)
+        return faiss.read_index(str(index_path))
+
+
+def index_factory_string(
+    index_type: str,
+    ntotal: int,
+    nlist: int = 1024,
+    pq_m: int = 48,
+    pq_bits: int = 8,
+    hnsw_m: int = 32,
+) -> str:
+    """FAISS factory string for ``index_type``, shrunk to what ``ntotal`` can train."""
+    if index_type not in INDEX_TYPES:
+        raise ValueError(f"unsupported index type: {index_type}")
+    if index_type == "flat":
+        return "Flat"
+    if index_type == "sq8":
+        return "SQ8"
+    if index_type == "sq-fp16":
+        return "SQfp16"
+    if index_type == "hnsw":
+        return f"HNSW{hnsw_m},Flat"
+    nlist = max(1, min(nlist, ntotal // _MIN_POINTS_PER_CENTROID))
+    if index_type == "ivf-flat":
+        return f"IVF{nlist},Flat"
+    if ntotal < _MIN_POINTS_PER_CENTROID * (1 << pq_bits):
+        raise ValueError(f"ivf-pq with {pq_bits}-bit codes needs at least {_MIN_POINTS_PER_CENTROID << pq_bits} vectors")
+    return f"IVF{nlist},PQ{pq_m}x{pq_bits}"
+
+
+def create_faiss_index(vectors: np.ndarray, index_type: str = "flat", **params: int):
+    """Build and fill an inner-product FAISS index of ``index_type``."""
+    import faiss  # lazy import
+
+    vectors = np.ascontiguousarray(vectors, dtype=np.float32)
+    factory = index_factory_string(index_type, int(vectors.shape[0]), **params)
+    index = faiss.index_factory(int(vectors.shape[1]), factory, faiss.METRIC_INNER_PRODUCT)
+    if not index.is_trained:
+        index.train(vectors)
+    index.add(vectors)
+    apply_search_params(index)
+    return index
+
+
+def apply_search_params(index, nprobe: Optional[int] = None, ef_search: Optional[int] = None) -> None:
+    """Set ``nprobe`` / ``efSearch`` on the index types that have them."""
+    try:
+        import faiss  # lazy import
+    except ImportError:
+        return
+    if not isinstance(index, faiss.Index):
+        return
+    params = {"nprobe": NPROBE if nprobe is None else nprobe, "efSearch": EF_SEARCH if ef_search is None else ef_search}
+    space = faiss.ParameterSpace()
+    for name, value in params.items():
+        try:
+            space.set_index_parameter(index, name, value)
+        except RuntimeError:
+            # 该类型索引没有此参数（如 Flat 没有 nprobe）
+            continue
+
+
+def set_default_search_params(nprobe: Optional[int] = None, ef_search: Optional[int] = None) -> None:
+    """Change the ``nprobe`` / ``efSearch`` applied to indexes loaded from now on."""
+    global NPROBE, EF_SEARCH
+    if nprobe is not None:
+        NPROBE = nprobe
+    if ef_search is not None:
+        EF_SEARCH = ef_search
+
+
+def _faiss_available() -> bool:
+    return importlib.util.find_spec("faiss") is not None
+
+
+def load_index(index_path: Path, mode: str = LOAD_MODE):
+    """Load the example index using ``mode`` (``eager`` or ``mmap``)."""
+    if mode not in {"eager", "mmap"}:
+        raise ValueError(f"unsupported index load mode: {mode}")
+    mmap = mode == "mmap"
+    manifest = shards_manifest_path(index_path)
+    if manifest.exists():
+        from .shards import ShardedIndex  # lazy import
+
+        return ShardedIndex.open(manifest)
+    npy = vectors_path(index_path)
+    if index_path.exists() and (_faiss_available() or not npy.exists()):
+        index = _read_faiss(index_path, mmap)
+        apply_search_params(index)
+        return index
+    if npy.exists():
+        return NumpyFlatIndex.open(npy, mmap=mmap)
+    raise FileNotFoundError(str(index_path))
@@ -3,7 +3,7 @@ from __future__ import annotations
 from starlette.responses import Response
 
 try:
-    from prometheus_client import Histogram, Counter, generate_latest, CONTENT_TYPE_LATEST
+    from prometheus_client import Histogram, Counter, Gauge, generate_latest, CONTENT_TYPE_LATEST
 
     _PROM_OK = True
 except Exception:  # pragma: no cover - fallback path
@@ -20,12 +20,105 @@ except Exception:  # pragma: no cover - fallback path
         def inc(self, *args, **kwargs):  # pragma: no cover - noop
             ...
 
+        def set(self, *args, **kwargs):  # pragma: no cover - noop
+            ...
+
+        def labels(self, *args, **kwargs):  # pragma: no cover - noop
+            return self
+
+        def remove(self, *args, **kwargs):  # pragma: no cover - noop
+            ...
+
 if _PROM_OK:
     score_latency_seconds = Histogram(
         "score_latency_seconds",
         "Latency of /score requests in seconds",
         buckets=[0.05, 0.1, 0.2, 0.5, 1.0, 2.0],
     )
+    score_stage_seconds = Histogram(
+        "score_stage_seconds",
+        "Latency of each /score stage (parse, encode, search, serialize) in seconds",
+        ["stage"],
+        buckets=[0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0],
+    )
+    score_batch_size = Histogram(
+        "score_batch_size",
+        "Number of texts per compute_uniqueness_batch call",
+        buckets=[1, 2, 4, 8, 16, 32, 64, 128],
+    )
+    score_fallback_total = Counter(
+        "score_fallback_total",
+        "Texts answered with the fallback score, by reason",
+        ["reason"],
+    )
+    score_coalesce_window_seconds = Gauge(
+        "score_coalesce_window_seconds",
+        "Configured /score coalescing window in seconds",
+    )
+    score_coalesce_max_batch = Gauge(
+        "score_coalesce_max_batch",
+        "Configured maximum coalesced /score batch size",
+    )
+    score_coalesce_queue_depth = Gauge(
+        "score_coalesce_queue_depth",
+        "Number of /score requests waiting for a coalesced batch",
+    )
+    score_inflight = Gauge(
+        "score_inflight",
+        "Texts admitted to the scoring executor and not yet finished",
+    )
+    score_rejections_total = Counter(
+        "score_rejections_total",
+        "Scoring requests rejected with 503 because the executor was saturated",
+    )
+    embed_cache_hits_total = Counter(
+        "embed_cache_hits_total",
+        "Embedding cache hits by tier",
+        ["tier"],
+    )
+    embed_cache_misses_total = Counter(
+        "embed_cache_misses_total",
+        "Embedding cache misses that required a model encode",
+    )
+    score_index_info = Gauge(
+        "score_index_info",
+        "Currently served example index, labeled by version",
+        ["version"],
+    )
+    score_index_size = Gauge(
+        "score_index_size",
+        "Number of vectors in the currently served example index",
+    )
+    score_warmup_seconds = Gauge(
+        "score_warmup_seconds",
+        "Seconds spent in each startup warm-up phase",
+        ["phase"],
+    )
+    score_index_reloads_total = Counter(
+        "score_index_reloads_total",
+        "Example index load attempts by result",
+        ["result"],
+    )
+    score_result_cache_hits_total = Counter(
+        "score_result_cache_hits_total",
+        "Scoring requests answered from the result cache",
+    )
+    score_result_cache_misses_total = Counter(
+        "score_result_cache_misses_total",
+        "Scoring requests that needed an index search",
+    )
+    score_near_duplicate_checks_total = Counter(
+        "score_near_duplicate_checks_total",
+        "Texts checked against the SimHash fingerprint index",
+    )
+    score_near_duplicate_total = Counter(
+        "score_near_duplicate_total",
+        "Texts answered as near-duplicates without running the embedding model",
+    )
+    score_near_duplicate_saved_seconds_total = Counter(
+        "score_near_duplicate_saved_seconds_total",
+        "Estimated encode seconds avoided by the near-duplicate short-circuit",
+    )
     verification_failures_total = Counter(
         "verification_failures_total",
         "Count of verification failures",
@@ -34,10 +127,61 @@ if _PROM_OK:
         "sharecard_errors_total",
         "Count of sharecard render errors",
     )
+    sharecard_cache_hits_total = Counter(
+        "sharecard_cache_hits_total",
+        "Sharecards served from the encoded-image cache",
+        ["tier"],
+    )
+    sharecard_cache_misses_total = Counter(
+        "sharecard_cache_misses_total",
+        "Sharecards that had to be rendered",
+    )
+    sharecard_cache_bytes_served_total = Counter(
+        "sharecard_cache_bytes_served_total",
+        "Encoded image bytes served from the sharecard cache",
+        ["tier"],
+    )
+    sharecard_cache_hit_ratio = Gauge(
+        "sharecard_cache_hit_ratio",
+        "Fraction of sharecard cache lookups in this process that hit",
+    )
+    sharecard_inflight = Gauge(
+        "sharecard_inflight",
+        "Sharecard renders admitted to the render pool and not yet finished",
+    )
+    sharecard_rejections_total = Counter(
+        "sharecard_rejections_total",
+        "Sharecard renders rejected with 503 because the render pool was full",
+    )
 else:  # pragma: no cover - fallback path
     score_latency_seconds = _Noop()  # type: ignore[assignment]
+    score_stage_seconds = _Noop()  # type: ignore[assignment]
+    score_batch_size = _Noop()  # type: ignore[assignment]
+    score_fallback_total = _Noop()  # type: ignore[assignment]
+    score_coalesce_window_seconds = _Noop()  # type: ignore[assignment]
+    score_coalesce_max_batch = _Noop()  # type: ignore[assignment]
+    score_coalesce_queue_depth = _Noop()  # type: ignore[assignment]
+    score_inflight = _Noop()  # type: ignore[assignment]
+    score_rejections_total = _Noop()  # type: ignore[assignment]
+    embed_cache_hits_total = _Noop()  # type: ignore[assignment]
+    embed_cache_misses_total = _Noop()  # type: ignore[assignment]
+    score_index_info = _Noop()  # type: ignore[assignment]
+    score_index_size = _Noop()  # type: ignore[assignment]
+    score_index_reloads_total = _Noop()  # type: ignore[assignment]
+    score_warmup_seconds = _Noop()  # type: ignore[assignment]
+    score_result_cache_hits_total = _Noop()  # type: ignore[assignment]
+    score_result_cache_misses_total = _Noop()  # type: ignore[assignment]
+    score_near_duplicate_checks_total = _Noop()  # type: ignore[assignment]
+    score_near_duplicate_total = _Noop()  # type: ignore[assignment]
+    score_near_duplicate_saved_seconds_total = _Noop()  # type: ignore[assignment]
     verification_failures_total = _Noop()  # type: ignore[assignment]
     sharecard_errors_total = _Noop()  # type: ignore[assignment]
+    sharecard_cache_hits_total = _Noop()  # type: ignore[assignment]
+    sharecard_cache_misses_total = _Noop()  # type: ignore[assignment]
+    sharecard_cache_bytes_served_total = _Noop()  # type: ignore[assignment]
+    sharecard_cache_hit_ratio = _Noop()  # type: ignore[assignment]
+    sharecard_inflight = _Noop()  # type: ignore[assignment]
+    sharecard_rejections_total = _Noop()  # type: ignore[assignment]
 
 
 async def metrics_endpoint(request):  # type: ignore[override]
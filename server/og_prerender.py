@@ -0,0 +1,285 @@
+"""Pre-render the Open Graph sharecards of every capsule into ``static/og``.
+
+    python -m server.og_prerender --base-url https://fireseed.example
+
+For each ``data/capsules/<id>.json`` the card is rendered with
+:func:`server.sharecard.render_encoded` at every sharecard size, as PNG and
+(when Pillow has WebP support) WebP:
+
+* ``<id>.png`` / ``<id>.webp`` – 1200x630, the image the landing page
+  links as ``og:image``;
+* ``<id>-512x512.png`` / ``<id>-512x512.webp`` – the square icon.
+
+Capsules are rendered in parallel by ``--workers`` spawned processes and
+every file is written to a temporary name and renamed into place.
+``data/og_manifest.json`` (``OG_MANIFEST_PATH``; kept outside the served
+``static`` tree) records the cache key (ETag, see
+:func:`server.sharecard.render_key`) of every file written; a capsule whose
+keys are unchanged and whose files all exist is skipped, so reruns only
+render new or edited capsules. Files of capsules that disappeared are
+removed.
+
+With ``OG_PRERENDER_INTERVAL`` > 0 the app runs the same pipeline in the
+background every that many seconds with ``OG_PRERENDER_WORKERS`` processes
+(see :func:`run_periodically`). Only one uvicorn worker per host does so: the
+run holds an exclusive ``flock`` on ``<manifest>.lock``, and the command
+line refuses to start while the app (or another run) holds it. Deployments
+that prefer cron leave ``OG_PRERENDER_INTERVAL`` at 0 and schedule
+``python -m server.og_prerender`` instead.
+
+The landing-page origin is baked into every QR code, so there is no default:
+``--base-url`` or ``OG_BASE_URL`` must be set, and the app refuses to start
+with prerendering enabled but ``OG_BASE_URL`` unset.
+"""
+from __future__ import annotations
+
+import argparse
+import asyncio
+import fcntl
+import logging
+import multiprocessing as mp
+import os
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from pathlib import Path
+from typing import IO, Any, Dict, Iterator, List, Mapping, Optional, Sequence, Tuple
+
+import orjson
+from PIL import features
+
+from .landing import DATA_DIR, STATIC_OG_DIR, is_safe_id, safe_desc
+from .sharecard import ICON_SIZE, OG_SIZE, compute_etag, render_encoded, render_key
+
+logger = logging.getLogger(__name__)
+
+BASE_URL = os.getenv("OG_BASE_URL", "").strip()
+WORKERS = int(os.getenv("OG_PRERENDER_WORKERS", "1"))
+
+MANIFEST_PATH = Path(os.getenv("OG_MANIFEST_PATH", str(DATA_DIR.parent / "og_manifest.json")))
+# 旧版本写在 static/og 下、会被 /static 公开的清单文件
+LEGACY_MANIFEST_NAME = "manifest.json"
+
+Card = Dict[str, Any]
+# (文件名后缀, 尺寸, 格式)
+Variant = Tuple[str, Tuple[int, int], str]
+
+
+def variants() -> List[Variant]:
+    formats = ["PNG", "WEBP"] if features.check("webp") else ["PNG"]
+    return [
+        (f"{suffix}.{fmt.lower()}", size, fmt)
+        for suffix, size in (("", OG_SIZE), (f"-{ICON_SIZE[0]}x{ICON_SIZE[1]}", ICON_SIZE))
+        for fmt in formats
+    ]
+
+
+def require_base_url(base_url: Optional[str] = None) -> str:
+    """``base_url`` (``OG_BASE_URL`` by default), or :class:`RuntimeError` when it is unset."""
+    base_url = BASE_URL if base_url is None else base_url
+    if not base_url:
+        raise RuntimeError("OG_BASE_URL (or --base-url) must be set to pre-render OG images")
+    return base_url
+
+
+def _score(value: Any) -> Optional[int]:
+    # 与 /sharecard 的 _parse_score 一致：0–100 的数字，否则不显示
+    if isinstance(value, bool) or not isinstance(value, (int, float)):
+        return None
+    if value < 0 or value > 100:
+        return None
+    return int(round(value))
+
+
+def capsule_card(capsule_id: str, capsule: Mapping[str, Any], base_url: str) -> Card:
+    """The ``/sharecard`` payload that represents ``capsule``."""
+    title = str(capsule.get("title") or "Fireseed Capsule").strip()
+    card: Card = {"title": title, "url": f"{base_url.rstrip('/')}/landing/{capsule_id}"}
+    subtitle = safe_desc(capsule)
+    if subtitle and subtitle != title:
+        card["subtitle"] = subtitle
+    score = capsule.get("score")
+    uniqueness = _score(score if score is not None else capsule.get("uniqueness"))
+    if uniqueness is not None:
+        card["uniqueness"] = uniqueness
+    ari = _score(capsule.get("ari"))
+    if ari is not None:
+        card["ari"] = ari
+    return card
+
+
+def iter_cards(capsules_dir: Path, base_url: str) -> Iterator[Tuple[str, Card]]:
+    for path in sorted(capsules_dir.glob("*.json")):
+        # placeholder.png 是没有预渲染图时的回退，不能被同名胶囊覆盖
+        if not is_safe_id(path.stem) or path.stem == "placeholder":
+            continue
+        try:
+            capsule = orjson.loads(path.read_bytes())
+        except (OSError, orjson.JSONDecodeError) as exc:
+            logger.warning("Skipping unreadable capsule %s: %s", path.name, exc)
+            continue
+        if isinstance(capsule, Mapping):
+            yield path.stem, capsule_card(path.stem, capsule, base_url)
+
+
+def card_keys(capsule_id: str, card: Card) -> Dict[str, str]:
+    """File name -> cache key for every variant of one capsule."""
+    return {
+        f"{capsule_id}{suffix}": render_key(compute_etag(card, size, fmt)) for suffix, size, fmt in variants()
+    }
+
+
+def _atomic_write(path: Path, data: bytes) -> None:
+    tmp = path.with_name(f".{path.name}.{os.getpid()}.tmp")
+    tmp.write_bytes(data)
+    os.replace(tmp, path)
+
+
+def render_capsule(capsule_id: str, card: Card, output_dir: str) -> Tuple[str, Dict[str, str]]:
+    """Render and write every variant of one capsule; runs in a worker process."""
+    directory = Path(output_dir)
+    for suffix, size, fmt in variants():
+        content, _ = render_encoded(card, size, fmt)
+        _atomic_write(directory / f"{capsule_id}{suffix}", content)
+    return capsule_id, card_keys(capsule_id, card)
+
+
+def read_manifest(manifest_path: Optional[Path] = None) -> Dict[str, Dict[str, str]]:
+    try:
+        return orjson.loads((manifest_path or MANIFEST_PATH).read_bytes())
+    except (FileNotFoundError, orjson.JSONDecodeError):
+        return {}
+
+
+def _write_manifest(manifest_path: Path, manifest: Mapping[str, Mapping[str, str]]) -> None:
+    _atomic_write(manifest_path, orjson.dumps(manifest, option=orjson.OPT_SORT_KEYS))
+
+
+def _try_lock(handle: IO[bytes]) -> bool:
+    """Take the exclusive prerender lock on ``handle`` without blocking."""
+    try:
+        fcntl.flock(handle, fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except BlockingIOError:
+        return False
+    return True
+
+
+def _open_lock(manifest_path: Path) -> IO[bytes]:
+    manifest_path.parent.mkdir(parents=True, exist_ok=True)
+    return open(manifest_path.with_name(f"{manifest_path.name}.lock"), "a+b")
+
+
+def prerender(
+    capsules_dir: Path = DATA_DIR,
+    output_dir: Path = STATIC_OG_DIR,
+    base_url: str = BASE_URL,
+    workers: int = WORKERS,
+    force: bool = False,
+    manifest_path: Optional[Path] = None,
+) -> Dict[str, int]:
+    """Bring ``output_dir`` up to date with ``capsules_dir``; see the module docstring."""
+    require_base_url(base_url)
+    manifest_path = manifest_path or MANIFEST_PATH
+    output_dir.mkdir(parents=True, exist_ok=True)
+    manifest_path.parent.mkdir(parents=True, exist_ok=True)
+    (output_dir / LEGACY_MANIFEST_NAME).unlink(missing_ok=True)
+    manifest = {} if force else read_manifest(manifest_path)
+    cards = dict(iter_cards(capsules_dir, base_url))
+
+    removed = 0
+    for capsule_id in [capsule_id for capsule_id in manifest if capsule_id not in cards]:
+        for name in manifest.pop(capsule_id):
+            (output_dir / name).unlink(missing_ok=True)
+        removed += 1
+
+    todo = []
+    for capsule_id, card in cards.items():
+        keys = card_keys(capsule_id, card)
+        if manifest.get(capsule_id) == keys and all((output_dir / name).exists() for name in keys):
+            continue
+        todo.append((capsule_id, card))
+
+    failed = 0
+    if todo and workers <= 0:
+        for capsule_id, card in todo:
+            try:
+                manifest[capsule_id] = render_capsule(capsule_id, card, str(output_dir))[1]
+            except Exception as exc:
+                logger.warning("Rendering capsule %s failed: %s", capsule_id, exc)
+                failed += 1
+    elif todo:
+        ctx = mp.get_context("spawn")
+        with ProcessPoolExecutor(max_workers=workers, mp_context=ctx) as pool:
+            futures = {
+                pool.submit(render_capsule, capsule_id, card, str(output_dir)): capsule_id for capsule_id, card in todo
+            }
+            for done, future in enumerate(as_completed(futures), 1):
+                try:
+                    capsule_id, keys = future.result()
+                except Exception as exc:
+                    logger.warning("Rendering capsule %s failed: %s", futures[future], exc)
+                    failed += 1
+                    continue
+                manifest[capsule_id] = keys
+                if done % 100 == 0:
+                    # 中途被打断时已完成的部分不必重渲染
+                    _write_manifest(manifest_path, manifest)
+                    logger.info("Rendered %d/%d capsules", done, len(todo))
+    _write_manifest(manifest_path, manifest)
+    return {
+        "rendered": len(todo) - failed,
+        "skipped": len(cards) - len(todo),
+        "removed": removed,
+        "failed": failed,
+    }
+
+
+async def run_periodically(interval: float, workers: int = WORKERS, manifest_path: Optional[Path] = None) -> None:
+    """Re-run :func:`prerender` every ``interval`` seconds until cancelled.
+
+    Every worker calls this, but only the one holding the prerender lock
+    renders; the others retry the lock each ``interval`` and take over if
+    the holder exits.
+    """
+    require_base_url()
+    manifest_path = manifest_path or MANIFEST_PATH
+    loop = asyncio.get_running_loop()
+    with _open_lock(manifest_path) as handle:
+        while not _try_lock(handle):
+            await asyncio.sleep(interval)
+        logger.info("og.prerender running in pid %d", os.getpid())
+        while True:
+            try:
+                summary = await loop.run_in_executor(
+                    None, lambda: prerender(workers=workers, manifest_path=manifest_path)
+                )
+            except Exception as exc:
+                logger.exception("og.prerender failed: %s", exc)
+            else:
+                logger.info("og.prerender %s", summary, extra={"event": "og.prerender"})
+            await asyncio.sleep(interval)
+
+
+def main(argv: Optional[Sequence[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description="Pre-render capsule sharecards into static/og.")
+    parser.add_argument("--capsules-dir", type=Path, default=DATA_DIR)
+    parser.add_argument("--output-dir", type=Path, default=STATIC_OG_DIR)
+    parser.add_argument(
+        "--base-url",
+        default=BASE_URL or None,
+        required=not BASE_URL,
+        help="origin of the landing-page URLs in the QR codes (default: OG_BASE_URL)",
+    )
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="render processes (0 = in-process)")
+    parser.add_argument("--manifest", type=Path, default=MANIFEST_PATH, help="cache-key manifest (default: OG_MANIFEST_PATH)")
+    parser.add_argument("--force", action="store_true", help="re-render every capsule")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO)
+    with _open_lock(args.manifest) as handle:
+        if not _try_lock(handle):
+            parser.exit(1, "another og_prerender run (or the app with OG_PRERENDER_INTERVAL) holds the lock\n")
+        summary = prerender(args.capsules_dir, args.output_dir, args.base_url, args.workers, args.force, args.manifest)
+    print(orjson.dumps(summary).decode())
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,90 @@
+"""Optional dimensionality reduction of index and query vectors.
+
+``index_build --reduce pca|random --reduce-dim R`` trains an ``(d, R)``
+projection on the corpus, stores it as ``examples.projection.npz`` next to
+``examples.index`` and writes the projected vectors; scoring loads the same
+file with the index and projects every query before searching.
+
+Both projections are linear and uncentered, so the inner product of two
+projected vectors estimates the inner product of the originals and
+uniqueness scores stay on the same scale:
+
+* ``pca`` — top-R right singular vectors of the (sampled) corpus, the
+  least-squares best rank-R approximation of the inner products;
+* ``random`` — a random orthonormal basis scaled by ``sqrt(d / R)``, an
+  unbiased estimate that needs no training data.
+
+``scripts/report_reduction.py`` reports memory saved against score drift for
+candidate dimensions and storage types.
+"""
+from __future__ import annotations
+
+import logging
+import os
+from pathlib import Path
+from typing import Optional
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+METHODS = ("pca", "random")
+# PCA 训练时最多使用的行数
+TRAIN_ROWS = 100000
+
+
+def projection_path(index_path: Path) -> Path:
+    return index_path.with_name(index_path.stem + ".projection.npz")
+
+
+class Projection:
+    """Linear map ``x -> x @ matrix`` from the model dimension to ``matrix.shape[1]``."""
+
+    def __init__(self, method: str, matrix: np.ndarray) -> None:
+        self.method = method
+        self.matrix = np.ascontiguousarray(matrix, dtype=np.float32)
+
+    @property
+    def input_dim(self) -> int:
+        return int(self.matrix.shape[0])
+
+    @property
+    def output_dim(self) -> int:
+        return int(self.matrix.shape[1])
+
+    def apply(self, vectors: np.ndarray) -> np.ndarray:
+        return np.ascontiguousarray(np.asarray(vectors, dtype=np.float32) @ self.matrix)
+
+    def save(self, path: Path) -> None:
+        tmp = path.with_name(path.name + ".tmp")
+        with open(tmp, "wb") as handle:
+            np.savez(handle, method=np.array(self.method), matrix=self.matrix)
+        os.replace(tmp, path)
+
+    @classmethod
+    def load(cls, path: Path) -> Optional["Projection"]:
+        if not path.exists():
+            return None
+        with np.load(path) as data:
+            return cls(str(data["method"]), data["matrix"])
+
+
+def train_projection(vectors: np.ndarray, method: str, dim: int, seed: int = 0) -> Projection:
+    """Fit a ``method`` projection from ``vectors.shape[1]`` down to ``dim``."""
+    if method not in METHODS:
+        raise ValueError(f"unknown reduction method {method!r}; expected one of {', '.join(METHODS)}")
+    full = int(vectors.shape[1])
+    if not 0 < dim < full:
+        raise ValueError(f"reduced dimension must be between 1 and {full - 1}")
+    rng = np.random.default_rng(seed)
+    if method == "random":
+        basis, _ = np.linalg.qr(rng.standard_normal((full, dim)))
+        return Projection(method, basis * np.sqrt(full / dim))
+    sample = np.asarray(vectors, dtype=np.float32)
+    if sample.shape[0] > TRAIN_ROWS:
+        sample = sample[rng.choice(sample.shape[0], TRAIN_ROWS, replace=False)]
+    if sample.shape[0] < dim:
+        raise ValueError(f"pca to {dim} dimensions needs at least {dim} vectors")
+    # 不去中心化：保留向量间内积的尺度，分数与未降维时可比
+    _, _, vt = np.linalg.svd(sample, full_matrices=False)
+    return Projection(method, vt[:dim].T)
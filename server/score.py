@@ -1,15 +1,112 @@
 from __future__ import annotations
 
 import logging
+import os
+import threading
+import time
 from pathlib import Path
-from typing import List, Tuple
+from typing import Any, Dict, List, NamedTuple, Optional, Sequence, Tuple
 
 import numpy as np
 
+from .embed_cache import MemoryLRU, cache_key, get_embedding_cache
+from .embed_server import EmbedServerUnavailable
+from .encoders import BACKEND as ENCODER_BACKEND, load_encoder
+from .fingerprint import SimHashIndex
+from .index_store import (
+    apply_search_params,
+    file_stamp,
+    index_files,
+    load_index,
+    read_version_file,
+    set_default_search_params,
+    stamps_current,
+)
+from .reduction import Projection, projection_path
+from .metrics import (
+    score_batch_size,
+    score_fallback_total,
+    score_index_info,
+    score_index_reloads_total,
+    score_index_size,
+    score_near_duplicate_checks_total,
+    score_near_duplicate_saved_seconds_total,
+    score_near_duplicate_total,
+    score_result_cache_hits_total,
+    score_result_cache_misses_total,
+    score_stage_seconds,
+    score_warmup_seconds,
+)
+
 LOGGER = logging.getLogger(__name__)
 
 _MODEL = None
-_INDEX = None
+_UNLOADED = ("unloaded",)
+
+
+class IndexState(NamedTuple):
+    """One loaded index build; replaced as a whole so readers never mix two builds."""
+
+    index: Any = None
+    version: str = "none"
+    signature: Any = _UNLOADED
+    # 与索引配套的 SimHash 指纹索引
+    fingerprints: Optional[SimHashIndex] = None
+    # 索引构建时训练的降维投影；查询向量在搜索前按同一投影降维
+    projection: Optional[Projection] = None
+
+
+class ScoredBatch(NamedTuple):
+    """Results of one :func:`score_batch` call and the index version that produced them."""
+
+    results: List[Tuple[int, List[str]]]
+    index_version: str
+
+
+_INDEX_STATE = IndexState()
+# 最近一次加载失败的文件签名，文件不变时不再重试
+_FAILED_SIGNATURE: Any = _UNLOADED
+_INDEX_LOCK = threading.Lock()
+_RELOADER: Optional[threading.Thread] = None
+_RELOADER_STOP = threading.Event()
+# 模型已加载且成功 encode 过一次后置位，供 /readyz 使用
+_WARM = threading.Event()
+WARMUP_TIMINGS: Dict[str, float] = {}
+# 单条文本 encode 耗时的滑动平均，用于估算近重复短路节省的时间
+_ENCODE_SECONDS_PER_TEXT = 0.0
+
+# 单次 /score/batch 最多接受的文本条数；encode 内部的子批大小
+BATCH_MAX_ITEMS = int(os.getenv("SCORE_BATCH_MAX_ITEMS", "64"))
+ENCODE_BATCH_SIZE = int(os.getenv("SCORE_ENCODE_BATCH_SIZE", "32"))
+# 每行搜索的近邻数上限，防止单个请求让每行都扫描整个索引
+MAX_TOP_K = int(os.getenv("SCORE_MAX_TOP_K", "50"))
+# 索引热加载轮询间隔（秒），0 表示关闭
+INDEX_RELOAD_INTERVAL = float(os.getenv("INDEX_RELOAD_INTERVAL", "5"))
+# (文本, 索引版本, top_k) -> (uniqueness, explanations) 的结果缓存条数，0 表示关闭
+RESULT_CACHE_SIZE = int(os.getenv("SCORE_RESULT_CACHE_SIZE", "4096"))
+# 近重复短路：SimHash 汉明距离阈值与最少 shingle 数，SCORE_NEAR_DUP=0 关闭
+NEAR_DUP_ENABLED = os.getenv("SCORE_NEAR_DUP", "1") != "0"
+NEAR_DUP_MAX_DISTANCE = int(os.getenv("SCORE_NEAR_DUP_DISTANCE", "3"))
+NEAR_DUP_MIN_SHINGLES = int(os.getenv("SCORE_NEAR_DUP_MIN_SHINGLES", "16"))
+# 长文本分块（可选，SCORE_CHUNKING=1 开启）：超过 CHUNK_CHARS 字符时按重叠窗口切分，
+# 最多 MAX_CHUNKS 块，各块分数按 CHUNK_AGGREGATE（mean 或 max）合并。
+# 开启会改变所有超长文本的分数，默认关闭
+CHUNKING_ENABLED = os.getenv("SCORE_CHUNKING", "0") != "0"
+CHUNK_CHARS = int(os.getenv("SCORE_CHUNK_CHARS", "480"))
+CHUNK_OVERLAP = int(os.getenv("SCORE_CHUNK_OVERLAP", "80"))
+MAX_CHUNKS = int(os.getenv("SCORE_MAX_CHUNKS", "8"))
+CHUNK_AGGREGATE = os.getenv("SCORE_CHUNK_AGGREGATE", "mean").strip().lower()
+CHUNK_AGGREGATES = ("mean", "max")
+if CHUNK_AGGREGATE not in CHUNK_AGGREGATES:
+    raise ValueError(
+        f"unknown SCORE_CHUNK_AGGREGATE {CHUNK_AGGREGATE!r}; expected one of {', '.join(CHUNK_AGGREGATES)}"
+    )
+# 设置后由独立的 embedding 进程（python -m server.embed_server）负责 encode
+EMBED_SERVER_SOCKET = os.getenv("EMBED_SERVER_SOCKET", "")
+
+_RESULT_CACHE = MemoryLRU(RESULT_CACHE_SIZE)
+# 每次切换索引递增；搜索前后不一致说明结果可能来自旧索引，不写入缓存
+_RESULT_EPOCH = 0
 
 
 def _model_path() -> Path:
@@ -20,30 +117,204 @@ def _index_path() -> Path:
     return Path(__file__).resolve().parents[1] / "data" / "examples.index"
 
 
+def load_local_model():
+    """Load the embedding model into this process with the configured ``ENCODER_BACKEND``."""
+    return load_encoder(_model_path(), ENCODER_BACKEND)
+
+
 def get_model():
-    """Lazily load the local embedding model as a singleton."""
+    """Lazily load the embedding model (or the embedding server client) as a singleton."""
     global _MODEL
     if _MODEL is None:
-        from sentence_transformers import SentenceTransformer  # lazy import
+        if EMBED_SERVER_SOCKET:
+            from .embed_server import RemoteEncoder
 
-        model_dir = _model_path()
-        _MODEL = SentenceTransformer(str(model_dir))
+            _MODEL = RemoteEncoder(EMBED_SERVER_SOCKET)
+        else:
+            _MODEL = load_local_model()
     return _MODEL
 
 
+def model_identity() -> str:
+    """Identify the embedding model and backend for cache keys."""
+    name = _model_path().name
+    return name if ENCODER_BACKEND == "torch" else f"{name}+{ENCODER_BACKEND}"
+
+
+Signature = Tuple[str, Tuple[Tuple[str, Tuple[int, ...]], ...]]
+
+
+def _index_signature() -> Optional[Signature]:
+    """``(version, file stamps)`` the reloader compares to decide on a swap.
+
+    With a version sidecar only the sidecar counts, since the builder writes
+    it after every other file; the stamps are the ones it recorded. Without
+    one (an index file placed by hand) the index files' own stamps are used.
+    """
+    index_path = _index_path()
+    try:
+        record = read_version_file(index_path)
+    except ValueError as exc:
+        LOGGER.warning("Unreadable index version file: %s", exc)
+        return None
+    if record is not None:
+        version, stamps = record
+        return version, tuple(sorted((name, tuple(stamp)) for name, stamp in stamps.items()))
+    try:
+        files = [(path.name, tuple(file_stamp(path))) for path in index_files(index_path)]
+    except FileNotFoundError:
+        return None
+    if not files:
+        return None
+    return "{:x}-{:x}".format(*files[0][1][1:]), tuple(files)
+
+
+def _signature_version(signature: Signature) -> str:
+    return signature[0]
+
+
+def index_version_on_disk() -> str:
+    """Version of the index files as they are now, without loading them."""
+    signature = _index_signature()
+    return _signature_version(signature) if signature is not None else "none"
+
+
+def _read_index(index_path: Path):
+    return load_index(index_path)
+
+
+def _read_fingerprints(index_path: Path, version: str) -> Optional[SimHashIndex]:
+    if not NEAR_DUP_ENABLED:
+        return None
+    try:
+        return SimHashIndex.open(index_path, NEAR_DUP_MAX_DISTANCE, NEAR_DUP_MIN_SHINGLES, version)
+    except Exception as exc:
+        LOGGER.warning("Fingerprint index unavailable, near-duplicate check disabled: %s", exc)
+        return None
+
+
+def _read_index_set(index_path: Path, signature: Signature) -> Tuple[Any, Optional[SimHashIndex], Optional[Projection]]:
+    """Index, fingerprints and projection of the build ``signature`` names."""
+    index = _read_index(index_path)
+    projection = Projection.load(projection_path(index_path))
+    fingerprints = _read_fingerprints(index_path, signature[0])
+    stamps = dict(signature[1])
+    if stamps and not stamps_current(index_path, stamps):
+        # 加载期间又有构建在替换文件：这一组文件不一致，等下一个版本文件
+        raise RuntimeError(f"index files no longer match version {signature[0]}")
+    return index, fingerprints, projection
+
+
+def reload_index(force: bool = False) -> bool:
+    """Re-read the index, fingerprints and projection when the version sidecar changes.
+
+    All three are loaded as one set and checked against the file stamps in
+    the sidecar; a set that mixes two builds is discarded. The new set
+    replaces the old one in a single assignment; searches that already hold
+    the old objects finish against them. Returns True on swap.
+    """
+    global _FAILED_SIGNATURE
+    signature = _index_signature()
+    with _INDEX_LOCK:
+        current = _INDEX_STATE
+        if not force and signature in (current.signature, _FAILED_SIGNATURE):
+            return False
+        if signature is None:
+            LOGGER.warning("FAISS index not found at %s", _index_path())
+            _FAILED_SIGNATURE = None
+            return False
+        try:
+            index, fingerprints, projection = _read_index_set(_index_path(), signature)
+        except Exception as exc:
+            # 文件可能写到一半，保留旧索引，文件再变化时重试
+            LOGGER.warning("Index load failed, keeping version %s: %s", current.version, exc)
+            score_index_reloads_total.labels(result="error").inc()
+            _FAILED_SIGNATURE = signature
+            return False
+        version = _signature_version(signature)
+        _swap_index_state(IndexState(index, version, signature, fingerprints, projection))
+    LOGGER.info("Loaded index version %s (%s vectors)", version, getattr(index, "ntotal", 0))
+    score_index_reloads_total.labels(result="ok").inc()
+    return True
+
+
+def _swap_index_state(state: IndexState) -> None:
+    global _INDEX_STATE, _RESULT_EPOCH
+    previous = _INDEX_STATE
+    _INDEX_STATE = state
+    _RESULT_EPOCH += 1
+    _RESULT_CACHE.clear()
+    if previous.index is not None and previous.version != state.version:
+        score_index_info.remove(previous.version)
+    score_index_info.labels(version=state.version).set(1)
+    score_index_size.set(getattr(state.index, "ntotal", 0) if state.index is not None else 0)
+
+
+def _reload_loop(interval: float) -> None:
+    while not _RELOADER_STOP.wait(interval):
+        try:
+            reload_index()
+        except Exception as exc:  # pragma: no cover - keep the watcher alive
+            LOGGER.exception("Index watcher error: %s", exc)
+
+
+def start_index_reloader(interval: float = INDEX_RELOAD_INTERVAL) -> None:
+    """Start the background thread that watches the index for changes."""
+    global _RELOADER
+    if interval <= 0 or (_RELOADER is not None and _RELOADER.is_alive()):
+        return
+    _RELOADER_STOP.clear()
+    _RELOADER = threading.Thread(
+        target=_reload_loop, args=(interval,), name="fireseed-index-reload", daemon=True
+    )
+    _RELOADER.start()
+
+
+def stop_index_reloader() -> None:
+    _RELOADER_STOP.set()
+
+
 def get_index():
-    """Lazily load the FAISS index as a singleton."""
-    global _INDEX
-    if _INDEX is None:
-        index_path = _index_path()
-        if not index_path.exists():
-            LOGGER.warning("FAISS index not found at %s", index_path)
-            _INDEX = None
-        else:
-            import faiss  # lazy import
+    """Return the current index, loading it on first use."""
+    if _INDEX_STATE.index is None:
+        reload_index()
+        start_index_reloader()
+    return _INDEX_STATE.index
+
+
+def get_index_state() -> IndexState:
+    """Return the current index build, loading it on first use.
+
+    Callers that need more than the index (its version, fingerprints or
+    projection) should read them all from one returned state. The index is
+    taken from :func:`get_index`; one that is not the loaded build (such as
+    a stand-in from a test) is served bare, without version, fingerprints
+    or projection.
+    """
+    for _ in range(2):
+        index = get_index()
+        state = _INDEX_STATE
+        if state.index is index:
+            return state
+        # 两次读取之间恰好发生热更新时重读一次
+    return IndexState(index)
+
+
+def set_search_params(nprobe: Optional[int] = None, ef_search: Optional[int] = None) -> None:
+    """Tune ANN search at runtime; also applied to indexes loaded later."""
+    set_default_search_params(nprobe, ef_search)
+    index = _INDEX_STATE.index
+    if index is not None:
+        apply_search_params(index, nprobe, ef_search)
 
-            _INDEX = faiss.read_index(str(index_path))
-    return _INDEX
+
+def get_index_version() -> str:
+    """Version of the index currently served (sidecar content or file stamp)."""
+    return _INDEX_STATE.version
+
+
+def _base_explanations() -> List[str]:
+    return ["topk_mean", "normalized_cosine"]
 
 
 def _fallback_response(explanations: List[str]) -> Tuple[int, List[str]]:
@@ -53,42 +324,307 @@ def _fallback_response(explanations: List[str]) -> Tuple[int, List[str]]:
     return 100, explanations
 
 
-def compute_uniqueness(text: str, top_k: int = 5) -> Tuple[int, List[str]]:
-    """Compute a uniqueness score against the example index."""
-    explanations: List[str] = ["topk_mean", "normalized_cosine"]
+def _uniqueness_from_distances(distances: np.ndarray) -> Optional[int]:
+    if distances.size == 0:
+        return None
+    robust = float(np.nanmean(distances))
+    uniqueness = round(100 * (1 - max(0.0, robust)))
+    return max(0, min(100, uniqueness))
+
+
+def _encode_batch(model, texts: Sequence[str]) -> List[Optional[np.ndarray]]:
+    """Encode texts in one call, sorted by length so sub-batches pad evenly.
+
+    If the batched call fails, each text is retried on its own so a single
+    bad input only loses its own slot. :class:`EmbedServerUnavailable` is
+    raised as is: a timed-out or unreachable server would fail every retry.
+    """
+    order = sorted(range(len(texts)), key=lambda i: len(texts[i]))
+    try:
+        encoded = model.encode(
+            [texts[i] for i in order],
+            batch_size=ENCODE_BATCH_SIZE,
+            normalize_embeddings=True,
+            convert_to_numpy=True,
+        )
+    except EmbedServerUnavailable:
+        raise
+    except Exception as exc:
+        LOGGER.warning("Batched embedding failed, retrying per item: %s", exc)
+    else:
+        encoded = np.asarray(encoded, dtype=np.float32)
+        if encoded.ndim == 1:
+            encoded = encoded.reshape(1, -1)
+        vectors: List[Optional[np.ndarray]] = [None] * len(texts)
+        for row, position in enumerate(order):
+            vectors[position] = encoded[row]
+        return vectors
+
+    vectors = []
+    for text in texts:
+        try:
+            single = model.encode([text], normalize_embeddings=True, convert_to_numpy=True)
+        except EmbedServerUnavailable:
+            raise
+        except Exception as exc:  # pragma: no cover - defensive logging
+            LOGGER.exception("Embedding generation failed: %s", exc)
+            vectors.append(None)
+            continue
+        vectors.append(np.asarray(single, dtype=np.float32).reshape(-1))
+    return vectors
 
-    if not text:
-        return _fallback_response(explanations)
 
-    index = get_index()
-    if index is None or getattr(index, "ntotal", 0) == 0:
-        return _fallback_response(explanations)
+def _embed(texts: Sequence[str]) -> List[Optional[np.ndarray]]:
+    """Embed texts, serving repeats from the embedding cache."""
+    cache = get_embedding_cache(model_identity())
+    keys = [cache_key(text, model_identity()) for text in texts]
+    vectors = cache.get_many(keys)
+    misses = [i for i, vec in enumerate(vectors) if vec is None]
+    if not misses:
+        return vectors
 
     try:
         model = get_model()
-        vector = model.encode([text], normalize_embeddings=True, convert_to_numpy=True)
     except Exception as exc:  # pragma: no cover - defensive logging
-        LOGGER.exception("Embedding generation failed: %s", exc)
-        return _fallback_response(explanations)
+        LOGGER.exception("Embedding model unavailable: %s", exc)
+        return vectors
 
-    if vector.ndim == 1:
-        vector = vector.reshape(1, -1)
-    vector = vector.astype(np.float32, copy=False)
+    global _ENCODE_SECONDS_PER_TEXT
+    start = time.perf_counter()
+    encoded = _encode_batch(model, [texts[i] for i in misses])
+    per_text = (time.perf_counter() - start) / len(misses)
+    _ENCODE_SECONDS_PER_TEXT = per_text if not _ENCODE_SECONDS_PER_TEXT else 0.9 * _ENCODE_SECONDS_PER_TEXT + 0.1 * per_text
+    fresh = [(keys[i], vec) for i, vec in zip(misses, encoded) if vec is not None]
+    if fresh:
+        _WARM.set()
+    cache.put_many([key for key, _ in fresh], [vec for _, vec in fresh])
+    for i, vec in zip(misses, encoded):
+        vectors[i] = vec
+    return vectors
 
-    k = min(max(top_k, 1), getattr(index, "ntotal", 0))
-    if k == 0:
-        return _fallback_response(explanations)
 
-    try:
-        distances, _ = index.search(vector, k)
-    except Exception as exc:  # pragma: no cover
-        LOGGER.exception("Index search failed: %s", exc)
-        return _fallback_response(explanations)
+def _near_duplicates(
+    fingerprints: Optional[SimHashIndex], texts: Sequence[str], pending: Sequence[int]
+) -> Dict[int, np.ndarray]:
+    """Indexed vectors of texts that are lexical near-duplicates of a capsule.
 
-    if distances.size == 0:
-        return _fallback_response(explanations)
+    Those texts skip the model entirely; their stored vector joins the same
+    index search, so their score matches what the capsule itself would get.
+    """
+    if fingerprints is None or not pending:
+        return {}
+    found: Dict[int, np.ndarray] = {}
+    for i in pending:
+        vector = fingerprints.match(texts[i])
+        if vector is not None:
+            found[i] = vector
+    score_near_duplicate_checks_total.inc(len(pending))
+    if found:
+        score_near_duplicate_total.inc(len(found))
+        score_near_duplicate_saved_seconds_total.inc(len(found) * _ENCODE_SECONDS_PER_TEXT)
+    return found
 
-    robust = float(np.nanmean(distances))
-    uniqueness = round(100 * (1 - max(0.0, robust)))
-    uniqueness = max(0, min(100, uniqueness))
-    return uniqueness, explanations
+
+def split_chunks(text: str) -> List[str]:
+    """Overlapping windows of ``CHUNK_CHARS`` characters covering ``text``.
+
+    Texts that fit in one window, and every text while ``SCORE_CHUNKING`` is
+    off, are returned as-is. When more than
+    ``MAX_CHUNKS`` windows would be needed, ``MAX_CHUNKS`` windows are spread
+    evenly over the text so the whole document still contributes.
+    """
+    if not CHUNKING_ENABLED or len(text) <= CHUNK_CHARS:
+        return [text]
+    stride = max(1, CHUNK_CHARS - CHUNK_OVERLAP)
+    last = len(text) - CHUNK_CHARS
+    count = -(-last // stride) + 1
+    if count <= MAX_CHUNKS:
+        starts = [min(j * stride, last) for j in range(count)]
+    else:
+        starts = sorted({int(round(start)) for start in np.linspace(0, last, max(1, MAX_CHUNKS))})
+    return [text[start : start + CHUNK_CHARS] for start in starts]
+
+
+def encode_units(texts: Sequence[str]) -> int:
+    """Rows that scoring ``texts`` will encode and search, counting chunks."""
+    return sum(len(split_chunks(text)) for text in texts if text)
+
+
+def _aggregate_chunks(values: Sequence[int]) -> int:
+    if len(values) == 1:
+        return values[0]
+    if CHUNK_AGGREGATE == "max":
+        return max(values)
+    return int(round(sum(values) / len(values)))
+
+
+def _result_key(text: str, version: str, k: int) -> bytes:
+    return cache_key(text, model_identity()) + f"\0{version}\0{k}".encode("utf-8")
+
+
+def _project(projection: Projection, vectors: List[Optional[np.ndarray]]) -> List[Optional[np.ndarray]]:
+    rows = [row for row, vec in enumerate(vectors) if vec is not None]
+    if not rows:
+        return vectors
+    projected = projection.apply(np.stack([vectors[row] for row in rows]))
+    result: List[Optional[np.ndarray]] = [None] * len(vectors)
+    for position, row in enumerate(rows):
+        result[row] = projected[position]
+    return result
+
+
+def score_batch(texts: Sequence[str], top_k: int = 5) -> ScoredBatch:
+    """Score many texts with one encode call and one index search.
+
+    Results are returned in input order together with the version of the
+    index they were searched against; texts that cannot be scored get the
+    fallback response instead of failing the whole batch. With
+    ``SCORE_CHUNKING=1``, texts longer than ``CHUNK_CHARS`` are scored chunk
+    by chunk (see :func:`split_chunks`) within the same encode and search,
+    then aggregated. Successful results are cached
+    per (normalized text, index version, k) until the index changes; ``k`` is
+    ``top_k`` clamped to ``[1, MAX_TOP_K]`` and the index size.
+    """
+    score_batch_size.observe(len(texts))
+    results: List[Optional[Tuple[int, List[str]]]] = [None] * len(texts)
+    pending = [i for i, text in enumerate(texts) if text]
+    for i, text in enumerate(texts):
+        if not text:
+            results[i] = _fallback_response(_base_explanations())
+
+    version = get_index_version()
+    if pending:
+        epoch = _RESULT_EPOCH
+        # 一次读取整个状态：索引、指纹与投影必须来自同一次构建，返回的版本也取自这里
+        index, version, _, fingerprints, projection = get_index_state()
+        ntotal = getattr(index, "ntotal", 0) if index is not None else 0
+        k = min(max(top_k, 1), MAX_TOP_K, ntotal)
+        keys: Dict[int, bytes] = {}
+        if k:
+            misses = []
+            for i in pending:
+                keys[i] = _result_key(texts[i], version, k)
+                cached = _RESULT_CACHE.get(keys[i])
+                if cached is not None:
+                    results[i] = (cached[0], list(cached[1]))
+                else:
+                    misses.append(i)
+            if len(pending) > len(misses):
+                score_result_cache_hits_total.inc(len(pending) - len(misses))
+            if misses:
+                score_result_cache_misses_total.inc(len(misses))
+            pending = misses
+
+        near = _near_duplicates(fingerprints, texts, pending) if k else {}
+        pending = [i for i in pending if i not in near]
+        # 长文本拆成多块，与其他文本一起 encode、一起搜索
+        units = [(i, chunk) for i in pending for chunk in split_chunks(texts[i])] if k else []
+        chunk_counts: Dict[int, int] = {}
+        for i, _ in units:
+            chunk_counts[i] = chunk_counts.get(i, 0) + 1
+        if k == 0:
+            unit_vectors: List[Optional[np.ndarray]] = []
+            if pending:
+                score_fallback_total.labels(reason="empty_index").inc(len(pending))
+        elif units:
+            start = time.perf_counter()
+            unit_vectors = _embed([chunk for _, chunk in units])
+            if projection is not None:
+                # 近重复命中的是索引里的存储向量，已经降过维，只投影新 encode 的向量
+                unit_vectors = _project(projection, unit_vectors)
+            score_stage_seconds.labels(stage="encode").observe(time.perf_counter() - start)
+            embedded = {i for (i, _), vec in zip(units, unit_vectors) if vec is not None}
+            failed = len(chunk_counts) - len(embedded)
+            if failed:
+                score_fallback_total.labels(reason="encode_failure").inc(failed)
+        else:
+            unit_vectors = []
+
+        encoded = list(near.items()) + [(i, vec) for (i, _), vec in zip(units, unit_vectors) if vec is not None]
+        if encoded:
+            matrix = np.ascontiguousarray(np.stack([vec for _, vec in encoded]), dtype=np.float32)
+            start = time.perf_counter()
+            try:
+                distances, _ = index.search(matrix, k)
+            except Exception as exc:  # pragma: no cover
+                LOGGER.exception("Index search failed: %s", exc)
+                score_fallback_total.labels(reason="search_failure").inc(len({i for i, _ in encoded}))
+            else:
+                score_stage_seconds.labels(stage="search").observe(time.perf_counter() - start)
+                cacheable = epoch == _RESULT_EPOCH
+                scores: Dict[int, List[int]] = {}
+                for row, (i, _) in enumerate(encoded):
+                    uniqueness = _uniqueness_from_distances(distances[row])
+                    if uniqueness is not None:
+                        scores.setdefault(i, []).append(uniqueness)
+                for i in {i for i, _ in encoded}:
+                    if i not in scores:
+                        score_fallback_total.labels(reason="search_failure").inc()
+                        continue
+                    explanations = _base_explanations()
+                    if i in near:
+                        explanations.append("near_duplicate")
+                    if chunk_counts.get(i, 1) > 1:
+                        explanations.append("chunked")
+                    results[i] = (_aggregate_chunks(scores[i]), explanations)
+                    if cacheable:
+                        _RESULT_CACHE.put(keys[i], (results[i][0], tuple(explanations)))
+
+    return ScoredBatch(
+        [result if result is not None else _fallback_response(_base_explanations()) for result in results],
+        version,
+    )
+
+
+def compute_uniqueness_batch(texts: Sequence[str], top_k: int = 5) -> List[Tuple[int, List[str]]]:
+    """Scores of ``texts`` in input order; see :func:`score_batch`."""
+    return score_batch(texts, top_k).results
+
+
+def compute_uniqueness(text: str, top_k: int = 5) -> Tuple[int, List[str]]:
+    """Compute a uniqueness score against the example index."""
+    return compute_uniqueness_batch([text], top_k)[0]
+
+
+def warmup(text: str = "火种 Fireseed warmup") -> Dict[str, float]:
+    """Load the model and index and run one encode and search.
+
+    Returns the seconds spent per phase; afterwards :func:`is_ready` is True.
+    The embedding cache is bypassed so the model itself gets exercised.
+    """
+    timings: Dict[str, float] = {}
+
+    start = time.perf_counter()
+    model = get_model()
+    timings["model_load"] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    state = get_index_state()
+    index = state.index
+    timings["index_load"] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    vector = _encode_batch(model, [text])[0]
+    timings["encode"] = time.perf_counter() - start
+    if vector is None:
+        raise RuntimeError("warm-up encode failed")
+
+    ntotal = getattr(index, "ntotal", 0) if index is not None else 0
+    if ntotal > 0:
+        start = time.perf_counter()
+        query = vector.reshape(1, -1)
+        if state.projection is not None:
+            query = state.projection.apply(query)
+        index.search(query, min(5, ntotal))
+        timings["search"] = time.perf_counter() - start
+
+    WARMUP_TIMINGS.update(timings)
+    for phase, seconds in timings.items():
+        score_warmup_seconds.labels(phase=phase).set(seconds)
+    _WARM.set()
+    return timings
+
+
+def is_ready() -> bool:
+    """True once scoring is warm, through :func:`warmup` or a first real encode."""
+    return _WARM.is_set()
@@ -0,0 +1,351 @@
+"""Sharded example index served by separate processes.
+
+    python -m server.index_build --shards 4     # write 4 shards + manifest
+    python -m server.shards serve               # one local process per shard
+
+``examples.shards.json`` (next to ``examples.index``) lists the shards in row
+order; shard ``i`` is a normal index (FAISS file and/or ``.vectors.npy``)
+under ``examples.shards/`` holding a contiguous slice of the corpus, so a
+shard-local id plus the shard's ``offset`` is the global row.
+
+Each shard process loads its slice with :func:`server.index_store.load_index`
+and answers ``(version, queries, k)`` requests over a
+``multiprocessing.connection`` socket. By default shard ``i`` listens on
+``examples.shards/shard-00i.sock``; ``INDEX_SHARD_ADDRESSES`` (comma-separated
+``host:port`` or socket paths, one per shard) points the scorer at shards on
+other nodes. TCP shards are only served and contacted when
+``INDEX_SHARD_AUTHKEY`` is set, and both ends must share that secret.
+
+Messages are sent with ``send_bytes`` and never unpickled:
+
+* request: ``!H`` version length, the UTF-8 manifest version, ``!III``
+  ``(rows, dim, k)`` and ``rows * dim`` float32 queries;
+* response: ``!II`` ``(rows, k)``, ``rows * k`` float32 distances and
+  ``rows * k`` int64 shard-local ids, or ``rows == 0xFFFFFFFF`` followed by a
+  UTF-8 error message.
+
+:class:`ShardedIndex` is what :func:`server.index_store.load_index` returns
+when a manifest exists: it sends every search to all shards in parallel and
+merges the per-shard top-k. Requests carry the manifest version, and a shard
+that is still serving an older build reloads before answering.
+"""
+from __future__ import annotations
+
+import argparse
+import logging
+import multiprocessing as mp
+import os
+import struct
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from multiprocessing.connection import Client, Connection, Listener
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Sequence, Tuple, Union
+
+import numpy as np
+import orjson
+
+from .index_store import LOAD_MODE, load_index, shards_manifest_path as manifest_path
+
+logger = logging.getLogger(__name__)
+
+ADDRESSES = os.getenv("INDEX_SHARD_ADDRESSES", "")
+# 无默认值：仓库里公开的密钥等于没有密钥
+AUTHKEY = os.getenv("INDEX_SHARD_AUTHKEY", "").encode("utf-8")
+TIMEOUT = float(os.getenv("INDEX_SHARD_TIMEOUT", "10"))
+
+Address = Union[str, Tuple[str, int]]
+
+_VERSION_LEN = struct.Struct("!H")
+_QUERY_SHAPE = struct.Struct("!III")
+_RESULT_SHAPE = struct.Struct("!II")
+_ERROR_ROWS = 0xFFFFFFFF
+_MAX_FRAME = 64 * 1024 * 1024
+
+_EXECUTOR: Optional[ThreadPoolExecutor] = None
+_EXECUTOR_LOCK = threading.Lock()
+
+
+def shards_dir(index_path: Path) -> Path:
+    return index_path.with_name(index_path.stem + ".shards")
+
+
+def shard_index_path(index_path: Path, shard: int) -> Path:
+    return shards_dir(index_path) / f"shard-{shard:03d}.index"
+
+
+def parse_address(value: str) -> Address:
+    """``host:port`` becomes a TCP address, anything else a Unix socket path."""
+    host, sep, port = value.rpartition(":")
+    if sep and port.isdigit() and "/" not in value:
+        return host, int(port)
+    return value
+
+
+def authkey_for(address: Address) -> Optional[bytes]:
+    """Connection secret for ``address``; TCP shards refuse to run without one."""
+    if isinstance(address, tuple) and not AUTHKEY:
+        raise RuntimeError(f"INDEX_SHARD_AUTHKEY must be set to use TCP shard address {address[0]}:{address[1]}")
+    return AUTHKEY or None
+
+
+def encode_request(version: str, queries: np.ndarray, k: int) -> bytes:
+    queries = np.ascontiguousarray(queries, dtype=np.float32)
+    tag = version.encode("utf-8")
+    return _VERSION_LEN.pack(len(tag)) + tag + _QUERY_SHAPE.pack(queries.shape[0], queries.shape[1], k) + queries.tobytes()
+
+
+def decode_request(payload: bytes) -> Tuple[str, np.ndarray, int]:
+    (length,) = _VERSION_LEN.unpack_from(payload)
+    offset = _VERSION_LEN.size + length
+    version = payload[_VERSION_LEN.size : offset].decode("utf-8")
+    rows, dim, k = _QUERY_SHAPE.unpack_from(payload, offset)
+    body = payload[offset + _QUERY_SHAPE.size :]
+    if len(body) != rows * dim * 4:
+        raise ValueError(f"expected {rows}x{dim} float32 queries, got {len(body)} bytes")
+    return version, np.frombuffer(body, dtype=np.float32).reshape(rows, dim), k
+
+
+def encode_result(distances: np.ndarray, ids: np.ndarray) -> bytes:
+    distances = np.ascontiguousarray(distances, dtype=np.float32)
+    ids = np.ascontiguousarray(ids, dtype=np.int64)
+    return _RESULT_SHAPE.pack(*distances.shape) + distances.tobytes() + ids.tobytes()
+
+
+def encode_error(message: str) -> bytes:
+    return _RESULT_SHAPE.pack(_ERROR_ROWS, 0) + message.encode("utf-8")
+
+
+def decode_result(payload: bytes) -> Tuple[np.ndarray, np.ndarray]:
+    rows, k = _RESULT_SHAPE.unpack_from(payload)
+    body = payload[_RESULT_SHAPE.size :]
+    if rows == _ERROR_ROWS:
+        raise RuntimeError(body.decode("utf-8", errors="replace"))
+    split = rows * k * 4
+    if len(body) != split + rows * k * 8:
+        raise ValueError(f"expected a {rows}x{k} result, got {len(body)} bytes")
+    return (
+        np.frombuffer(body[:split], dtype=np.float32).reshape(rows, k),
+        np.frombuffer(body[split:], dtype=np.int64).reshape(rows, k),
+    )
+
+
+def read_manifest(path: Path) -> Dict[str, Any]:
+    return orjson.loads(path.read_bytes())
+
+
+def shard_addresses(path: Path, manifest: Dict[str, Any]) -> List[Address]:
+    count = len(manifest["shards"])
+    if ADDRESSES:
+        addresses = [parse_address(item.strip()) for item in ADDRESSES.split(",") if item.strip()]
+        if len(addresses) != count:
+            raise ValueError(f"INDEX_SHARD_ADDRESSES lists {len(addresses)} shards, manifest has {count}")
+        return addresses
+    return [str(path.parent / Path(shard["path"]).with_suffix(".sock")) for shard in manifest["shards"]]
+
+
+def merge_topk(distances: Sequence[np.ndarray], ids: Sequence[np.ndarray], k: int) -> Tuple[np.ndarray, np.ndarray]:
+    """Merge per-shard ``(distances, global ids)`` into the overall inner-product top-k."""
+    all_d = np.concatenate(distances, axis=1)
+    all_i = np.concatenate(ids, axis=1)
+    all_d = np.where(all_i < 0, -np.inf, all_d)
+    k = min(k, all_d.shape[1])
+    part = np.argpartition(-all_d, k - 1, axis=1)[:, :k]
+    part_d = np.take_along_axis(all_d, part, axis=1)
+    order = np.argsort(-part_d, axis=1, kind="stable")
+    top = np.take_along_axis(part, order, axis=1)
+    return (
+        np.take_along_axis(all_d, top, axis=1).astype(np.float32),
+        np.take_along_axis(all_i, top, axis=1),
+    )
+
+
+def _executor(workers: int) -> ThreadPoolExecutor:
+    global _EXECUTOR
+    with _EXECUTOR_LOCK:
+        if _EXECUTOR is None or _EXECUTOR._max_workers < workers:
+            _EXECUTOR = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="fireseed-shard")
+        return _EXECUTOR
+
+
+class ShardedIndex:
+    """Scatter-gather client over the shard processes of one manifest."""
+
+    def __init__(self, manifest: Dict[str, Any], addresses: Sequence[Address], timeout: float = TIMEOUT) -> None:
+        self.version = manifest["version"]
+        self.d = int(manifest["dim"])
+        self.offsets = [int(shard["offset"]) for shard in manifest["shards"]]
+        self.sizes = [int(shard["ntotal"]) for shard in manifest["shards"]]
+        self.ntotal = sum(self.sizes)
+        self.addresses = list(addresses)
+        self.timeout = timeout
+        self._conns: List[Optional[Connection]] = [None] * len(self.addresses)
+        self._locks = [threading.Lock() for _ in self.addresses]
+
+    @classmethod
+    def open(cls, path: Path) -> "ShardedIndex":
+        manifest = read_manifest(path)
+        return cls(manifest, shard_addresses(path, manifest))
+
+    def _request(self, shard: int, queries: np.ndarray, k: int) -> Tuple[np.ndarray, np.ndarray]:
+        with self._locks[shard]:
+            for attempt in range(2):
+                conn = self._conns[shard]
+                try:
+                    if conn is None:
+                        address = self.addresses[shard]
+                        conn = self._conns[shard] = Client(address, authkey=authkey_for(address))
+                    conn.send_bytes(encode_request(self.version, queries, k))
+                    if not conn.poll(self.timeout):
+                        raise TimeoutError(f"shard {shard} did not answer within {self.timeout}s")
+                    payload = conn.recv_bytes()
+                    break
+                except (OSError, EOFError):
+                    # 分片进程重启过：重连一次
+                    if conn is not None:
+                        conn.close()
+                    self._conns[shard] = None
+                    if attempt:
+                        raise
+        try:
+            distances, ids = decode_result(payload)
+        except RuntimeError as exc:
+            raise RuntimeError(f"shard {shard}: {exc}") from None
+        return distances, np.where(ids < 0, -1, ids + self.offsets[shard])
+
+    def search(self, queries: np.ndarray, k: int) -> Tuple[np.ndarray, np.ndarray]:
+        queries = np.ascontiguousarray(queries, dtype=np.float32)
+        shards = [i for i, size in enumerate(self.sizes) if size]
+        pool = _executor(len(shards))
+        futures = [pool.submit(self._request, i, queries, min(k, self.sizes[i])) for i in shards]
+        parts = [future.result() for future in futures]
+        return merge_topk([d for d, _ in parts], [i for _, i in parts], k)
+
+    def close(self) -> None:
+        for shard, conn in enumerate(self._conns):
+            if conn is not None:
+                conn.close()
+                self._conns[shard] = None
+
+    def __del__(self) -> None:  # pragma: no cover - best effort
+        try:
+            self.close()
+        except Exception:
+            pass
+
+
+class ShardServer:
+    """Serve one shard; reloads it when a request names a newer manifest version."""
+
+    def __init__(self, index_path: Path, shard: int, mode: str = "mmap") -> None:
+        self.index_path = index_path
+        self.shard = shard
+        self.mode = mode
+        self.version: Optional[str] = None
+        self.index = None
+        self._lock = threading.Lock()
+        self.reload()
+
+    def reload(self) -> None:
+        manifest = read_manifest(manifest_path(self.index_path))
+        path = self.index_path.parent / manifest["shards"][self.shard]["path"]
+        index = load_index(path, mode=self.mode)
+        self.index, self.version = index, manifest["version"]
+        logger.info("shard %d serving version %s (%d vectors)", self.shard, self.version, index.ntotal)
+
+    def search(self, version: str, queries: np.ndarray, k: int) -> Tuple[np.ndarray, np.ndarray]:
+        if version != self.version:
+            with self._lock:
+                if version != self.version:
+                    self.reload()
+            if version != self.version:
+                raise RuntimeError(f"shard has version {self.version}, scorer expects {version}")
+        return self.index.search(queries, k)
+
+    def _handle(self, conn: Connection) -> None:
+        with conn:
+            while True:
+                try:
+                    payload = conn.recv_bytes(_MAX_FRAME)
+                except (EOFError, OSError):
+                    return
+                try:
+                    distances, ids = self.search(*decode_request(payload))
+                    conn.send_bytes(encode_result(distances, ids))
+                except Exception as exc:
+                    logger.exception("shard %d search failed: %s", self.shard, exc)
+                    conn.send_bytes(encode_error(str(exc) or type(exc).__name__))
+
+    def serve(self, address: Address) -> None:
+        if isinstance(address, str) and os.path.exists(address):
+            os.unlink(address)
+        with Listener(address, authkey=authkey_for(address)) as listener:
+            logger.info("shard %d listening on %s", self.shard, address)
+            while True:
+                try:
+                    conn = listener.accept()
+                except (OSError, EOFError) as exc:
+                    # 认证失败等单个连接错误不影响监听
+                    logger.warning("shard %d rejected a connection: %s", self.shard, exc)
+                    continue
+                threading.Thread(target=self._handle, args=(conn,), daemon=True).start()
+
+
+def _serve_shard(index_path: str, shard: int, address: Address, mode: str) -> None:
+    logging.basicConfig(level=logging.INFO)
+    ShardServer(Path(index_path), shard, mode).serve(address)
+
+
+def start_local_shards(index_path: Path, mode: str = "mmap", wait: float = 30.0) -> List[mp.Process]:
+    """Start one spawned process per shard on the default (or configured) addresses."""
+    manifest_file = manifest_path(index_path)
+    addresses = shard_addresses(manifest_file, read_manifest(manifest_file))
+    for address in addresses:
+        authkey_for(address)
+    ctx = mp.get_context("spawn")
+    procs = []
+    for shard, address in enumerate(addresses):
+        proc = ctx.Process(
+            target=_serve_shard, args=(str(index_path), shard, address, mode), name=f"fireseed-shard-{shard}", daemon=True
+        )
+        proc.start()
+        procs.append(proc)
+    deadline = time.monotonic() + wait
+    for shard, address in enumerate(addresses):
+        while True:
+            try:
+                Client(address, authkey=authkey_for(address)).close()
+                break
+            except (OSError, EOFError):
+                if time.monotonic() > deadline or not procs[shard].is_alive():
+                    raise RuntimeError(f"shard {shard} failed to start on {address}")
+                time.sleep(0.05)
+    return procs
+
+
+def main(argv: Optional[Sequence[str]] = None) -> None:
+    from .score import _index_path
+
+    parser = argparse.ArgumentParser(description="Serve the sharded example index.")
+    sub = parser.add_subparsers(dest="command", required=True)
+    serve = sub.add_parser("serve", help="serve all shards (or one with --shard) from this host")
+    serve.add_argument("--index", type=Path, default=_index_path())
+    serve.add_argument("--shard", type=int, default=None)
+    serve.add_argument("--address", default=None, help="host:port or socket path for --shard")
+    serve.add_argument("--mode", choices=["eager", "mmap"], default=LOAD_MODE)
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO)
+    if args.shard is not None:
+        manifest_file = manifest_path(args.index)
+        address = parse_address(args.address) if args.address else shard_addresses(manifest_file, read_manifest(manifest_file))[args.shard]
+        ShardServer(args.index, args.shard, args.mode).serve(address)
+        return
+    procs = start_local_shards(args.index, args.mode)
+    for proc in procs:
+        proc.join()
+
+
+if __name__ == "__main__":
+    main()
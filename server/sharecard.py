@@ -4,9 +4,16 @@ Place assets/fonts/NotoSansSC-Regular.otf during deployment if required."""
 from __future__ import annotations
 
 import hashlib
+import hmac
+import os
+import time
+from functools import lru_cache
+from io import BytesIO
 from pathlib import Path
-from typing import Dict, Iterable, Tuple
+from typing import Any, Dict, Iterable, Mapping, Optional, Tuple
+from urllib.parse import quote, urlencode
 
+import numpy as np
 import orjson
 from PIL import Image, ImageDraw, ImageFont, features
 import qrcode
@@ -15,6 +22,11 @@ from qrcode.constants import ERROR_CORRECT_H
 OG_SIZE: Tuple[int, int] = (1200, 630)
 ICON_SIZE: Tuple[int, int] = (512, 512)
 FONT_PATH = Path(__file__).resolve().parents[1] / "assets" / "fonts" / "NotoSansSC-Regular.otf"
+# 排版结果（字号、截断后的文本）与 textbbox 测量的缓存条数
+LAYOUT_CACHE_SIZE = int(os.getenv("SHARECARD_LAYOUT_CACHE_SIZE", "4096"))
+# 按 URL 缓存的二维码模块矩阵条数
+QR_CACHE_SIZE = int(os.getenv("SHARECARD_QR_CACHE_SIZE", "1024"))
+QR_BORDER = 4
 
 _FONT_CACHE: Dict[Tuple[int, bool], ImageFont.ImageFont] = {}
 
@@ -89,6 +101,123 @@ def _truncate_text(
     return best
 
 
+class TextLayout:
+    """Memoized font fitting and truncation for sharecard text fields.
+
+    Runs exactly the binary searches of :func:`_fit_font_size` and
+    :func:`_truncate_text` (kept as the reference implementation), so the
+    chosen sizes and strings are identical, but:
+
+    * every ``textbbox`` measurement is memoized per ``(text, pt)``;
+    * whole results are memoized per ``(text, box, size range)``;
+    * per-size glyph advance widths from :func:`get_font` are cached, and a
+      candidate whose summed advances exceed the box by more than one em is
+      rejected without measuring. Pillow's basic layout never draws a
+      string narrower than its advances, so the bound only skips
+      measurements whose answer is already known; with raqm shaping
+      (kerning, ligatures) it is not used.
+
+    Keys include whether the bundled font exists, as :func:`get_font` does.
+    """
+
+    def __init__(self, cache_size: int = LAYOUT_CACHE_SIZE) -> None:
+        self._draw = ImageDraw.Draw(Image.new("RGB", (1, 1)))
+        self._advances: Dict[Tuple[int, bool], Dict[str, float]] = {}
+        self._measure = lru_cache(maxsize=cache_size * 8)(self._measure_uncached)
+        self._fit = lru_cache(maxsize=cache_size)(self._fit_uncached)
+        self._truncate = lru_cache(maxsize=cache_size)(self._truncate_uncached)
+
+    def measure(self, text: str, pt: int) -> Tuple[int, int]:
+        return self._measure(text, pt, FONT_PATH.exists())
+
+    def fit_font_size(self, text: str, max_width: int, max_height: int, max_pt: int, min_pt: int = 10) -> int:
+        return self._fit(text, max_width, max_height, max_pt, min_pt, FONT_PATH.exists())
+
+    def truncate(self, text: str, pt: int, max_width: int) -> str:
+        return self._truncate(text, pt, max_width, FONT_PATH.exists())
+
+    def _measure_uncached(self, text: str, pt: int, bundled: bool) -> Tuple[int, int]:
+        return _measure(self._draw, text, get_font(pt))
+
+    def _too_wide(self, text: str, pt: int, max_width: int, bundled: bool) -> bool:
+        font = get_font(pt)
+        if getattr(font, "layout_engine", None) != ImageFont.Layout.BASIC:
+            return False
+        advances = self._advances.setdefault((pt, bundled), {})
+        total = 0.0
+        for char in text:
+            width = advances.get(char)
+            if width is None:
+                width = advances[char] = font.getlength(char)
+            total += width
+        return total - pt > max_width
+
+    def _fits_width(self, text: str, pt: int, max_width: int, bundled: bool) -> bool:
+        if self._too_wide(text, pt, max_width, bundled):
+            return False
+        return self._measure(text, pt, bundled)[0] <= max_width
+
+    def _fit_uncached(
+        self, text: str, max_width: int, max_height: int, max_pt: int, min_pt: int, bundled: bool
+    ) -> int:
+        if not text:
+            return min_pt
+        low, high = min_pt, max_pt
+        best = min_pt
+        while low <= high:
+            mid = (low + high) // 2
+            fits = not self._too_wide(text, mid, max_width, bundled)
+            if fits:
+                width, height = self._measure(text, mid, bundled)
+                fits = width <= max_width and height <= max_height
+            if fits:
+                best = mid
+                low = mid + 1
+            else:
+                high = mid - 1
+        return best
+
+    def _truncate_uncached(self, text: str, pt: int, max_width: int, bundled: bool) -> str:
+        if not text:
+            return ""
+        if self._fits_width(text, pt, max_width, bundled):
+            return text
+        ellipsis = "…"
+        low, high = 0, len(text)
+        best = ellipsis
+        while low <= high:
+            mid = (low + high) // 2
+            candidate = text[:mid].rstrip()
+            candidate = candidate + ellipsis if candidate else ellipsis
+            if self._fits_width(candidate, pt, max_width, bundled):
+                best = candidate
+                low = mid + 1
+            else:
+                high = mid - 1
+        return best
+
+
+_LAYOUT = TextLayout()
+
+
+@lru_cache(maxsize=QR_CACHE_SIZE)
+def qr_matrix(url: str) -> np.ndarray:
+    """Read-only boolean module matrix (True = dark) of ``url``, quiet zone included."""
+    qr = qrcode.QRCode(error_correction=ERROR_CORRECT_H, border=QR_BORDER)
+    qr.add_data(url)
+    qr.make(fit=True)
+    matrix = np.array(qr.get_matrix(), dtype=bool)
+    matrix.flags.writeable = False
+    return matrix
+
+
+def qr_mask(url: str, box_size: int) -> Image.Image:
+    """``L`` mask of the QR code for ``url``: 255 on dark modules, ``box_size`` px per module."""
+    modules = qr_matrix(url)
+    pixels = np.repeat(np.repeat(modules, box_size, axis=0), box_size, axis=1)
+    return Image.fromarray(pixels.astype(np.uint8) * 255, mode="L")
+
+
 def _build_presence_text(uniqueness, ari) -> str:
     parts = []
     if uniqueness is not None:
@@ -101,9 +230,13 @@ def _build_presence_text(uniqueness, ari) -> str:
 _ALLOWED_SIZES = {OG_SIZE, ICON_SIZE}
 
 
-def render_sharecard(payload: dict, size: Tuple[int, int]) -> Image.Image:
+def render_sharecard(
+    payload: dict, size: Tuple[int, int], timings: Optional[Dict[str, float]] = None
+) -> Image.Image:
+    """Draw the card; ``timings`` (if given) receives seconds spent in ``qr`` and ``layout``."""
     if size not in _ALLOWED_SIZES:
         raise ValueError("unsupported size")
+    start = time.perf_counter()
 
     raw_title = payload.get("title")
     raw_subtitle = payload.get("subtitle")
@@ -123,14 +256,9 @@ def render_sharecard(payload: dict, size: Tuple[int, int]) -> Image.Image:
     qr_box_size = 6 if size == OG_SIZE else 4
     qr_margin = margin
 
-    qr = qrcode.QRCode(
-        error_correction=ERROR_CORRECT_H,
-        border=4,
-        box_size=qr_box_size,
-    )
-    qr.add_data(url)
-    qr.make(fit=True)
-    qr_img = qr.make_image(fill_color="black", back_color="white").convert("RGB")
+    qr_start = time.perf_counter()
+    qr_img = qr_mask(url, qr_box_size)
+    qr_seconds = time.perf_counter() - qr_start
     qr_width, qr_height = qr_img.size
     qr_x = width - qr_margin - qr_width
     qr_y = height - qr_margin - qr_height
@@ -138,17 +266,17 @@ def render_sharecard(payload: dict, size: Tuple[int, int]) -> Image.Image:
     text_area_width = max(width - (margin + qr_margin + qr_width) - margin, width // 2)
 
     title_max_height = int(height * 0.35)
-    title_size = _fit_font_size(draw, title, text_area_width, title_max_height, 78 if size == OG_SIZE else 50, 18)
+    layout = _LAYOUT
+    title_size = layout.fit_font_size(title, text_area_width, title_max_height, 78 if size == OG_SIZE else 50, 18)
     title_font = get_font(title_size)
-    title_text = _truncate_text(draw, title, title_font, text_area_width)
-    _, title_height = _measure(draw, title_text, title_font)
+    title_text = layout.truncate(title, title_size, text_area_width)
+    _, title_height = layout.measure(title_text, title_size)
 
     subtitle_text = subtitle
     subtitle_height = 0
     if subtitle_text:
         subtitle_max_height = int(height * 0.2)
-        subtitle_size = _fit_font_size(
-            draw,
+        subtitle_size = layout.fit_font_size(
             subtitle_text,
             text_area_width,
             subtitle_max_height,
@@ -156,8 +284,8 @@ def render_sharecard(payload: dict, size: Tuple[int, int]) -> Image.Image:
             14,
         )
         subtitle_font = get_font(subtitle_size)
-        subtitle_text = _truncate_text(draw, subtitle_text, subtitle_font, text_area_width)
-        _, subtitle_height = _measure(draw, subtitle_text, subtitle_font)
+        subtitle_text = layout.truncate(subtitle_text, subtitle_size, text_area_width)
+        _, subtitle_height = layout.measure(subtitle_text, subtitle_size)
     else:
         subtitle_font = None
 
@@ -165,8 +293,7 @@ def render_sharecard(payload: dict, size: Tuple[int, int]) -> Image.Image:
     presence_height = 0
     if presence_text:
         presence_max_height = int(height * 0.15)
-        presence_size = _fit_font_size(
-            draw,
+        presence_size = layout.fit_font_size(
             presence_text,
             text_area_width,
             presence_max_height,
@@ -174,8 +301,8 @@ def render_sharecard(payload: dict, size: Tuple[int, int]) -> Image.Image:
             12,
         )
         presence_font = get_font(presence_size)
-        presence_text = _truncate_text(draw, presence_text, presence_font, text_area_width)
-        _, presence_height = _measure(draw, presence_text, presence_font)
+        presence_text = layout.truncate(presence_text, presence_size, text_area_width)
+        _, presence_height = layout.measure(presence_text, presence_size)
     else:
         presence_font = None
 
@@ -190,7 +317,7 @@ def render_sharecard(payload: dict, size: Tuple[int, int]) -> Image.Image:
     fallback_needed = not FONT_PATH.exists()
     fallback_label = "[FONT_FALLBACK]"
     fallback_font = get_font(16)
-    _, fallback_height = _measure(draw, fallback_label, fallback_font)
+    _, fallback_height = layout.measure(fallback_label, 16)
     fallback_y = height - 12 - fallback_height
 
     if presence_font and presence_text:
@@ -201,15 +328,37 @@ def render_sharecard(payload: dict, size: Tuple[int, int]) -> Image.Image:
         meta_y = max(current_y, meta_top_limit)
         draw.text((margin, meta_y), presence_text, fill="black", font=presence_font)
 
-    image.paste(qr_img, (qr_x, qr_y))
+    # 先铺白底再按掩码涂黑，与直接粘贴黑白二维码图逐像素一致
+    qr_box = (qr_x, qr_y, qr_x + qr_width, qr_y + qr_height)
+    image.paste("white", qr_box)
+    image.paste("black", qr_box, qr_img)
 
     if fallback_needed:
         fallback_x = margin
         draw.text((fallback_x, fallback_y), fallback_label, fill="black", font=fallback_font)
 
+    if timings is not None:
+        timings["qr"] = qr_seconds
+        timings["layout"] = time.perf_counter() - start - qr_seconds
     return image
 
 
+def render_encoded(payload: dict, size: Tuple[int, int], fmt: str) -> Tuple[bytes, Dict[str, float]]:
+    """Render and encode a card in one call, for the render process pool.
+
+    Takes and returns only plain values so it can run in another process;
+    the second item holds the seconds spent per stage (``layout``, ``qr``,
+    ``encode``).
+    """
+    timings: Dict[str, float] = {}
+    image = render_sharecard(payload, size, timings)
+    start = time.perf_counter()
+    buffer = BytesIO()
+    image.save(buffer, format=fmt)
+    timings["encode"] = time.perf_counter() - start
+    return buffer.getvalue(), timings
+
+
 def choose_format(accept_header: str | None, explicit_format: str | None = None) -> Tuple[str, str]:
     webp_supported = bool(features.check("webp"))
     if explicit_format:
@@ -244,3 +393,44 @@ def compute_etag(payload: dict, size: Tuple[int, int], fmt: str) -> str:
         canonical + f"{size[0]}x{size[1]}".encode() + fmt.encode()
     ).hexdigest()
     return digest[:16]
+
+
+def render_key(etag: str) -> str:
+    """Cache key for an encoded card: the ETag, marked when the fallback font was used."""
+    # ETag 只覆盖请求字段；字体缺失时渲染结果不同，不能与正常图共用缓存
+    return etag if FONT_PATH.exists() else f"{etag}-nofont"
+
+
+# GET /sharecard 查询串里允许出现的字段：ETag 白名单字段加尺寸与显式格式
+QUERY_FIELDS: Tuple[str, ...] = tuple(_WHITELIST_FIELDS) + ("size", "format")
+
+
+def canonical_query(fields: Mapping[str, Any]) -> str:
+    """The one query string ``GET /sharecard`` serves ``fields`` under.
+
+    Keys are sorted, ``format`` lower-cased, empty values and the default
+    1200x630 size dropped and values percent-encoded with ``%20`` for
+    spaces, so every CDN cache key for a card is the same.
+    """
+    items = []
+    for field in sorted(QUERY_FIELDS):
+        value = fields.get(field)
+        if field == "format" and value is not None:
+            value = str(value).strip().lower()
+        if value is None or value == "" or (field == "size" and value == f"{OG_SIZE[0]}x{OG_SIZE[1]}"):
+            continue
+        items.append((field, str(value)))
+    return urlencode(items, quote_via=quote, safe="")
+
+
+def sign_query(query: str, key: str) -> str:
+    """HMAC-SHA256 signature of a canonical query, sent as ``sig``."""
+    return hmac.new(key.encode("utf-8"), query.encode("utf-8"), hashlib.sha256).hexdigest()[:32]
+
+
+def sharecard_query(fields: Mapping[str, Any], key: str = "") -> str:
+    """Canonical query plus ``sig`` when ``key`` is set, for building card URLs."""
+    query = canonical_query(fields)
+    if key:
+        query += "&sig=" + sign_query(query, key)
+    return query
@@ -0,0 +1,195 @@
+"""Content-addressed cache of encoded sharecard images.
+
+Keys are sharecard ETags (see :func:`server.sharecard.compute_etag`), which
+already cover every rendered field plus size and format, so a hit can be
+served without touching Pillow. Two tiers:
+
+* memory – an LRU bounded by total bytes (``SHARECARD_CACHE_MEMORY_BYTES``);
+* disk – one file per key under ``SHARECARD_CACHE_DIR``, shared by all
+  workers on the host; when the directory grows past
+  ``SHARECARD_CACHE_DISK_BYTES`` the least recently used files are removed
+  down to ``_DISK_LOW_WATER`` of the limit.
+
+Disk hits are promoted to memory. Either tier is disabled with a size of 0.
+"""
+from __future__ import annotations
+
+import logging
+import os
+import re
+from collections import OrderedDict
+from functools import lru_cache
+from pathlib import Path
+from threading import Lock
+from typing import List, Optional, Tuple
+
+from .metrics import (
+    sharecard_cache_bytes_served_total,
+    sharecard_cache_hit_ratio,
+    sharecard_cache_hits_total,
+    sharecard_cache_misses_total,
+)
+
+logger = logging.getLogger(__name__)
+
+CACHE_DIR = Path(os.getenv("SHARECARD_CACHE_DIR", str(Path(__file__).resolve().parents[1] / "data" / "sharecard_cache")))
+MEMORY_BYTES = int(os.getenv("SHARECARD_CACHE_MEMORY_BYTES", str(64 * 2**20)))
+DISK_BYTES = int(os.getenv("SHARECARD_CACHE_DISK_BYTES", str(512 * 2**20)))
+
+# 磁盘超限后清理到上限的这个比例，避免每次写入都触发整目录扫描
+_DISK_LOW_WATER = 0.9
+_KEY_RE = re.compile(r"[0-9A-Za-z_-]{1,64}")
+
+
+class ByteLRU:
+    """In-process LRU of byte strings bounded by their total length."""
+
+    def __init__(self, capacity_bytes: int) -> None:
+        self.capacity = max(0, capacity_bytes)
+        self.size = 0
+        self._data: "OrderedDict[str, bytes]" = OrderedDict()
+        self._lock = Lock()
+
+    def get(self, key: str) -> Optional[bytes]:
+        with self._lock:
+            content = self._data.get(key)
+            if content is not None:
+                self._data.move_to_end(key)
+            return content
+
+    def put(self, key: str, content: bytes) -> None:
+        if len(content) > self.capacity:
+            return
+        with self._lock:
+            previous = self._data.pop(key, None)
+            if previous is not None:
+                self.size -= len(previous)
+            self._data[key] = content
+            self.size += len(content)
+            while self.size > self.capacity:
+                _, evicted = self._data.popitem(last=False)
+                self.size -= len(evicted)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+            self.size = 0
+
+
+class DiskImageStore:
+    """Directory of encoded images, one file per key, evicted by least recent use.
+
+    Reads bump the file's mtime, which is the recency the evictor sorts by.
+    Files are written to a per-process temporary name and renamed into place,
+    so concurrent workers never read a partial image.
+    """
+
+    def __init__(self, directory: Path, capacity_bytes: int) -> None:
+        self.directory = directory
+        self.capacity = max(0, capacity_bytes)
+        self._lock = Lock()
+        self.size = sum(size for _, size, _ in self._scan())
+
+    def _path(self, key: str) -> Path:
+        if not _KEY_RE.fullmatch(key):
+            raise ValueError(f"invalid sharecard cache key: {key!r}")
+        return self.directory / key
+
+    def _scan(self) -> List[Tuple[float, int, Path]]:
+        entries = []
+        try:
+            paths = list(self.directory.iterdir())
+        except FileNotFoundError:
+            return []
+        for path in paths:
+            if path.name.startswith("."):
+                continue
+            try:
+                stat = path.stat()
+            except FileNotFoundError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, path))
+        return entries
+
+    def get(self, key: str) -> Optional[bytes]:
+        path = self._path(key)
+        try:
+            content = path.read_bytes()
+            os.utime(path)
+        except FileNotFoundError:
+            return None
+        return content
+
+    def put(self, key: str, content: bytes) -> None:
+        if len(content) > self.capacity:
+            return
+        path = self._path(key)
+        self.directory.mkdir(parents=True, exist_ok=True)
+        tmp = self.directory / f".{key}.{os.getpid()}.tmp"
+        tmp.write_bytes(content)
+        os.replace(tmp, path)
+        with self._lock:
+            self.size += len(content)
+            if self.size > self.capacity:
+                self._evict()
+
+    def _evict(self) -> None:
+        # 其他 worker 也在写同一目录：以磁盘上的实际内容为准重新统计
+        entries = sorted(self._scan())
+        total = sum(size for _, size, _ in entries)
+        target = self.capacity * _DISK_LOW_WATER
+        for _, size, path in entries:
+            if total <= target:
+                break
+            path.unlink(missing_ok=True)
+            total -= size
+        self.size = total
+
+
+class SharecardCache:
+    """Memory tier in front of an optional disk tier, with hit metrics."""
+
+    def __init__(self, memory_bytes: int, disk: Optional[DiskImageStore] = None) -> None:
+        self.memory = ByteLRU(memory_bytes)
+        self.disk = disk
+        self._hits = 0
+        self._lookups = 0
+        self._lock = Lock()
+
+    def get(self, key: str) -> Optional[Tuple[str, bytes]]:
+        """``(tier, content)`` of a cached image, or None on a miss."""
+        tier = "memory"
+        content = self.memory.get(key)
+        if content is None and self.disk is not None:
+            try:
+                content = self.disk.get(key)
+            except OSError as exc:  # pragma: no cover - unreadable volume
+                logger.warning("Sharecard cache read failed: %s", exc)
+            if content is not None:
+                tier = "disk"
+                self.memory.put(key, content)
+        with self._lock:
+            self._lookups += 1
+            if content is not None:
+                self._hits += 1
+            sharecard_cache_hit_ratio.set(self._hits / self._lookups)
+        if content is None:
+            sharecard_cache_misses_total.inc()
+            return None
+        sharecard_cache_hits_total.labels(tier=tier).inc()
+        sharecard_cache_bytes_served_total.labels(tier=tier).inc(len(content))
+        return tier, content
+
+    def put(self, key: str, content: bytes) -> None:
+        self.memory.put(key, content)
+        if self.disk is not None:
+            try:
+                self.disk.put(key, content)
+            except OSError as exc:  # pragma: no cover - disk full or read-only volume
+                logger.warning("Sharecard cache write failed: %s", exc)
+
+
+@lru_cache(maxsize=None)
+def get_sharecard_cache() -> SharecardCache:
+    disk = DiskImageStore(CACHE_DIR, DISK_BYTES) if DISK_BYTES > 0 else None
+    return SharecardCache(MEMORY_BYTES, disk)
@@ -0,0 +1,92 @@
+import asyncio
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+import pytest
+
+from server.batcher import ScoreCoalescer
+from server.score import ScoredBatch
+from server.executor import BoundedExecutor, ExecutorSaturated
+
+
+class RecordingScorer:
+    def __init__(self):
+        self.calls = []
+
+    def __call__(self, texts, top_k):
+        self.calls.append((list(texts), top_k))
+        return ScoredBatch([(len(text), ["topk_mean"]) for text in texts], "v1")
+
+
+def test_coalescer_merges_concurrent_requests():
+    scorer = RecordingScorer()
+    coalescer = ScoreCoalescer(window_seconds=0.05, max_batch=16, scorer=scorer)
+
+    async def main():
+        return await asyncio.gather(*(coalescer.score("x" * n) for n in range(1, 6)))
+
+    results = asyncio.run(main())
+
+    assert [uniqueness for (uniqueness, _), _ in results] == [1, 2, 3, 4, 5]
+    assert {version for _, version in results} == {"v1"}
+    assert len(scorer.calls) == 1
+    assert len(scorer.calls[0][0]) == 5
+
+
+def test_coalescer_respects_max_batch():
+    scorer = RecordingScorer()
+    coalescer = ScoreCoalescer(window_seconds=0.05, max_batch=2, scorer=scorer)
+
+    async def main():
+        return await asyncio.gather(*(coalescer.score("x") for _ in range(5)))
+
+    asyncio.run(main())
+
+    assert [len(texts) for texts, _ in scorer.calls] == [2, 2, 1]
+
+
+def test_coalescer_propagates_errors():
+    def failing(texts, top_k):
+        raise RuntimeError("encode failed")
+
+    coalescer = ScoreCoalescer(window_seconds=0.01, max_batch=4, scorer=failing)
+
+    async def main():
+        return await asyncio.gather(coalescer.score("a"), coalescer.score("b"), return_exceptions=True)
+
+    results = asyncio.run(main())
+
+    assert all(isinstance(result, RuntimeError) for result in results)
+
+
+def test_bounded_executor_rejects_when_full():
+    executor = BoundedExecutor("thread", workers=1, max_inflight=2)
+    executor.admit(2)
+    with pytest.raises(ExecutorSaturated):
+        executor.admit(1)
+    executor.release(1)
+    executor.admit(1)
+    assert executor.inflight == 2
+    executor.shutdown()
+
+
+def test_coalescer_runs_batches_off_the_event_loop():
+    import threading
+
+    threads = []
+
+    def scorer(texts, top_k):
+        threads.append(threading.current_thread().name)
+        return ScoredBatch([(0, []) for _ in texts], "v1")
+
+    coalescer = ScoreCoalescer(
+        window_seconds=0.01,
+        max_batch=4,
+        scorer=scorer,
+        executor=BoundedExecutor("thread", workers=1, max_inflight=8),
+    )
+    asyncio.run(coalescer.score("a"))
+
+    assert threads and threads[0].startswith("fireseed-exec")
@@ -0,0 +1,108 @@
+import sys
+from pathlib import Path
+
+import numpy as np
+import orjson
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from server import bulk_score
+from server import score as score_module
+from server.embed_cache import EmbeddingCache, MemoryLRU
+
+DIM = 8
+
+
+class LengthModel:
+    def __init__(self, interrupt_after=None):
+        self.calls = 0
+        self.interrupt_after = interrupt_after
+
+    def encode(self, texts, **kwargs):
+        if self.interrupt_after is not None and self.calls >= self.interrupt_after:
+            raise KeyboardInterrupt
+        self.calls += 1
+        vectors = np.zeros((len(texts), DIM), dtype=np.float32)
+        for row, text in enumerate(texts):
+            vectors[row, 0] = min(len(text), 10) / 10.0
+        return vectors
+
+
+class FirstColumnIndex:
+    ntotal = 3
+
+    def search(self, vecs, k):
+        return np.repeat(vecs[:, :1], k, axis=1), np.zeros((vecs.shape[0], k), dtype=np.int64)
+
+
+@pytest.fixture(autouse=True)
+def scoring(monkeypatch):
+    index = FirstColumnIndex()
+    monkeypatch.setattr(score_module, "get_index_state", lambda: score_module.IndexState(index, "v1"))
+    monkeypatch.setattr(score_module, "get_index_version", lambda: "v1")
+    monkeypatch.setattr(score_module, "index_version_on_disk", lambda: "v1")
+    monkeypatch.setattr(score_module, "_RESULT_CACHE", MemoryLRU(0))
+    cache = EmbeddingCache(memory_size=0)
+    monkeypatch.setattr(score_module, "get_embedding_cache", lambda model_id: cache)
+
+
+def _write_input(path, count):
+    lines = [orjson.dumps({"id": f"c{n}", "text": "x" * (n % 10 + 1)}) for n in range(count)]
+    lines.insert(3, b"not json")
+    path.write_bytes(b"\n".join(lines) + b"\n")
+
+
+def _read_output(path):
+    return [orjson.loads(line) for line in path.read_bytes().splitlines()]
+
+
+def test_bulk_score_matches_compute_uniqueness(tmp_path, monkeypatch):
+    monkeypatch.setattr(score_module, "get_model", lambda: LengthModel())
+    source, target = tmp_path / "in.jsonl", tmp_path / "out.jsonl"
+    _write_input(source, 6)
+
+    summary = bulk_score.run(source, target, workers=0, chunk_size=4)
+
+    rows = _read_output(target)
+    assert summary["lines"] == 7
+    assert rows[3] == {"id": None, "line": 4, "error": "invalid json"}
+    scored = [row for row in rows if "error" not in row]
+    assert [row["id"] for row in scored] == [f"c{n}" for n in range(6)]
+    expected = score_module.compute_uniqueness_batch(["x" * (n % 10 + 1) for n in range(6)])
+    assert [(row["uniqueness"], row["explanations"]) for row in scored] == expected
+    assert scored[0]["index_version"] == "v1"
+
+
+def test_bulk_score_resumes_after_interruption(tmp_path, monkeypatch):
+    source, target = tmp_path / "in.jsonl", tmp_path / "out.jsonl"
+    _write_input(source, 9)
+
+    interrupted = LengthModel(interrupt_after=1)
+    monkeypatch.setattr(score_module, "get_model", lambda: interrupted)
+    with pytest.raises(KeyboardInterrupt):
+        bulk_score.run(source, target, workers=0, chunk_size=4)
+    checkpoint = orjson.loads(bulk_score.checkpoint_path(target).read_bytes())
+    assert checkpoint["lines"] == 4
+    with open(target, "ab") as handle:
+        handle.write(b'{"id": "half-writ')
+
+    model = LengthModel()
+    monkeypatch.setattr(score_module, "get_model", lambda: model)
+    summary = bulk_score.run(source, target, workers=0, chunk_size=4)
+
+    assert summary["resumed"] == 4
+    ids = [row.get("id") for row in _read_output(target) if "error" not in row]
+    assert ids == [f"c{n}" for n in range(9)]
+
+
+def test_bulk_score_refuses_checkpoint_from_other_index(tmp_path, monkeypatch):
+    monkeypatch.setattr(score_module, "get_model", lambda: LengthModel())
+    source, target = tmp_path / "in.jsonl", tmp_path / "out.jsonl"
+    _write_input(source, 2)
+    bulk_score.run(source, target, workers=0)
+
+    monkeypatch.setattr(score_module, "index_version_on_disk", lambda: "v2")
+    with pytest.raises(RuntimeError):
+        bulk_score.run(source, target, workers=0)
+    assert bulk_score.run(source, target, workers=0, restart=True)["resumed"] == 0
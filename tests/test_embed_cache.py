@@ -0,0 +1,89 @@
+import sys
+from pathlib import Path
+
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from server.embed_cache import DiskStore, EmbeddingCache, MemoryLRU, cache_key, normalize_text
+
+
+def test_normalization_collapses_width_and_whitespace():
+    assert normalize_text("  ＦＩＲＥ　seed \n capsule ") == "FIRE seed capsule"
+    assert cache_key("a  b", "m") == cache_key("a b\n", "m")
+    assert cache_key("a b", "m") != cache_key("a b", "other-model")
+
+
+def test_memory_lru_evicts_oldest():
+    lru = MemoryLRU(2)
+    lru.put(b"a", np.zeros(2))
+    lru.put(b"b", np.zeros(2))
+    lru.get(b"a")
+    lru.put(b"c", np.zeros(2))
+    assert lru.get(b"b") is None
+    assert lru.get(b"a") is not None
+
+
+def test_disk_store_survives_reopen(tmp_path):
+    key = cache_key("hello", "m")
+    vector = np.linspace(0, 1, 8, dtype=np.float32)
+    DiskStore(tmp_path, capacity=4, dtype="float16").put(key, vector)
+
+    reopened = DiskStore(tmp_path, capacity=4, dtype="float16")
+    loaded = reopened.get(key)
+
+    assert loaded is not None
+    assert loaded.dtype == np.float32
+    np.testing.assert_allclose(loaded, vector, atol=1e-3)
+
+
+def test_disk_store_ring_overwrites_oldest(tmp_path):
+    store = DiskStore(tmp_path, capacity=2, dtype="float32")
+    keys = [cache_key(str(i), "m") for i in range(3)]
+    for i, key in enumerate(keys):
+        store.put(key, np.full(4, i, dtype=np.float32))
+
+    assert store.get(keys[0]) is None
+    assert store.get(keys[2])[0] == 2
+
+
+def test_embedding_cache_promotes_disk_hits(tmp_path):
+    key = cache_key("hello", "m")
+    EmbeddingCache(4, DiskStore(tmp_path, 4)).put_many([key], [np.ones(4, dtype=np.float32)])
+
+    cache = EmbeddingCache(4, DiskStore(tmp_path, 4))
+    assert cache.get_many([key])[0] is not None
+    assert cache.memory.get(key) is not None
+
+
+def test_disk_store_shared_between_workers(tmp_path):
+    # 两个 worker 在缓存文件创建之前同时启动
+    first = DiskStore(tmp_path, capacity=3, dtype="float32")
+    second = DiskStore(tmp_path, capacity=3, dtype="float32")
+    keys = [cache_key(str(i), "m") for i in range(4)]
+    first.put(keys[0], np.full(4, 0, dtype=np.float32))
+    second.put(keys[1], np.full(4, 1, dtype=np.float32))
+
+    assert second.get(keys[0])[0] == 0
+    assert first.get(keys[1])[0] == 1
+
+    # 另一个 worker 覆盖了环上最旧的行：本地映射过期也不会返回错误向量
+    second.put(keys[2], np.full(4, 2, dtype=np.float32))
+    second.put(keys[3], np.full(4, 3, dtype=np.float32))
+    assert first.get(keys[0]) is None
+    assert first.get(keys[3])[0] == 3
+
+
+def test_disk_store_with_other_layout_is_disabled_once(tmp_path, caplog):
+    key = cache_key("hello", "m")
+    DiskStore(tmp_path, capacity=4, dtype="float16").put(key, np.ones(4, dtype=np.float32))
+    before = (tmp_path / "vectors.bin").read_bytes()
+
+    with caplog.at_level("WARNING", logger="server.embed_cache"):
+        store = DiskStore(tmp_path, capacity=8, dtype="float16")
+        for i in range(3):
+            store.put(cache_key(str(i), "m"), np.full(4, i, dtype=np.float32))
+            assert store.get(key) is None
+
+    assert len([record for record in caplog.records if "layout changed" in record.message]) == 1
+    assert (tmp_path / "vectors.bin").read_bytes() == before
@@ -0,0 +1,104 @@
+import asyncio
+import socket
+import sys
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+import numpy as np
+import pytest
+
+from server import score as score_module
+from server.embed_server import EmbeddingServer, EmbedServerError, EmbedServerUnavailable, RemoteEncoder
+
+
+class LengthModel:
+    def __init__(self):
+        self.calls = []
+        self.lock = threading.Lock()
+
+    def encode(self, texts, **kwargs):
+        with self.lock:
+            self.calls.append(list(texts))
+        if any(text == "boom" for text in texts):
+            raise RuntimeError("encode failed")
+        return np.array([[len(text), 1.0] for text in texts], dtype=np.float32)
+
+
+@pytest.fixture
+def embed_server(tmp_path):
+    model = LengthModel()
+    server = EmbeddingServer(model, max_batch=64, window_seconds=0.05)
+    socket_path = tmp_path / "embed.sock"
+    ready = threading.Event()
+    loop = asyncio.new_event_loop()
+    task_box = {}
+
+    def run():
+        asyncio.set_event_loop(loop)
+        task_box["task"] = loop.create_task(server.serve(socket_path, ready))
+        try:
+            loop.run_until_complete(task_box["task"])
+        except asyncio.CancelledError:
+            pass
+
+    thread = threading.Thread(target=run, daemon=True)
+    thread.start()
+    assert ready.wait(5)
+    yield model, str(socket_path)
+    loop.call_soon_threadsafe(task_box["task"].cancel)
+    thread.join(5)
+
+
+def test_remote_encoder_roundtrip(embed_server):
+    _, socket_path = embed_server
+    encoder = RemoteEncoder(socket_path)
+
+    vectors = encoder.encode(["a", "abc"], normalize_embeddings=True, convert_to_numpy=True)
+
+    assert vectors.dtype == np.float32
+    np.testing.assert_array_equal(vectors, [[1.0, 1.0], [3.0, 1.0]])
+
+
+def test_server_coalesces_requests_from_many_clients(embed_server):
+    model, socket_path = embed_server
+    encoder = RemoteEncoder(socket_path)
+
+    with ThreadPoolExecutor(max_workers=8) as pool:
+        results = list(pool.map(lambda n: encoder.encode(["x" * n]), range(1, 9)))
+
+    assert [int(result[0, 0]) for result in results] == list(range(1, 9))
+    assert len(model.calls) < 8
+
+
+def test_failed_item_only_fails_its_request(embed_server):
+    _, socket_path = embed_server
+    encoder = RemoteEncoder(socket_path)
+
+    with pytest.raises(EmbedServerError):
+        encoder.encode(["boom"])
+    assert encoder.encode(["ok"])[0, 0] == 2.0
+
+
+def test_hung_server_fails_whole_batch_without_retries(tmp_path):
+    socket_path = str(tmp_path / "hung.sock")
+    listener = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    listener.bind(socket_path)
+    listener.listen(8)
+    calls = []
+
+    class CountingEncoder(RemoteEncoder):
+        def encode(self, texts, **kwargs):
+            calls.append(list(texts))
+            return super().encode(texts, **kwargs)
+
+    try:
+        encoder = CountingEncoder(socket_path, timeout=0.1)
+        with pytest.raises(EmbedServerUnavailable):
+            score_module._encode_batch(encoder, ["a", "b", "c"])
+    finally:
+        listener.close()
+
+    assert len(calls) == 1
@@ -0,0 +1,63 @@
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+import numpy as np
+import orjson
+import pytest
+
+from server.encoders import OnnxEncoder, _pooling_mode, load_encoder
+
+
+class FakeSession:
+    def run(self, outputs, feed):
+        ids = feed["input_ids"]
+        # 每个 token 的隐藏向量为 [token_id, 1]
+        return [np.stack([ids, np.ones_like(ids)], axis=-1).astype(np.float32)]
+
+
+class FakeTokenizer:
+    def __call__(self, texts, **kwargs):
+        width = max(len(text) for text in texts)
+        ids = np.array([[len(text)] + [0] * (width - 1) for text in texts])
+        mask = np.array([[1] * len(text) + [0] * (width - len(text)) for text in texts])
+        ids = np.where(mask == 1, np.maximum(ids, 1), 0)
+        return {"input_ids": ids, "attention_mask": mask}
+
+
+def _encoder(pooling):
+    encoder = object.__new__(OnnxEncoder)
+    encoder.session = FakeSession()
+    encoder.tokenizer = FakeTokenizer()
+    encoder.pooling = pooling
+    encoder._inputs = {"input_ids", "attention_mask"}
+    return encoder
+
+
+def test_unknown_backend_is_rejected(tmp_path):
+    with pytest.raises(ValueError):
+        load_encoder(tmp_path, "fp8")
+
+
+def test_pooling_mode_reads_sentence_transformers_config(tmp_path):
+    assert _pooling_mode(tmp_path) == "cls"
+    (tmp_path / "1_Pooling").mkdir()
+    (tmp_path / "1_Pooling" / "config.json").write_bytes(orjson.dumps({"pooling_mode_mean_tokens": True}))
+    assert _pooling_mode(tmp_path) == "mean"
+
+
+def test_onnx_encoder_cls_pooling_normalizes():
+    vectors = _encoder("cls").encode(["abc", "a"], batch_size=1, normalize_embeddings=True)
+
+    assert vectors.shape == (2, 2)
+    np.testing.assert_allclose(np.linalg.norm(vectors, axis=1), 1.0, rtol=1e-6)
+    np.testing.assert_allclose(vectors[0], np.array([3.0, 1.0]) / np.sqrt(10), rtol=1e-6)
+
+
+def test_onnx_encoder_mean_pooling_ignores_padding():
+    vectors = _encoder("mean").encode(["abcd", "ab"])
+
+    # "abcd": tokens [4, 1, 1, 1] -> mean 1.75；"ab": tokens [2, 1] -> mean 1.5
+    np.testing.assert_allclose(vectors[:, 0], [1.75, 1.5])
+    np.testing.assert_allclose(vectors[:, 1], [1.0, 1.0])
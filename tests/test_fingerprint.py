@@ -0,0 +1,95 @@
+import sys
+from pathlib import Path
+
+import numpy as np
+import orjson
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from server import index_build
+from server import score as score_module
+from server.embed_cache import EmbeddingCache, MemoryLRU
+from server.fingerprint import SimHashIndex, hamming, simhash, simhash_path
+from server.index_store import vectors_path
+
+LONG_TEXT = (
+    "火种胶囊记录了一次关于长期保存与可验证分享的讨论，包括签名、哈希与镜像的校验流程。"
+    "我们还讨论了离线环境下的模型预热、IPFS 网关探测与回退，以及分享卡片的二维码生成。"
+)
+OTHER_TEXT = "Rate limiting with burst detection keeps the scoring API responsive under sudden load spikes."
+
+
+def test_simhash_ignores_whitespace_and_case():
+    assert simhash(LONG_TEXT) == simhash("  " + LONG_TEXT.replace(" ", "   ") + "\n")
+    assert simhash("Hello   World example text") == simhash("hello world EXAMPLE text")
+    assert simhash("ab") == 0
+
+
+def test_simhash_separates_unrelated_texts():
+    distance = hamming(np.array([simhash(OTHER_TEXT)], dtype=np.uint64), simhash(LONG_TEXT))[0]
+    assert distance > 10
+
+
+def test_banded_lookup_finds_rows_within_distance():
+    base = simhash(LONG_TEXT)
+    near = base ^ 0b101  # 两位不同
+    far = base ^ int("1" * 12, 2)
+    vectors = np.eye(3, dtype=np.float32)
+    index = SimHashIndex(np.array([0, 1, 2]), np.array([far, near, simhash(OTHER_TEXT)], dtype=np.uint64), vectors)
+
+    assert index.nearest(base) == (1, 2)
+    np.testing.assert_array_equal(index.match(LONG_TEXT), vectors[1])
+    assert index.match("短文本") is None
+
+
+class CountingModel:
+    def __init__(self):
+        self.encoded = []
+
+    def encode(self, texts, **kwargs):
+        self.encoded.extend(texts)
+        rows = [np.random.default_rng(len(text)).standard_normal(8).astype(np.float32) for text in texts]
+        return np.stack([row / np.linalg.norm(row) for row in rows])
+
+
+def test_near_duplicate_skips_the_model(tmp_path, monkeypatch):
+    model = CountingModel()
+    monkeypatch.setattr(score_module, "get_model", lambda: model)
+    capsules = tmp_path / "capsules"
+    capsules.mkdir()
+    (capsules / "a.json").write_bytes(orjson.dumps({"title": LONG_TEXT}))
+    (capsules / "b.json").write_bytes(orjson.dumps({"title": OTHER_TEXT}))
+    index_path = tmp_path / "examples.index"
+    index_build.build(capsules, index_path)
+    assert simhash_path(index_path).exists()
+
+    monkeypatch.setattr(score_module, "_index_path", lambda: index_path)
+    monkeypatch.setattr(score_module, "_INDEX_STATE", score_module.IndexState())
+    monkeypatch.setattr(score_module, "_FAILED_SIGNATURE", score_module._UNLOADED)
+    monkeypatch.setattr(score_module, "_RESULT_CACHE", MemoryLRU(16))
+    cache = EmbeddingCache(memory_size=16)
+    monkeypatch.setattr(score_module, "get_embedding_cache", lambda model_id: cache)
+    assert score_module.reload_index() is True
+    model.encoded.clear()
+
+    duplicate, fresh = score_module.compute_uniqueness_batch([LONG_TEXT + " ", "一段完全不同的新内容，与索引中的任何胶囊都无关。"])
+
+    assert "near_duplicate" in duplicate[1]
+    assert duplicate[0] < 100
+    assert "near_duplicate" not in fresh[1]
+    assert model.encoded == ["一段完全不同的新内容，与索引中的任何胶囊都无关。"]
+
+
+def test_open_refuses_fingerprints_from_another_build(tmp_path):
+    index_path = tmp_path / "examples.index"
+    vectors = np.eye(3, 8, dtype=np.float32)
+    version = index_build.write_index(index_path, ["a", "b", "c"], vectors, fingerprints={"b": simhash(LONG_TEXT)})
+    assert len(SimHashIndex.open(index_path, version=version)) == 1
+    with pytest.raises(RuntimeError):
+        SimHashIndex.open(index_path, version="other")
+
+    # 重建进行到一半：向量文件已按新顺序替换，版本文件仍是旧的
+    index_build._atomic_save_npy(vectors_path(index_path), vectors[::-1])
+    with pytest.raises(RuntimeError):
+        SimHashIndex.open(index_path, version=version)
@@ -0,0 +1,101 @@
+import sys
+from pathlib import Path
+
+import numpy as np
+import orjson
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from server import index_build
+from server import score as score_module
+from server.index_store import load_index, read_version_file, vectors_path
+
+DIM = 8
+
+
+class HashModel:
+    def __init__(self, fail_after=None):
+        self.encoded = []
+        self.fail_after = fail_after
+
+    def encode(self, texts, **kwargs):
+        if self.fail_after is not None and len(self.encoded) >= self.fail_after:
+            raise RuntimeError("interrupted")
+        self.encoded.extend(texts)
+        rows = []
+        for text in texts:
+            rng = np.random.default_rng(abs(hash(text)) % 2**32)
+            vec = rng.standard_normal(DIM).astype(np.float32)
+            rows.append(vec / np.linalg.norm(vec))
+        return np.stack(rows)
+
+
+def _write_capsules(directory, names):
+    directory.mkdir(parents=True, exist_ok=True)
+    for name in names:
+        (directory / f"{name}.json").write_bytes(
+            orjson.dumps({"title": f"title {name}", "content": {"summary": f"summary {name}"}})
+        )
+
+
+def test_capsule_text_uses_content_fields():
+    text = index_build.capsule_text({"title": "T", "content": {"summary": "S", "details": "D"}, "owner": "x"})
+    assert text == "T\nS\nD"
+
+
+def test_build_writes_index_and_id_map(tmp_path, monkeypatch):
+    model = HashModel()
+    monkeypatch.setattr(score_module, "get_model", lambda: model)
+    capsules = tmp_path / "capsules"
+    _write_capsules(capsules, ["b", "a", "c"])
+    index_path = tmp_path / "examples.index"
+
+    summary = index_build.build(capsules, index_path, batch_size=2)
+
+    assert summary["added"] == 3
+    assert orjson.loads(index_build.ids_path(index_path).read_bytes()) == ["a", "b", "c"]
+    version, stamps = read_version_file(index_path)
+    assert version == summary["version"]
+    assert {"examples.vectors.npy", "examples.ids.json"} <= set(stamps)
+    index = load_index(index_path, mode="mmap")
+    assert index.ntotal == 3
+    assert not index_build.checkpoint_dir(index_path).exists()
+
+
+def test_build_append_embeds_new_capsules_only(tmp_path, monkeypatch):
+    monkeypatch.setattr(score_module, "get_model", lambda: HashModel())
+    capsules = tmp_path / "capsules"
+    _write_capsules(capsules, ["a", "b"])
+    index_path = tmp_path / "examples.index"
+    first = index_build.build(capsules, index_path)
+
+    model = HashModel()
+    monkeypatch.setattr(score_module, "get_model", lambda: model)
+    _write_capsules(capsules, ["c"])
+    second = index_build.build(capsules, index_path, append=True)
+
+    assert second["added"] == 1
+    assert len(model.encoded) == 1
+    assert second["version"] != first["version"]
+    assert np.load(vectors_path(index_path)).shape == (3, DIM)
+
+
+def test_build_resumes_from_checkpoint(tmp_path, monkeypatch):
+    capsules = tmp_path / "capsules"
+    _write_capsules(capsules, ["a", "b", "c", "d"])
+    index_path = tmp_path / "examples.index"
+
+    failing = HashModel(fail_after=2)
+    monkeypatch.setattr(score_module, "get_model", lambda: failing)
+    with pytest.raises(RuntimeError):
+        index_build.build(capsules, index_path, batch_size=2)
+    assert index_build.checkpoint_dir(index_path).exists()
+
+    model = HashModel()
+    monkeypatch.setattr(score_module, "get_model", lambda: model)
+    summary = index_build.build(capsules, index_path, batch_size=2)
+
+    assert summary["resumed"] == 2
+    assert len(model.encoded) == 2
+    assert orjson.loads(index_build.ids_path(index_path).read_bytes()) == ["a", "b", "c", "d"]
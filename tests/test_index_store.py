@@ -0,0 +1,117 @@
+import sys
+from pathlib import Path
+
+import numpy as np
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from server import index_store
+from server.index_store import (
+    NumpyFlatIndex,
+    apply_search_params,
+    create_faiss_index,
+    index_factory_string,
+    load_index,
+    vectors_path,
+)
+
+
+def _normalized(rows, dim, seed=0):
+    rng = np.random.default_rng(seed)
+    vectors = rng.standard_normal((rows, dim)).astype(np.float32)
+    return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+
+def test_numpy_flat_index_matches_brute_force():
+    vectors = _normalized(200, 16)
+    queries = _normalized(5, 16, seed=1)
+    index = NumpyFlatIndex(vectors)
+
+    distances, ids = index.search(queries, 4)
+
+    expected = np.argsort(-(queries @ vectors.T), axis=1)[:, :4]
+    np.testing.assert_array_equal(ids, expected)
+    np.testing.assert_allclose(distances, np.take_along_axis(queries @ vectors.T, expected, axis=1), rtol=1e-5)
+
+
+def test_numpy_flat_index_k_larger_than_corpus():
+    index = NumpyFlatIndex(_normalized(3, 8))
+    distances, ids = index.search(_normalized(2, 8, seed=3), 10)
+    assert distances.shape == (2, 3)
+    assert sorted(ids[0].tolist()) == [0, 1, 2]
+
+
+def test_load_index_mmap_uses_numpy_layout(tmp_path):
+    index_path = tmp_path / "examples.index"
+    np.save(vectors_path(index_path), _normalized(10, 8))
+
+    mapped = load_index(index_path, mode="mmap")
+    eager = load_index(index_path, mode="eager")
+
+    assert isinstance(mapped.vectors, np.memmap)
+    assert not isinstance(eager.vectors, np.memmap)
+    assert mapped.ntotal == eager.ntotal == 10
+
+
+def test_load_index_missing(tmp_path):
+    with pytest.raises(FileNotFoundError):
+        load_index(tmp_path / "examples.index", mode="mmap")
+
+
+def test_index_factory_string_caps_nlist_to_corpus():
+    assert index_factory_string("flat", 10) == "Flat"
+    assert index_factory_string("hnsw", 10, hnsw_m=16) == "HNSW16,Flat"
+    assert index_factory_string("ivf-flat", 390, nlist=1024) == "IVF10,Flat"
+    with pytest.raises(ValueError):
+        index_factory_string("ivf-pq", 1000, pq_bits=8)
+    with pytest.raises(ValueError):
+        index_factory_string("lsh", 1000)
+
+
+def test_ann_index_search_params_tunable():
+    faiss = pytest.importorskip("faiss")
+    vectors = _normalized(2000, 16)
+    index = create_faiss_index(vectors, "ivf-flat", nlist=16)
+
+    apply_search_params(index, nprobe=16)
+    assert faiss.extract_index_ivf(index).nprobe == 16
+    _, ids = index.search(vectors[:5], 1)
+    assert ids[:, 0].tolist() == [0, 1, 2, 3, 4]
+
+    hnsw = create_faiss_index(vectors, "hnsw", hnsw_m=8)
+    apply_search_params(hnsw, ef_search=40)
+    assert hnsw.hnsw.efSearch == 40
+
+
+def test_numpy_blocked_search_matches_single_block():
+    vectors = _normalized(1000, 16)
+    queries = _normalized(7, 16, seed=2)
+
+    whole = NumpyFlatIndex(vectors, block_rows=10_000).search(queries, 5)
+    blocked = NumpyFlatIndex(vectors, block_rows=64).search(queries, 5)
+
+    np.testing.assert_array_equal(whole[1], blocked[1])
+    np.testing.assert_allclose(whole[0], blocked[0], rtol=1e-6)
+
+
+def test_numpy_float16_storage_keeps_neighbours():
+    vectors = _normalized(500, 32)
+    queries = vectors[:10]
+
+    distances, ids = NumpyFlatIndex(vectors.astype(np.float16), block_rows=128).search(queries, 1)
+
+    assert ids[:, 0].tolist() == list(range(10))
+    np.testing.assert_allclose(distances[:, 0], 1.0, atol=1e-2)
+
+
+def test_load_index_without_faiss_uses_numpy_layout(tmp_path, monkeypatch):
+    index_path = tmp_path / "examples.index"
+    index_path.write_bytes(b"faiss index bytes")
+    np.save(vectors_path(index_path), _normalized(10, 8).astype(np.float16))
+    monkeypatch.setattr(index_store, "_faiss_available", lambda: False)
+
+    index = load_index(index_path, mode="mmap")
+
+    assert isinstance(index, NumpyFlatIndex)
+    assert index.vectors.dtype == np.float16
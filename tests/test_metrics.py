@@ -26,3 +26,42 @@ def test_metrics_returns_prometheus_format():
     assert "# HELP score_latency_seconds" in text
     assert "verification_failures_total" in text
     assert "sharecard_errors_total" in text
+    assert "score_coalesce_queue_depth" in text
+    assert "embed_cache_misses_total" in text
+    assert "score_index_reloads_total" in text
+    assert "score_result_cache_hits_total" in text
+    assert "score_near_duplicate_total" in text
+    assert "sharecard_cache_hit_ratio" in text
+    assert "sharecard_cache_bytes_served_total" in text
+
+
+def test_score_stage_and_fallback_metrics(monkeypatch):
+    import numpy as np
+    from prometheus_client import REGISTRY
+
+    from server import score as score_module
+
+    class OneVectorIndex:
+        ntotal = 1
+
+        def search(self, vecs, k):
+            return np.zeros((len(vecs), k), dtype=np.float32), np.zeros((len(vecs), k), dtype=np.int64)
+
+    def sample(name, **labels):
+        return REGISTRY.get_sample_value(name, labels) or 0.0
+
+    monkeypatch.setattr(score_module, "get_index_state", lambda: score_module.IndexState(OneVectorIndex()))
+    monkeypatch.setattr(score_module, "_embed", lambda texts: [None] * len(texts))
+    before_fallback = sample("score_fallback_total", reason="encode_failure")
+    before_parse = sample("score_stage_seconds_count", stage="parse")
+    before_serialize = sample("score_stage_seconds_count", stage="serialize")
+    before_batches = sample("score_batch_size_count")
+
+    response = client.post("/score", json={"text": "stage metrics"})
+
+    assert response.status_code == 200
+    assert "empty_index_fallback" in response.json()["explanations"]
+    assert sample("score_fallback_total", reason="encode_failure") == before_fallback + 1
+    assert sample("score_stage_seconds_count", stage="parse") == before_parse + 1
+    assert sample("score_stage_seconds_count", stage="serialize") == before_serialize + 1
+    assert sample("score_batch_size_count") == before_batches + 1
@@ -0,0 +1,103 @@
+import sys
+from pathlib import Path
+
+import orjson
+import pytest
+from fastapi.testclient import TestClient
+from PIL import Image
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from server import app as app_module  # noqa: E402
+from server import og_prerender  # noqa: E402
+from server.executor import BoundedExecutor  # noqa: E402
+from server.sharecard import render_key  # noqa: E402
+from server.sharecard_cache import SharecardCache  # noqa: E402
+
+
+@pytest.fixture(autouse=True)
+def manifest_path(tmp_path, monkeypatch):
+    path = tmp_path / "og_manifest.json"
+    monkeypatch.setattr(og_prerender, "MANIFEST_PATH", path)
+    return path
+
+
+def _write(directory, capsule_id, capsule):
+    directory.mkdir(parents=True, exist_ok=True)
+    (directory / f"{capsule_id}.json").write_bytes(orjson.dumps(capsule))
+
+
+def test_prerender_writes_variants_and_skips_unchanged(tmp_path):
+    capsules, output = tmp_path / "capsules", tmp_path / "og"
+    _write(capsules, "alpha", {"title": "火种 Alpha", "explanations": ["first insight"], "uniqueness": 87})
+    _write(capsules, "beta", {"title": "Beta"})
+
+    first = og_prerender.prerender(capsules, output, "https://fireseed.example", workers=0)
+
+    assert first == {"rendered": 2, "skipped": 0, "removed": 0, "failed": 0}
+    manifest = og_prerender.read_manifest()
+    for suffix, size, _ in og_prerender.variants():
+        with Image.open(output / f"alpha{suffix}") as img:
+            assert img.size == size
+        assert f"alpha{suffix}" in manifest["alpha"]
+
+    _write(capsules, "beta", {"title": "Beta, edited"})
+    (capsules / "alpha.json").unlink()
+    second = og_prerender.prerender(capsules, output, "https://fireseed.example", workers=0)
+
+    assert second == {"rendered": 1, "skipped": 0, "removed": 1, "failed": 0}
+    assert not (output / "alpha.png").exists()
+    assert not (output / "manifest.json").exists()
+    assert og_prerender.prerender(capsules, output, "https://fireseed.example", workers=0)["skipped"] == 1
+
+
+def test_prerender_in_worker_processes(tmp_path):
+    capsules, output = tmp_path / "capsules", tmp_path / "og"
+    _write(capsules, "gamma", {"title": "Gamma"})
+    summary = og_prerender.prerender(capsules, output, "https://fireseed.example", workers=1)
+    assert summary["rendered"] == 1
+    assert (output / "gamma.png").exists()
+
+
+def test_prerendered_png_matches_sharecard_endpoint(tmp_path, monkeypatch):
+    monkeypatch.setattr(app_module, "get_sharecard_cache", lambda: SharecardCache(2**20))
+    executor = BoundedExecutor("thread", workers=1, max_inflight=2)
+    monkeypatch.setattr(app_module, "get_sharecard_executor", lambda: executor)
+    capsules, output = tmp_path / "capsules", tmp_path / "og"
+    _write(capsules, "delta", {"title": "Delta", "description": "A capsule", "score": 42})
+    og_prerender.prerender(capsules, output, "https://fireseed.example", workers=0)
+
+    card = og_prerender.capsule_card("delta", {"title": "Delta", "description": "A capsule", "score": 42}, "https://fireseed.example")
+    response = TestClient(app_module.app).post("/sharecard", json={**card, "format": "png"})
+
+    assert response.status_code == 200
+    assert response.content == (output / "delta.png").read_bytes()
+    etag = response.headers["ETag"].strip('"')
+    assert og_prerender.read_manifest()["delta"]["delta.png"] == render_key(etag)
+
+
+def test_prerender_runs_in_one_process_at_a_time(tmp_path, manifest_path):
+    capsules, output = tmp_path / "capsules", tmp_path / "og"
+    _write(capsules, "eta", {"title": "Eta"})
+    argv = ["--capsules-dir", str(capsules), "--output-dir", str(output), "--base-url", "https://fireseed.example", "--workers", "0"]
+
+    with og_prerender._open_lock(manifest_path) as handle:
+        assert og_prerender._try_lock(handle)
+        with pytest.raises(SystemExit) as excinfo:
+            og_prerender.main(argv)
+    assert excinfo.value.code == 1
+    assert not (output / "eta.png").exists()
+
+    og_prerender.main(argv)
+    assert (output / "eta.png").exists()
+
+
+def test_prerender_requires_base_url(tmp_path, monkeypatch):
+    with pytest.raises(RuntimeError, match="OG_BASE_URL"):
+        og_prerender.prerender(tmp_path / "capsules", tmp_path / "og", "", workers=0)
+
+    monkeypatch.setattr(og_prerender, "BASE_URL", "")
+    monkeypatch.setattr(app_module, "OG_PRERENDER_INTERVAL", 60.0)
+    with pytest.raises(RuntimeError, match="OG_BASE_URL"):
+        with TestClient(app_module.app):
+            pass
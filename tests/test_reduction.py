@@ -0,0 +1,131 @@
+import sys
+from pathlib import Path
+
+import numpy as np
+import orjson
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from server import index_build
+from server import score as score_module
+from server.embed_cache import EmbeddingCache, MemoryLRU
+from server.index_store import load_index, vectors_path
+from server.reduction import Projection, projection_path, train_projection
+
+DIM = 32
+BASIS = np.random.default_rng(0).standard_normal((6, DIM))
+
+
+def _low_rank(rows, seed=0):
+    rng = np.random.default_rng(seed)
+    vectors = rng.standard_normal((rows, BASIS.shape[0])) @ BASIS + 0.01 * rng.standard_normal((rows, DIM))
+    return (vectors / np.linalg.norm(vectors, axis=1, keepdims=True)).astype(np.float32)
+
+
+class TopicModel:
+    def encode(self, texts, **kwargs):
+        return np.stack([_low_rank(1, seed=int(text.split()[-1]))[0] for text in texts])
+
+
+def test_projection_shapes_and_round_trip(tmp_path):
+    vectors = _low_rank(200)
+    for method in ("pca", "random"):
+        projection = train_projection(vectors, method, 8)
+        assert (projection.input_dim, projection.output_dim) == (DIM, 8)
+        assert projection.apply(vectors).shape == (200, 8)
+        projection.save(tmp_path / f"{method}.npz")
+        loaded = Projection.load(tmp_path / f"{method}.npz")
+        assert loaded.method == method
+        np.testing.assert_array_equal(loaded.matrix, projection.matrix)
+    assert Projection.load(tmp_path / "missing.npz") is None
+
+
+def test_pca_preserves_inner_products_of_low_rank_vectors():
+    vectors = _low_rank(300)
+    projected = train_projection(vectors, "pca", 8).apply(vectors)
+    np.testing.assert_allclose(projected[:20] @ projected.T, vectors[:20] @ vectors.T, atol=0.02)
+
+
+def test_train_projection_rejects_bad_arguments():
+    with pytest.raises(ValueError):
+        train_projection(_low_rank(50), "svd", 8)
+    with pytest.raises(ValueError):
+        train_projection(_low_rank(50), "pca", DIM)
+
+
+def test_reduced_build_scores_like_full_build(tmp_path, monkeypatch):
+    model = TopicModel()
+    monkeypatch.setattr(score_module, "get_model", lambda: model)
+    monkeypatch.setattr(score_module, "_RESULT_CACHE", MemoryLRU(16))
+    monkeypatch.setattr(score_module, "NEAR_DUP_ENABLED", False)
+    capsules = tmp_path / "capsules"
+    capsules.mkdir()
+    for i in range(40):
+        (capsules / f"{i:03d}.json").write_bytes(orjson.dumps({"title": f"capsule {i}"}))
+
+    scores = {}
+    for name, reduce in (("full", None), ("pca", "pca")):
+        index_path = tmp_path / name / "examples.index"
+        index_build.build(capsules, index_path, reduce=reduce, reduce_dim=8)
+        monkeypatch.setattr(score_module, "_index_path", lambda: index_path)
+        monkeypatch.setattr(score_module, "_INDEX_STATE", score_module.IndexState())
+        monkeypatch.setattr(score_module, "_FAILED_SIGNATURE", score_module._UNLOADED)
+        cache = EmbeddingCache(memory_size=16)
+        monkeypatch.setattr(score_module, "get_embedding_cache", lambda model_id: cache)
+        assert score_module.reload_index() is True
+        scores[name] = [score for score, _ in score_module.compute_uniqueness_batch([f"query {i}" for i in range(100, 110)])]
+
+    assert load_index(tmp_path / "pca" / "examples.index").d == 8
+    assert not projection_path(tmp_path / "full" / "examples.index").exists()
+    assert max(abs(a - b) for a, b in zip(scores["full"], scores["pca"])) <= 2
+
+
+def test_append_reuses_existing_projection(tmp_path, monkeypatch):
+    monkeypatch.setattr(score_module, "get_model", lambda: TopicModel())
+    capsules = tmp_path / "capsules"
+    capsules.mkdir()
+    for i in range(20):
+        (capsules / f"{i:03d}.json").write_bytes(orjson.dumps({"title": f"capsule {i}"}))
+    index_path = tmp_path / "examples.index"
+    index_build.build(capsules, index_path, reduce="random", reduce_dim=8)
+    before = Projection.load(projection_path(index_path))
+
+    (capsules / "020.json").write_bytes(orjson.dumps({"title": "capsule 20"}))
+    index_build.build(capsules, index_path, append=True)
+
+    after = Projection.load(projection_path(index_path))
+    np.testing.assert_array_equal(after.matrix, before.matrix)
+    added = np.load(vectors_path(index_path))[-1]
+    np.testing.assert_allclose(added, before.apply(TopicModel().encode(["capsule 20"]))[0], rtol=1e-5)
+
+
+def test_reload_waits_for_a_consistent_version(tmp_path, monkeypatch):
+    index_path = tmp_path / "examples.index"
+    monkeypatch.setattr(score_module, "_index_path", lambda: index_path)
+    monkeypatch.setattr(score_module, "_INDEX_STATE", score_module.IndexState())
+    monkeypatch.setattr(score_module, "_FAILED_SIGNATURE", score_module._UNLOADED)
+    vectors = _low_rank(40)
+    ids = [str(i) for i in range(40)]
+
+    def write(dim, seed):
+        projection = train_projection(vectors, "random", dim, seed=seed)
+        return index_build.write_index(index_path, ids, projection.apply(vectors), projection=projection)
+
+    first = write(8, 0)
+    assert score_module.reload_index() is True
+    # 构建中途替换了投影，但版本文件未变：不触发重新加载
+    train_projection(vectors, "random", 6, seed=1).save(projection_path(index_path))
+    assert score_module.reload_index() is False
+
+    # 新版本写完后又被下一次构建改动：文件与版本记录不符，保持旧版本
+    second = write(6, 2)
+    train_projection(vectors, "random", 6, seed=3).save(projection_path(index_path))
+    assert score_module.reload_index() is False
+    assert score_module.get_index_version() == first
+
+    third = write(6, 4)
+    assert third != second
+    assert score_module.reload_index() is True
+    assert score_module.get_index_version() == third
+    assert score_module._INDEX_STATE.projection.output_dim == score_module._INDEX_STATE[0].d == 6
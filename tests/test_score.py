@@ -1,17 +1,35 @@
 import sys
+import time
 from pathlib import Path
 
 import numpy as np
+import pytest
 from fastapi.testclient import TestClient
 
 sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
 
 from server import app as app_module
+from server import executor as executor_module
 from server import score as score_module
+from server.embed_cache import EmbeddingCache, MemoryLRU
 
 DIM = 384
 
 
+@pytest.fixture(autouse=True)
+def fresh_embedding_cache(monkeypatch):
+    cache = EmbeddingCache(memory_size=128)
+    monkeypatch.setattr(score_module, "get_embedding_cache", lambda model_id: cache)
+    return cache
+
+
+@pytest.fixture(autouse=True)
+def fresh_result_cache(monkeypatch):
+    cache = MemoryLRU(128)
+    monkeypatch.setattr(score_module, "_RESULT_CACHE", cache)
+    return cache
+
+
 class FakeModel:
     def encode(self, texts, **kwargs):
         return np.zeros((len(texts), DIM), dtype=np.float32)
@@ -43,3 +61,336 @@ def test_score_endpoint_with_empty_index(monkeypatch):
     assert "normalized_cosine" in payload["explanations"]
     assert payload["uniqueness"] == 100
     assert "empty_index_fallback" in payload["explanations"]
+
+
+class CountingModel:
+    def __init__(self):
+        self.calls = []
+
+    def encode(self, texts, **kwargs):
+        self.calls.append(list(texts))
+        vectors = np.zeros((len(texts), DIM), dtype=np.float32)
+        for row, text in enumerate(texts):
+            vectors[row, 0] = min(len(text), 10) / 10.0
+        return vectors
+
+
+class FirstColumnIndex:
+    ntotal = 3
+
+    def __init__(self):
+        self.calls = 0
+
+    def search(self, vecs, k):
+        self.calls += 1
+        batch = vecs.shape[0]
+        distances = np.repeat(vecs[:, :1], k, axis=1)
+        return distances.astype(np.float32), np.zeros((batch, k), dtype=np.int64)
+
+
+def test_compute_uniqueness_batch_single_encode_and_search(monkeypatch):
+    model = CountingModel()
+    index = FirstColumnIndex()
+    monkeypatch.setattr(score_module, "get_model", lambda: model)
+    monkeypatch.setattr(score_module, "get_index_state", lambda: score_module.IndexState(index))
+
+    texts = ["a" * 10, "a", "a" * 5]
+    results = score_module.compute_uniqueness_batch(texts)
+
+    assert len(model.calls) == 1
+    assert model.calls[0] == sorted(texts, key=len)
+    assert index.calls == 1
+    assert [uniqueness for uniqueness, _ in results] == [0, 90, 50]
+
+
+def test_compute_uniqueness_batch_isolates_encode_failures(monkeypatch):
+    class FlakyModel(CountingModel):
+        def encode(self, texts, **kwargs):
+            if any(text == "boom" for text in texts):
+                raise RuntimeError("bad input")
+            return super().encode(texts, **kwargs)
+
+    monkeypatch.setattr(score_module, "get_model", lambda: FlakyModel())
+    monkeypatch.setattr(score_module, "get_index_state", lambda: score_module.IndexState(FirstColumnIndex()))
+
+    results = score_module.compute_uniqueness_batch(["a" * 5, "boom"])
+
+    assert results[0][0] == 50
+    assert "empty_index_fallback" not in results[0][1]
+    assert results[1][0] == 100
+    assert "empty_index_fallback" in results[1][1]
+
+
+def test_score_batch_endpoint(monkeypatch):
+    monkeypatch.setattr(score_module, "get_model", lambda: CountingModel())
+    monkeypatch.setattr(score_module, "get_index_state", lambda: score_module.IndexState(FirstColumnIndex()))
+
+    client = TestClient(app_module.app)
+    response = client.post("/score/batch", json={"texts": ["a" * 10, "  ", 42, "a"]})
+
+    assert response.status_code == 200
+    results = response.json()["results"]
+    assert results[0]["uniqueness"] == 0
+    assert results[1] == {"error": "text is required"}
+    assert results[2] == {"error": "text is required"}
+    assert results[3]["uniqueness"] == 90
+
+
+def test_score_batch_endpoint_limit(monkeypatch):
+    monkeypatch.setattr(score_module, "BATCH_MAX_ITEMS", 2)
+
+    client = TestClient(app_module.app)
+    response = client.post("/score/batch", json={"texts": ["a", "b", "c"]})
+
+    assert response.status_code == 413
+
+
+def test_score_batch_endpoint_rejects_unbounded_top_k():
+    client = TestClient(app_module.app)
+    response = client.post("/score/batch", json={"texts": ["a"], "top_k": score_module.MAX_TOP_K + 1})
+
+    assert response.status_code == 422
+
+
+def test_score_batch_endpoint_limit_counts_chunks(monkeypatch):
+    monkeypatch.setattr(score_module, "CHUNKING_ENABLED", True)
+    monkeypatch.setattr(score_module, "CHUNK_CHARS", 10)
+    monkeypatch.setattr(score_module, "CHUNK_OVERLAP", 0)
+    monkeypatch.setattr(score_module, "BATCH_MAX_ITEMS", 2)
+
+    client = TestClient(app_module.app)
+    response = client.post("/score/batch", json={"texts": ["a" * 30]})
+
+    assert response.status_code == 413
+
+
+def test_score_endpoint_returns_503_when_saturated(monkeypatch):
+    monkeypatch.setattr(score_module, "get_model", lambda: CountingModel())
+    monkeypatch.setattr(score_module, "get_index_state", lambda: score_module.IndexState(FirstColumnIndex()))
+    executor = executor_module.get_scoring_executor()
+    executor.admit(executor.max_inflight - executor.inflight)
+    try:
+        client = TestClient(app_module.app)
+        response = client.post("/score", json={"text": "hello"})
+        batch = client.post("/score/batch", json={"texts": ["hello"]})
+    finally:
+        executor.release(executor.inflight)
+
+    assert response.status_code == 503
+    assert response.headers["Retry-After"] == str(executor_module.SCORE_RETRY_AFTER_SECONDS)
+    assert batch.status_code == 503
+
+
+def test_repeated_texts_hit_embedding_cache(monkeypatch):
+    model = CountingModel()
+    monkeypatch.setattr(score_module, "get_model", lambda: model)
+    monkeypatch.setattr(score_module, "get_index_state", lambda: score_module.IndexState(FirstColumnIndex()))
+
+    first = score_module.compute_uniqueness_batch(["hello  world"])
+    second = score_module.compute_uniqueness_batch(["hello world", "new text"])
+
+    assert first[0] == second[0]
+    assert model.calls == [["hello  world"], ["new text"]]
+
+
+class FileIndex:
+    def __init__(self, ntotal):
+        self.ntotal = ntotal
+
+    def search(self, vecs, k):
+        batch = vecs.shape[0]
+        return np.zeros((batch, k), dtype=np.float32), np.zeros((batch, k), dtype=np.int64)
+
+
+def _read_file_index(path):
+    return FileIndex(int(path.read_text()))
+
+
+@pytest.fixture()
+def index_file(tmp_path, monkeypatch):
+    path = tmp_path / "examples.index"
+    monkeypatch.setattr(score_module, "_index_path", lambda: path)
+    monkeypatch.setattr(score_module, "_read_index", _read_file_index)
+    monkeypatch.setattr(score_module, "_INDEX_STATE", score_module.IndexState())
+    monkeypatch.setattr(score_module, "_FAILED_SIGNATURE", score_module._UNLOADED)
+    return path
+
+
+def test_index_hot_reload_swaps_on_version_change(index_file):
+    index_file.write_text("3")
+    index_file.with_name("examples.index.version").write_text("v1")
+    assert score_module.reload_index() is True
+    old = score_module._INDEX_STATE[0]
+    assert score_module.get_index_version() == "v1"
+    assert score_module.reload_index() is False
+
+    index_file.write_text("5")
+    index_file.with_name("examples.index.version").write_text("v2")
+    assert score_module.reload_index() is True
+
+    assert score_module.get_index_version() == "v2"
+    assert score_module._INDEX_STATE[0].ntotal == 5
+    assert old.ntotal == 3
+
+
+def test_index_reload_keeps_old_index_on_bad_file(index_file):
+    index_file.write_text("3")
+    score_module.reload_index()
+    version = score_module.get_index_version()
+
+    index_file.write_text("not an index")
+    assert score_module.reload_index() is False
+
+    assert score_module.get_index_version() == version
+    assert score_module._INDEX_STATE[0].ntotal == 3
+
+
+def test_score_response_includes_index_version(monkeypatch):
+    monkeypatch.setattr(score_module, "get_model", lambda: CountingModel())
+    monkeypatch.setattr(score_module, "get_index_state", lambda: score_module.IndexState(FirstColumnIndex(), "v7"))
+    # 打分后热更新到新版本：响应仍应报告实际打分所用的版本
+    monkeypatch.setattr(score_module, "get_index_version", lambda: "v8")
+
+    client = TestClient(app_module.app)
+    response = client.post("/score", json={"text": "hello"})
+    batch = client.post("/score/batch", json={"texts": ["hello"]})
+
+    assert response.status_code == 200
+    assert response.json()["index_version"] == "v7"
+    assert batch.json()["index_version"] == "v7"
+
+
+def test_readyz_reports_warmup(monkeypatch):
+    monkeypatch.setattr(app_module, "SCORE_PRELOAD", True)
+    monkeypatch.setattr(score_module, "_WARM", score_module.threading.Event())
+    monkeypatch.setattr(score_module, "WARMUP_TIMINGS", {})
+    monkeypatch.setattr(score_module, "get_model", lambda: CountingModel())
+    monkeypatch.setattr(score_module, "get_index_state", lambda: score_module.IndexState(FirstColumnIndex()))
+
+    client = TestClient(app_module.app)
+    assert client.get("/healthz").status_code == 200
+    assert client.get("/readyz").status_code == 503
+
+    timings = score_module.warmup()
+
+    assert set(timings) == {"model_load", "index_load", "encode", "search"}
+    ready = client.get("/readyz")
+    assert ready.status_code == 200
+    assert ready.json()["ready"] is True
+    assert set(ready.json()["warmup_ms"]) == set(timings)
+
+
+def test_readyz_ready_without_preload(monkeypatch):
+    monkeypatch.setattr(app_module, "SCORE_PRELOAD", False)
+    monkeypatch.setattr(score_module, "_WARM", score_module.threading.Event())
+
+    response = TestClient(app_module.app).get("/readyz")
+
+    assert response.status_code == 200
+    assert response.json()["ready"] is True
+    assert response.json()["warm"] is False
+
+
+def test_lifespan_preloads_when_enabled(monkeypatch):
+    monkeypatch.setattr(score_module, "_WARM", score_module.threading.Event())
+    monkeypatch.setattr(score_module, "WARMUP_TIMINGS", {})
+    monkeypatch.setattr(score_module, "get_model", lambda: CountingModel())
+    monkeypatch.setattr(score_module, "get_index_state", lambda: score_module.IndexState(FirstColumnIndex()))
+    monkeypatch.setattr(app_module, "SCORE_PRELOAD", True)
+
+    with TestClient(app_module.app) as client:
+        for _ in range(50):
+            if score_module.is_ready():
+                break
+            time.sleep(0.02)
+        assert client.get("/readyz").status_code == 200
+
+
+def test_model_identity_includes_non_default_backend(monkeypatch):
+    monkeypatch.setattr(score_module, "ENCODER_BACKEND", "torch")
+    assert score_module.model_identity() == "bge-small-zh-v1.5"
+    monkeypatch.setattr(score_module, "ENCODER_BACKEND", "int8")
+    assert score_module.model_identity() == "bge-small-zh-v1.5+int8"
+
+
+def test_result_cache_skips_search_until_index_changes(monkeypatch, index_file, fresh_result_cache):
+    index = FirstColumnIndex()
+    monkeypatch.setattr(score_module, "get_model", lambda: CountingModel())
+    monkeypatch.setattr(score_module, "get_index_state", lambda: score_module.IndexState(index))
+
+    first = score_module.compute_uniqueness_batch(["hello  world"])
+    second = score_module.compute_uniqueness_batch(["hello world"])
+    assert first == second
+    assert index.calls == 1
+
+    index_file.write_text("3")
+    score_module.reload_index()
+    assert len(fresh_result_cache._data) == 0
+    score_module.compute_uniqueness_batch(["hello world"])
+    assert index.calls == 2
+
+
+def test_score_etag_revalidation(monkeypatch):
+    monkeypatch.setattr(score_module, "get_model", lambda: CountingModel())
+    monkeypatch.setattr(score_module, "get_index_state", lambda: score_module.IndexState(FirstColumnIndex()))
+
+    client = TestClient(app_module.app)
+    first = client.post("/score", json={"text": "hello"})
+    etag = first.headers["ETag"]
+    assert etag.startswith('"') and not etag.startswith('W/')
+
+    cached = client.post("/score", json={"text": "hello"}, headers={"If-None-Match": etag})
+    assert cached.status_code == 304
+    assert cached.headers["ETag"] == etag
+
+    other = client.post("/score", json={"text": "another text"}, headers={"If-None-Match": etag})
+    assert other.status_code == 200
+    assert other.headers["ETag"] != etag
+
+
+def test_split_chunks_overlaps_and_caps(monkeypatch):
+    monkeypatch.setattr(score_module, "CHUNK_CHARS", 10)
+    monkeypatch.setattr(score_module, "CHUNK_OVERLAP", 4)
+    monkeypatch.setattr(score_module, "MAX_CHUNKS", 3)
+    text = "".join(chr(ord("a") + i) for i in range(22))
+    # 默认关闭：分数与未分块时一致
+    assert score_module.split_chunks(text) == [text]
+
+    monkeypatch.setattr(score_module, "CHUNKING_ENABLED", True)
+    assert score_module.split_chunks("short") == ["short"]
+    chunks = score_module.split_chunks(text)
+    assert chunks == [text[0:10], text[6:16], text[12:22]]
+
+    long_text = "x" * 100
+    capped = score_module.split_chunks(long_text + "end")
+    assert len(capped) == 3
+    assert capped[-1].endswith("end")
+
+
+class XFractionModel(CountingModel):
+    def encode(self, texts, **kwargs):
+        self.calls.append(list(texts))
+        vectors = np.zeros((len(texts), DIM), dtype=np.float32)
+        for row, text in enumerate(texts):
+            vectors[row, 0] = text.count("x") / len(text)
+        return vectors
+
+
+@pytest.mark.parametrize("aggregate, expected", [("mean", 50), ("max", 100)])
+def test_long_text_scored_by_chunks(monkeypatch, aggregate, expected):
+    model = XFractionModel()
+    index = FirstColumnIndex()
+    monkeypatch.setattr(score_module, "get_model", lambda: model)
+    monkeypatch.setattr(score_module, "get_index_state", lambda: score_module.IndexState(index))
+    monkeypatch.setattr(score_module, "CHUNKING_ENABLED", True)
+    monkeypatch.setattr(score_module, "CHUNK_CHARS", 10)
+    monkeypatch.setattr(score_module, "CHUNK_OVERLAP", 0)
+    monkeypatch.setattr(score_module, "CHUNK_AGGREGATE", aggregate)
+
+    long_result, short_result = score_module.compute_uniqueness_batch(["x" * 10 + "y" * 10, "xy"])
+
+    assert len(model.calls) == 1
+    assert sorted(model.calls[0]) == sorted(["x" * 10, "y" * 10, "xy"])
+    assert index.calls == 1
+    assert long_result == (expected, ["topk_mean", "normalized_cosine", "chunked"])
+    assert short_result == (50, ["topk_mean", "normalized_cosine"])
@@ -0,0 +1,100 @@
+import sys
+from pathlib import Path
+
+import numpy as np
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from server import index_build, shards
+from server.index_store import NumpyFlatIndex, load_index, vectors_path
+from server.shards import ShardedIndex, merge_topk, start_local_shards
+
+
+def _normalized(rows, dim, seed):
+    data = np.random.default_rng(seed).standard_normal((rows, dim)).astype(np.float32)
+    return data / np.linalg.norm(data, axis=1, keepdims=True)
+
+
+def test_merge_topk_matches_global_search():
+    vectors = _normalized(50, 8, 0)
+    queries = _normalized(4, 8, 1)
+    parts = []
+    for offset in (0, 20, 35):
+        end = {0: 20, 20: 35, 35: 50}[offset]
+        d, i = NumpyFlatIndex(vectors[offset:end]).search(queries, 5)
+        parts.append((d, i + offset))
+
+    distances, ids = merge_topk([d for d, _ in parts], [i for _, i in parts], 5)
+    expected_d, expected_i = NumpyFlatIndex(vectors).search(queries, 5)
+
+    np.testing.assert_array_equal(ids, expected_i)
+    np.testing.assert_allclose(distances, expected_d, rtol=1e-6)
+
+
+def test_merge_topk_ignores_padding():
+    distances, ids = merge_topk(
+        [np.array([[0.9, -3e38]], dtype=np.float32), np.array([[0.5, 0.4]], dtype=np.float32)],
+        [np.array([[0, -1]]), np.array([[7, 8]])],
+        3,
+    )
+    assert ids.tolist() == [[0, 7, 8]]
+
+
+@pytest.fixture
+def shard_processes():
+    procs = []
+    yield procs
+    for proc in procs:
+        proc.terminate()
+        proc.join(5)
+
+
+def test_sharded_index_scatter_gather(tmp_path, shard_processes):
+    index_path = tmp_path / "examples.index"
+    vectors = _normalized(60, 8, 2)
+    ids = [f"c{n}" for n in range(60)]
+    index_build.write_index(index_path, ids, vectors, shards=3)
+    assert not vectors_path(index_path).exists()
+    shard_processes.extend(start_local_shards(index_path))
+
+    index = load_index(index_path)
+    assert isinstance(index, ShardedIndex)
+    assert index.ntotal == 60
+    queries = _normalized(3, 8, 3)
+    distances, found = index.search(queries, 5)
+    expected_d, expected_i = NumpyFlatIndex(vectors).search(queries, 5)
+    np.testing.assert_array_equal(found, expected_i)
+    np.testing.assert_allclose(distances, expected_d, rtol=1e-5)
+
+    # 重建后，分片进程在收到新版本的请求时自动重新加载
+    rebuilt = _normalized(60, 8, 4)
+    index_build.write_index(index_path, ids, rebuilt, shards=3)
+    _, found = load_index(index_path).search(queries, 5)
+    np.testing.assert_array_equal(found, NumpyFlatIndex(rebuilt).search(queries, 5)[1])
+
+
+def test_wire_format_roundtrip_without_pickle():
+    queries = _normalized(3, 8, 5)
+    version, decoded, k = shards.decode_request(shards.encode_request("v1", queries, 4))
+    assert (version, k) == ("v1", 4)
+    np.testing.assert_array_equal(decoded, queries)
+
+    distances = np.arange(12, dtype=np.float32).reshape(3, 4)
+    ids = np.arange(12, dtype=np.int64).reshape(3, 4) - 1
+    got_d, got_i = shards.decode_result(shards.encode_result(distances, ids))
+    np.testing.assert_array_equal(got_d, distances)
+    np.testing.assert_array_equal(got_i, ids)
+    with pytest.raises(RuntimeError, match="boom"):
+        shards.decode_result(shards.encode_error("boom"))
+    with pytest.raises(ValueError):
+        shards.decode_request(shards.encode_request("v1", queries, 4)[:-1])
+
+
+def test_tcp_shards_require_authkey(monkeypatch):
+    monkeypatch.setattr(shards, "AUTHKEY", b"")
+    assert shards.authkey_for("/tmp/shard-000.sock") is None
+    with pytest.raises(RuntimeError, match="INDEX_SHARD_AUTHKEY"):
+        shards.authkey_for(("10.0.0.2", 7000))
+    monkeypatch.setattr(shards, "AUTHKEY", b"secret")
+    assert shards.authkey_for(("10.0.0.2", 7000)) == b"secret"
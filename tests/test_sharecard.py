@@ -1,13 +1,20 @@
+import asyncio
 import sys
+from collections import deque
 from io import BytesIO
 from pathlib import Path
 
+import pytest
 from fastapi.testclient import TestClient
 from PIL import Image, features
 
 sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
 
 from server import app as app_module  # noqa: E402
+from server import limiter as limiter_module  # noqa: E402
+from server.executor import BoundedExecutor  # noqa: E402
+from server.sharecard import canonical_query, render_encoded, sharecard_query  # noqa: E402
+from server.sharecard_cache import SharecardCache  # noqa: E402
 
 OG = (1200, 630)
 ICON = (512, 512)
@@ -21,6 +28,29 @@ payload = {
 }
 
 
+@pytest.fixture(autouse=True)
+def memory_only_cache(monkeypatch):
+    cache = SharecardCache(memory_bytes=8 * 2**20)
+    monkeypatch.setattr(app_module, "get_sharecard_cache", lambda: cache)
+    return cache
+
+
+@pytest.fixture(autouse=True)
+def render_executor(monkeypatch):
+    # 线程池：让 monkeypatch 在渲染时同样生效
+    executor = BoundedExecutor("thread", workers=1, max_inflight=4)
+    monkeypatch.setattr(app_module, "get_sharecard_executor", lambda: executor)
+    yield executor
+    executor.shutdown()
+
+
+@pytest.fixture(autouse=True)
+def fresh_spike_window(monkeypatch):
+    # 渲染压高 CPU 时尖峰检测会按整套测试的请求数限流
+    monkeypatch.setattr(limiter_module, "_REQUEST_TIMESTAMPS", deque())
+    monkeypatch.setattr(limiter_module, "_SPIKE_UNTIL", 0.0)
+
+
 def _open_image(content: bytes) -> Image.Image:
     return Image.open(BytesIO(content))
 
@@ -86,3 +116,105 @@ def test_sharecard_qr_presence():
         width, height = img.size
         crop = img.crop((int(width * 0.75), int(height * 0.75), width, height))
         assert crop.getcolors(maxcolors=1_000_000) is not None
+
+
+def test_sharecard_get_matches_post():
+    client = TestClient(app_module.app)
+    headers = {"Accept": "image/webp,image/*;q=0.8"}
+    posted = client.post("/sharecard", json=payload, headers=headers)
+    fetched = client.get(f"/sharecard?{canonical_query(payload)}", headers=headers)
+    assert fetched.status_code == 200
+    assert fetched.headers["Vary"] == "Accept"
+    assert fetched.headers["Cache-Control"] == "public, max-age=31536000, immutable"
+    assert fetched.headers["ETag"] == posted.headers["ETag"]
+    assert fetched.content == posted.content
+    again = client.get(f"/sharecard?{canonical_query(payload)}", headers={**headers, "If-None-Match": fetched.headers["ETag"]})
+    assert again.status_code == 304
+    assert again.headers["Vary"] == "Accept"
+
+
+def test_sharecard_get_redirects_to_canonical_query():
+    client = TestClient(app_module.app)
+    response = client.get(
+        "/sharecard",
+        params={"url": payload["url"], "title": f" {payload['title']} ", "ari": "62.0", "size": "1200X630"},
+        follow_redirects=False,
+    )
+    assert response.status_code == 301
+    expected = canonical_query({"title": payload["title"], "url": payload["url"], "ari": 62})
+    assert response.headers["Location"] == f"/sharecard?{expected}"
+    assert client.get(response.headers["Location"]).status_code == 200
+
+
+def test_sharecard_get_format_case_has_one_canonical_url(monkeypatch):
+    monkeypatch.setattr(app_module, "SHARECARD_HMAC_KEY", "secret")
+    client = TestClient(app_module.app)
+    assert sharecard_query({**payload, "format": "PNG"}, "secret") == sharecard_query({**payload, "format": "png"}, "secret")
+    signed = sharecard_query({**payload, "format": "png"}, "secret")
+    response = client.get(f"/sharecard?{signed.replace('format=png', 'format=PNG')}", follow_redirects=False)
+    assert response.status_code == 301
+    assert response.headers["Location"] == f"/sharecard?{signed}"
+    response = client.get(f"/sharecard?{sharecard_query({**payload, 'format': ' PNG '}, 'secret')}")
+    assert response.status_code == 200
+    assert response.headers["Content-Type"] == "image/png"
+
+
+def test_sharecard_get_rejects_invalid_query():
+    client = TestClient(app_module.app)
+    query = canonical_query(payload)
+    assert client.get(f"/sharecard?{query}&foo=1").status_code == 400
+    assert client.get(f"/sharecard?{query}&title=again").status_code == 400
+    assert client.get(f"/sharecard?{canonical_query({**payload, 'ari': 'nan'})}").status_code == 400
+    assert client.get(f"/sharecard?{canonical_query({**payload, 'ari': 101})}").status_code == 400
+
+
+def test_sharecard_get_requires_signature(monkeypatch):
+    monkeypatch.setattr(app_module, "SHARECARD_HMAC_KEY", "secret")
+    client = TestClient(app_module.app)
+    signed = sharecard_query(payload, "secret")
+    assert client.get(f"/sharecard?{signed}").status_code == 200
+    assert client.get(f"/sharecard?{canonical_query(payload)}").status_code == 403
+    forged = sharecard_query({**payload, "title": "forged"}, "other")
+    assert client.get(f"/sharecard?{forged}").status_code == 403
+
+
+def test_sharecard_busy_when_render_pool_full(render_executor):
+    client = TestClient(app_module.app)
+    render_executor.admit(render_executor.max_inflight)
+    try:
+        response = client.post("/sharecard", json=payload)
+    finally:
+        render_executor.release(render_executor.max_inflight)
+    assert response.status_code == 503
+    assert response.json() == {"detail": "sharecard_busy"}
+    assert response.headers["Retry-After"] == str(app_module.SHARECARD_RETRY_AFTER_SECONDS)
+
+
+def test_render_encoded_runs_in_process_pool():
+    executor = BoundedExecutor("process", workers=1, max_inflight=1)
+    try:
+        content, timings = asyncio.run(executor.submit(render_encoded, payload, OG, "PNG"))
+    finally:
+        executor.shutdown()
+    assert set(timings) == {"layout", "qr", "encode"}
+    with _open_image(content) as img:
+        assert img.size == OG
+
+
+def test_cached_qr_matches_qrcode_rendering():
+    import numpy as np
+    import qrcode
+    from qrcode.constants import ERROR_CORRECT_H
+
+    from server import sharecard
+
+    card = sharecard.render_sharecard(payload, OG)
+    qr = qrcode.QRCode(error_correction=ERROR_CORRECT_H, border=4, box_size=6)
+    qr.add_data(payload["url"])
+    qr.make(fit=True)
+    expected = qr.make_image(fill_color="black", back_color="white").convert("RGB")
+    margin = int(round(min(OG) * 0.08))
+    x, y = OG[0] - margin - expected.width, OG[1] - margin - expected.height
+    region = card.crop((x, y, x + expected.width, y + expected.height))
+    assert np.array_equal(np.asarray(region), np.asarray(expected))
+    assert sharecard.qr_matrix(payload["url"]) is sharecard.qr_matrix(payload["url"])
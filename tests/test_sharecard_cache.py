@@ -0,0 +1,69 @@
+import os
+import sys
+from pathlib import Path
+
+from fastapi.testclient import TestClient
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from server import app as app_module  # noqa: E402
+from server.executor import BoundedExecutor  # noqa: E402
+from server.sharecard_cache import ByteLRU, DiskImageStore, SharecardCache  # noqa: E402
+
+payload = {"title": "火种 Fireseed", "url": "https://example.com/capsule/7", "format": "png"}
+
+
+def test_byte_lru_evicts_by_total_size():
+    lru = ByteLRU(10)
+    lru.put("a", b"1234")
+    lru.put("b", b"1234")
+    lru.get("a")
+    lru.put("c", b"1234")
+    assert lru.get("b") is None
+    assert lru.get("a") == b"1234"
+    assert lru.size == 8
+    lru.put("huge", b"x" * 11)
+    assert lru.get("huge") is None
+
+
+def test_disk_store_evicts_least_recently_used(tmp_path):
+    store = DiskImageStore(tmp_path, capacity_bytes=30)
+    for i, key in enumerate(["a", "b", "c"]):
+        store.put(key, b"x" * 10)
+        os.utime(tmp_path / key, (1000 + i, 1000 + i))
+    os.utime(tmp_path / "a", (2000, 2000))
+    store.put("d", b"x" * 10)
+
+    assert store.get("b") is None
+    assert store.get("a") == b"x" * 10
+    assert store.get("d") == b"x" * 10
+    assert DiskImageStore(tmp_path, capacity_bytes=30).size == store.size == 20
+
+
+def test_cache_promotes_disk_hits(tmp_path):
+    DiskImageStore(tmp_path, 1000).put("card", b"png")
+    cache = SharecardCache(1000, DiskImageStore(tmp_path, 1000))
+    assert cache.get("card") == ("disk", b"png")
+    assert cache.get("card") == ("memory", b"png")
+    assert cache.get("other") is None
+
+
+def test_sharecard_served_from_cache_without_rendering(tmp_path, monkeypatch):
+    cache = SharecardCache(2**20, DiskImageStore(tmp_path, 2**20))
+    monkeypatch.setattr(app_module, "get_sharecard_cache", lambda: cache)
+    executor = BoundedExecutor("thread", workers=1, max_inflight=2)
+    monkeypatch.setattr(app_module, "get_sharecard_executor", lambda: executor)
+    client = TestClient(app_module.app)
+    first = client.post("/sharecard", json=payload)
+    assert first.status_code == 200
+
+    def fail(*args, **kwargs):
+        raise AssertionError("rendered a cached card")
+
+    monkeypatch.setattr(app_module, "render_encoded", fail)
+    second = client.post("/sharecard", json=payload)
+
+    assert second.status_code == 200
+    assert second.content == first.content
+    assert second.headers["ETag"] == first.headers["ETag"]
+    assert second.headers["Content-Type"] == "image/png"
@@ -0,0 +1,74 @@
+import sys
+from functools import lru_cache
+from pathlib import Path
+
+import pytest
+from PIL import Image, ImageDraw, ImageFont
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from server import sharecard  # noqa: E402
+
+TITLES = [
+    "火种 Fireseed：系统外者",
+    "在无人注视的角落里，一粒火种如何跨越三个世纪的沉默，把尚未被命名的记忆交给下一位守夜人" * 2,
+    "A very long English capsule title that certainly cannot fit on a single sharecard line at any size",
+    "混合 mixed 文本 with     extra   spaces and 标点，符号！",
+    "短",
+    "x" * 300,
+]
+SUBTITLES = ["", "Uniq 87 · ARI 62", "副标题：" + "很长的副标题" * 20]
+SCORES = [(None, None), (87, 62), (100, None)]
+
+
+class ReferenceLayout:
+    """The original per-render binary searches, measured on the card's own draw mode."""
+
+    def __init__(self):
+        self.draw = ImageDraw.Draw(Image.new("RGB", (1, 1)))
+
+    def measure(self, text, pt):
+        return sharecard._measure(self.draw, text, sharecard.get_font(pt))
+
+    def fit_font_size(self, text, max_width, max_height, max_pt, min_pt=10):
+        return sharecard._fit_font_size(self.draw, text, max_width, max_height, max_pt, min_pt)
+
+    def truncate(self, text, pt, max_width):
+        return sharecard._truncate_text(self.draw, text, sharecard.get_font(pt), max_width)
+
+
+@pytest.fixture(params=["scalable", "fallback"])
+def font_mode(request, monkeypatch):
+    if request.param == "scalable":
+        # 仓库里没有 Noto 字体：用 Pillow 内置的可缩放字体覆盖各个字号
+        monkeypatch.setattr(sharecard, "get_font", lru_cache(maxsize=None)(lambda pt: ImageFont.load_default(pt)))
+    return request.param
+
+
+def _payloads():
+    for n, title in enumerate(TITLES):
+        for m, subtitle in enumerate(SUBTITLES):
+            uniqueness, ari = SCORES[(n + m) % len(SCORES)]
+            yield {"title": title, "subtitle": subtitle, "uniqueness": uniqueness, "ari": ari, "url": "https://example.com/c/1"}
+
+
+def test_layout_engine_matches_reference_searches(font_mode):
+    engine = sharecard.TextLayout()
+    reference = ReferenceLayout()
+    for text in TITLES + SUBTITLES:
+        for box in [(420, 220), (900, 120), (60, 40)]:
+            for max_pt, min_pt in [(78, 18), (44, 14), (26, 12)]:
+                size = reference.fit_font_size(text, *box, max_pt, min_pt)
+                assert engine.fit_font_size(text, *box, max_pt, min_pt) == size
+                assert engine.fit_font_size(text, *box, max_pt, min_pt) == size
+                assert engine.truncate(text, size, box[0]) == reference.truncate(text, size, box[0])
+
+
+def test_rendered_cards_are_pixel_identical(font_mode, monkeypatch):
+    for size in (sharecard.OG_SIZE, sharecard.ICON_SIZE):
+        for payload in _payloads():
+            monkeypatch.setattr(sharecard, "_LAYOUT", ReferenceLayout())
+            golden = sharecard.render_sharecard(payload, size)
+            monkeypatch.setattr(sharecard, "_LAYOUT", sharecard.TextLayout())
+            rendered = sharecard.render_sharecard(payload, size)
+            assert rendered.tobytes() == golden.tobytes(), payload["title"][:20]